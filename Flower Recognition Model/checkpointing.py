@@ -0,0 +1,72 @@
+"""Full training checkpoints (model, optimizer, epoch, RNG state, best accuracy)
+for train_image_model.py.
+
+Checkpoints are written to a temporary file in the same directory and moved
+into place with os.replace, so a crash mid-write leaves the previous
+checkpoint intact. ``atomic_save`` does the same for the exported
+image_model.pth, which app.py memory-maps: replacing the file leaves a running
+server on the old inode until it reloads, where an in-place write would change
+its weights under it.
+"""
+import json
+import os
+import random
+
+import numpy as np
+import torch
+
+CHECKPOINT_NAME = 'checkpoint.pt'
+
+
+def rng_state():
+    state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def atomic_save(obj, path):
+    """torch.save ``obj`` to ``path`` through a temporary file and os.replace."""
+    path = str(path)
+    tmp = path + '.tmp'
+    torch.save(obj, tmp)
+    os.replace(tmp, path)
+
+
+def atomic_save_json(obj, path):
+    path = str(path)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def save_checkpoint(path, model, optimizer, epoch, best_acc, **extra):
+    """Atomically write a checkpoint; ``epoch`` is the number of completed epochs."""
+    state = {
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'epoch': epoch,
+        'best_acc': best_acc,
+        'rng': rng_state(),
+        **extra,
+    }
+    atomic_save(state, path)
+
+
+def load_checkpoint(path, model, optimizer, device='cpu'):
+    """Restore model, optimizer and RNG state in place; return the checkpoint dict."""
+    # weights_only=False: the checkpoint holds python/numpy RNG state, not just tensors
+    state = torch.load(path, map_location=device, weights_only=False)
+    model.load_state_dict(state['model'])
+    optimizer.load_state_dict(state['optimizer'])
+    set_rng_state(state['rng'])
+    return state
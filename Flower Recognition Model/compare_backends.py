@@ -0,0 +1,144 @@
+"""Accuracy / latency comparison of the CPU inference backends in image_backends.py.
+
+Evaluates every backend (optionally also in channels_last) on the val split
+that train_image_model.py uses, i.e. ``<data-dir>/val`` with the same
+Resize(256) / CenterCrop(224) / Normalize transform, and writes a JSON and a
+Markdown report.
+
+    python "Flower Recognition Model/compare_backends.py" --data-dir flower_images
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+from torch.utils.data import DataLoader
+from torchvision import datasets
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from image_backends import BACKENDS, prepare_image_model, to_input, val_transform  # noqa: E402
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def evaluate(model, loader, channels_last):
+    correct = 0
+    total = 0
+    with torch.inference_mode():
+        for images, labels in loader:
+            preds = model(to_input(images, channels_last)).argmax(dim=1)
+            correct += int((preds == labels).sum())
+            total += labels.numel()
+    return correct / max(total, 1)
+
+
+def measure_latency(model, channels_last, batch_size, iters, warmup=5):
+    x = to_input(torch.randn(batch_size, 3, 224, 224), channels_last)
+    timings = []
+    with torch.inference_mode():
+        for _ in range(warmup):
+            model(x)
+        for _ in range(iters):
+            start = time.perf_counter()
+            model(x)
+            timings.append((time.perf_counter() - start) * 1000.0)
+    return timings
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--data-dir', default='flower_images', help='Path with train/val subfolders')
+    p.add_argument('--model-dir', default='Flower Recognition Model', help='Folder with image_model.pth and classes.json')
+    p.add_argument('--backends', default=','.join(BACKENDS))
+    p.add_argument('--channels-last', choices=['off', 'on', 'both'], default='both')
+    p.add_argument('--calibration-samples', type=int, default=64)
+    p.add_argument('--batch-size', type=int, default=32)
+    p.add_argument('--latency-iters', type=int, default=50)
+    p.add_argument('--threads', type=int, default=None, help='torch.set_num_threads for the run')
+    p.add_argument('--output', default='backend_report', help='Report path prefix (.json and .md are added)')
+    args = p.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    data_dir = Path(args.data_dir)
+    model_dir = Path(args.model_dir)
+    with open(model_dir / 'classes.json', 'r') as f:
+        classes = json.load(f)
+    state = torch.load(model_dir / 'image_model.pth', map_location='cpu')
+
+    val_dir = data_dir / 'val'
+    assert val_dir.exists(), f"Val folder not found: {val_dir}"
+    val_dataset = datasets.ImageFolder(str(val_dir), transform=val_transform())
+    val_loader = DataLoader(val_dataset, batch_size=args.batch_size, shuffle=False, num_workers=min(4, os.cpu_count() or 1))
+
+    layouts = {'off': [False], 'on': [True], 'both': [False, True]}[args.channels_last]
+    results = []
+    baseline = None
+    for backend in args.backends.split(','):
+        for channels_last in layouts:
+            name = backend + (' + channels_last' if channels_last else '')
+            print(f'Building {name}...')
+            try:
+                model = prepare_image_model(state, len(classes), backend, channels_last,
+                                            data_dir / 'train', args.calibration_samples)
+            except Exception as e:
+                print(f' skipped: {e}')
+                continue
+            acc = evaluate(model, val_loader, channels_last)
+            single = measure_latency(model, channels_last, 1, args.latency_iters)
+            batched = measure_latency(model, channels_last, args.batch_size, max(5, args.latency_iters // 5))
+            row = {
+                'backend': backend,
+                'channels_last': channels_last,
+                'val_accuracy': round(acc, 4),
+                'latency_ms_b1_p50': round(percentile(single, 50), 2),
+                'latency_ms_b1_p95': round(percentile(single, 95), 2),
+                'throughput_img_s': round(args.batch_size * 1000.0 / percentile(batched, 50), 1),
+            }
+            if baseline is None and backend == 'eager' and not channels_last:
+                baseline = row
+            results.append(row)
+            print(f" acc {row['val_accuracy']:.4f}  b1 p50 {row['latency_ms_b1_p50']} ms  {row['throughput_img_s']} img/s")
+
+    for row in results:
+        if baseline:
+            row['accuracy_delta'] = round(row['val_accuracy'] - baseline['val_accuracy'], 4)
+            row['speedup_b1'] = round(baseline['latency_ms_b1_p50'] / row['latency_ms_b1_p50'], 2)
+
+    report = {
+        'val_dir': str(val_dir),
+        'val_images': len(val_dataset),
+        'torch': torch.__version__,
+        'threads': torch.get_num_threads(),
+        'batch_size': args.batch_size,
+        'results': results,
+    }
+    with open(args.output + '.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    lines = [
+        f"# Backend comparison ({len(val_dataset)} val images, {torch.get_num_threads()} threads)",
+        '',
+        '| backend | channels_last | val acc | Δ acc | b1 p50 ms | b1 p95 ms | speedup | img/s @ bs' + str(args.batch_size) + ' |',
+        '|---|---|---|---|---|---|---|---|',
+    ]
+    for row in results:
+        lines.append(f"| {row['backend']} | {row['channels_last']} | {row['val_accuracy']:.4f} | "
+                     f"{row.get('accuracy_delta', '')} | {row['latency_ms_b1_p50']} | {row['latency_ms_b1_p95']} | "
+                     f"{row.get('speedup_b1', '')} | {row['throughput_img_s']} |")
+    with open(args.output + '.md', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+    print(f'Report saved to {args.output}.json / {args.output}.md')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""DataLoader construction and auto-tuning for train_image_model.py."""
+import itertools
+import os
+import time
+
+from torch.utils.data import DataLoader
+
+
+def make_loader(dataset, batch_size, shuffle=False, num_workers=4, pin_memory=False,
+                persistent_workers=True, prefetch_factor=2, sampler=None):
+    """DataLoader with the worker options that are only valid when num_workers > 0."""
+    kwargs = {}
+    if num_workers > 0:
+        kwargs['persistent_workers'] = persistent_workers
+        kwargs['prefetch_factor'] = prefetch_factor
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle if sampler is None else False,
+                      sampler=sampler, num_workers=num_workers, pin_memory=pin_memory, **kwargs)
+
+
+def candidate_worker_counts(max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    counts = {0, 1, 2, max_workers}
+    n = 4
+    while n < max_workers:
+        counts.add(n)
+        n *= 2
+    return sorted(c for c in counts if c <= max_workers)
+
+
+def probe_loader(loader, probe_batches, skip_batches=2):
+    """Samples/sec over ``probe_batches`` batches, ignoring worker start-up."""
+    it = iter(loader)
+    samples = 0
+    start = None
+    for i, (images, _) in enumerate(itertools.islice(it, probe_batches + skip_batches)):
+        if i == skip_batches:
+            start = time.perf_counter()
+        elif i > skip_batches:
+            samples += images.size(0)
+    if start is None or samples == 0:
+        return 0.0
+    return samples / (time.perf_counter() - start)
+
+
+def auto_tune_loader(dataset, batch_size, pin_memory=False, worker_counts=None, prefetch_factors=(2, 4, 8),
+                     probe_batches=20):
+    """Try worker counts x prefetch depths on this machine; return the fastest settings."""
+    worker_counts = worker_counts or candidate_worker_counts()
+    results = []
+    print(f'Auto-tuning DataLoader over workers {worker_counts} x prefetch {list(prefetch_factors)}...')
+    for workers in worker_counts:
+        for prefetch in (prefetch_factors if workers > 0 else (2,)):
+            loader = make_loader(dataset, batch_size, shuffle=True, num_workers=workers, pin_memory=pin_memory,
+                                 persistent_workers=False, prefetch_factor=prefetch)
+            rate = probe_loader(loader, probe_batches)
+            del loader
+            results.append({'num_workers': workers, 'prefetch_factor': prefetch, 'samples_per_sec': rate})
+            print(f'  workers={workers:<3} prefetch={prefetch:<3} {rate:8.1f} samples/s')
+    best = max(results, key=lambda r: r['samples_per_sec'])
+    print(f"Selected num_workers={best['num_workers']} prefetch_factor={best['prefetch_factor']}")
+    return best
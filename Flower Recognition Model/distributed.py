@@ -0,0 +1,76 @@
+"""torchrun / DistributedDataParallel support for train_image_model.py (gloo, CPU).
+
+    torchrun --standalone --nproc_per_node=4 "Flower Recognition Model/train_image_model.py" --data-dir flower_images
+
+torchrun sets RANK / WORLD_SIZE / LOCAL_RANK / LOCAL_WORLD_SIZE; without them
+training runs as a single process exactly as before. Each rank gets
+``cores // local ranks`` intra-op threads unless ``--threads-per-rank`` says
+otherwise, so N processes together do not oversubscribe the machine.
+"""
+import builtins
+import os
+from dataclasses import dataclass
+
+import torch
+import torch.distributed as dist
+
+
+@dataclass
+class DistContext:
+    rank: int = 0
+    world_size: int = 1
+    local_rank: int = 0
+    local_world_size: int = 1
+
+    @property
+    def enabled(self):
+        return self.world_size > 1
+
+    @property
+    def is_main(self):
+        return self.rank == 0
+
+
+def init_distributed(threads_per_rank=None):
+    """Join the process group when launched by torchrun and set this rank's thread count."""
+    ctx = DistContext(rank=int(os.environ.get('RANK', 0)), world_size=int(os.environ.get('WORLD_SIZE', 1)),
+                      local_rank=int(os.environ.get('LOCAL_RANK', 0)),
+                      local_world_size=int(os.environ.get('LOCAL_WORLD_SIZE', 1)))
+    if not ctx.enabled:
+        if threads_per_rank:
+            torch.set_num_threads(threads_per_rank)
+        return ctx
+    dist.init_process_group(backend='gloo')
+    threads = threads_per_rank or max(1, (os.cpu_count() or 1) // ctx.local_world_size)
+    torch.set_num_threads(threads)
+    if not ctx.is_main:
+        _silence_print()
+    print(f'DDP: {ctx.world_size} ranks on gloo, {threads} threads per rank')
+    return ctx
+
+
+def _silence_print():
+    """Only rank 0 prints, unless a call passes force=True."""
+    builtin_print = builtins.print
+
+    def print(*args, force=False, **kwargs):
+        if force:
+            builtin_print(*args, **kwargs)
+
+    builtins.print = print
+
+
+def all_reduce_sum(tensor, ctx):
+    if ctx.enabled:
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+
+def barrier(ctx):
+    if ctx.enabled:
+        dist.barrier()
+
+
+def cleanup(ctx):
+    if ctx.enabled:
+        dist.destroy_process_group()
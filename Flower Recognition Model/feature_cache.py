@@ -0,0 +1,157 @@
+"""Precomputed ResNet-18 embeddings for head-only retrains (``--feature-cache``).
+
+The backbone runs once over each split and the 512-d outputs are stored as a
+memory-mapped float16 array. A retrain then only fits the ``fc`` layer on
+those vectors in large batches, which takes seconds on a CPU. View 0 of every
+train image uses the deterministic val transform; ``--aug-views N`` adds N
+randomly augmented views per image.
+
+    cache_dir/<split>/
+        features.f16   float16, shape (count * views, 512)
+        labels.npy     int64 label per row
+        meta.json      count, dim, views, classes and the key the cache was built for
+
+The cache is rebuilt when its key no longer matches: backbone weights, dataset
+source, number of views, the preprocessing (resize, crop size and, for a
+packed source, the short side its images were stored at) and the dataset
+itself: the ordered class list plus a digest of every sample's relative path,
+size, mtime and label (for a packed source, of its index and image file). A
+cache built for other classes is never reused, so adding a class folder
+forces a rebuild instead of training the head on features without it.
+"""
+import copy
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.optim import Adam
+
+from finetune import iter_features
+
+FEATURE_DIM = 512
+
+
+def dataset_fingerprint(dataset):
+    """Digest of what ``dataset`` contains: (path, size, mtime, label) per sample, or the packed store's files."""
+    digest = hashlib.sha256()
+    if hasattr(dataset, 'samples'):
+        root = Path(dataset.root)
+        for path, label in dataset.samples:
+            stat = os.stat(path)
+            digest.update(f'{Path(path).relative_to(root).as_posix()}\0{stat.st_size}\0'
+                          f'{stat.st_mtime_ns}\0{label}\n'.encode('utf-8'))
+    else:
+        # PackedImageDataset: the index holds every sample's label and shape
+        digest.update(np.ascontiguousarray(dataset.index).tobytes())
+        stat = os.stat(dataset.pack_dir / 'images.u8')
+        digest.update(f'{stat.st_size}\0{stat.st_mtime_ns}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_key(backbone, source, views, resize, crop, dataset):
+    key = {'backbone': str(backbone), 'source': str(source), 'views': views, 'resize': resize, 'crop': crop,
+           'classes': list(dataset.classes), 'count': len(dataset), 'samples': dataset_fingerprint(dataset)}
+    if os.path.exists(str(backbone)):
+        stat = os.stat(str(backbone))
+        key['backbone_mtime_ns'], key['backbone_size'] = stat.st_mtime_ns, stat.st_size
+    try:
+        # Packed store: its images were already resized when it was built
+        with open(Path(source) / 'meta.json') as f:
+            key['packed_short_side'] = json.load(f)['short_side']
+    except (OSError, ValueError, KeyError):
+        pass
+    return key
+
+
+def is_current(split_dir, key):
+    try:
+        with open(Path(split_dir) / 'meta.json') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get('classes') != key['classes']:
+        # Features for another class list would not match the saved classes.json
+        if 'classes' in meta:
+            print(f'Feature cache in {split_dir} was built for classes {meta["classes"]}; rebuilding')
+        return False
+    return meta.get('key') == key
+
+
+def build_split(model, datasets_per_view, split_dir, key, batch_size, loader_fn, device):
+    """Write the features of every dataset in ``datasets_per_view`` (one per view, same images)
+    into ``split_dir``; the files are renamed into place only once complete."""
+    split_dir = Path(split_dir)
+    split_dir.mkdir(parents=True, exist_ok=True)
+    count = len(datasets_per_view[0])
+    rows = count * len(datasets_per_view)
+    data_tmp = split_dir / 'features.f16.tmp'
+    features = np.lib.format.open_memmap(data_tmp, mode='w+', dtype=np.float16, shape=(rows, FEATURE_DIM))
+    labels = np.empty(rows, dtype=np.int64)
+    row = 0
+    for view, dataset in enumerate(datasets_per_view):
+        for feats, targets in iter_features(model, loader_fn(dataset, batch_size), device):
+            n = feats.size(0)
+            features[row:row + n] = feats.float().cpu().numpy().astype(np.float16)
+            labels[row:row + n] = targets.numpy()
+            row += n
+        print(f'  cached view {view + 1}/{len(datasets_per_view)} ({count} images) -> {split_dir}')
+    features.flush()
+    del features
+
+    np.save(split_dir / 'labels.npy.tmp.npy', labels)
+    meta = {'count': count, 'rows': rows, 'dim': FEATURE_DIM, 'views': len(datasets_per_view),
+            'classes': list(datasets_per_view[0].classes), 'key': key}
+    with open(split_dir / 'meta.json.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(data_tmp, split_dir / 'features.f16')
+    os.replace(split_dir / 'labels.npy.tmp.npy', split_dir / 'labels.npy')
+    os.replace(split_dir / 'meta.json.tmp', split_dir / 'meta.json')
+    return meta
+
+
+def load_split(split_dir):
+    """(features memmap, labels) for a built split."""
+    split_dir = Path(split_dir)
+    return np.load(split_dir / 'features.f16', mmap_mode='r'), np.load(split_dir / 'labels.npy')
+
+
+def _to_tensors(features, labels, device):
+    # float16 on disk, float32 for the matmul; 512-d rows keep this small even for large sets
+    return torch.from_numpy(np.asarray(features, dtype=np.float32)).to(device), torch.from_numpy(labels).to(device)
+
+
+def train_head(fc, train_split, val_split=None, epochs=30, lr=1e-3, batch_size=1024, device='cpu'):
+    """Fit ``fc`` on cached features. Keeps the weights with the best val accuracy
+    (or the last epoch without a val split); returns that accuracy."""
+    x, y = _to_tensors(*load_split(train_split), device)
+    val = _to_tensors(*load_split(val_split), device) if val_split else None
+    fc = fc.to(device)
+    optimizer = Adam(fc.parameters(), lr=lr)
+    best_acc, best_state = None, None
+    for epoch in range(epochs):
+        fc.train()
+        perm = torch.randperm(x.size(0), device=device)
+        total_loss = torch.zeros((), device=device)
+        for i in range(0, x.size(0), batch_size):
+            idx = perm[i:i + batch_size]
+            loss = F.cross_entropy(fc(x[idx]), y[idx])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.detach() * idx.numel()
+        msg = f'Head epoch {epoch + 1}/{epochs} - loss: {total_loss.item() / x.size(0):.4f}'
+        if val is not None:
+            fc.eval()
+            with torch.no_grad():
+                acc = (fc(val[0]).argmax(dim=1) == val[1]).float().mean().item()
+            msg += f' val acc: {acc:.4f}'
+            if best_acc is None or acc > best_acc:
+                best_acc, best_state = acc, copy.deepcopy(fc.state_dict())
+        print(msg)
+    if best_state is not None:
+        fc.load_state_dict(best_state)
+    return best_acc
@@ -0,0 +1,56 @@
+"""Incremental fine-tuning helpers for train_image_model.py.
+
+``--finetune-from`` starts from an existing ``image_model.pth`` instead of
+ImageNet weights. With ``--freeze-backbone`` only the ``fc`` head is trained;
+since the frozen backbone maps an image to the same 512-d feature every time,
+the features are computed once and later epochs train the head on them
+directly, skipping image decoding and the convolutional forward pass.
+"""
+import torch
+import torch.nn as nn
+from torch.utils.data import TensorDataset
+
+
+def load_finetune_weights(model, path, device='cpu'):
+    """Load ``path`` into ``model``. The ``fc`` weights are kept only when the
+    class count matches; otherwise the head stays freshly initialized."""
+    state = torch.load(path, map_location=device)
+    fc_shape = tuple(model.fc.weight.shape)
+    if tuple(state['fc.weight'].shape) != fc_shape:
+        print(f" {path} has {state['fc.weight'].shape[0]} classes, training a new head for {fc_shape[0]}")
+        state = {k: v for k, v in state.items() if not k.startswith('fc.')}
+    missing, unexpected = model.load_state_dict(state, strict=False)
+    if unexpected or any(not k.startswith('fc.') for k in missing):
+        raise RuntimeError(f'{path} does not match the model: missing={missing} unexpected={unexpected}')
+    return model
+
+
+def freeze_backbone(model):
+    """Freeze everything except ``fc``; return the trainable parameters."""
+    for name, param in model.named_parameters():
+        param.requires_grad = name.startswith('fc.')
+    return list(model.fc.parameters())
+
+
+@torch.no_grad()
+def iter_features(model, loader, device):
+    """Yield (features, labels) per batch from the backbone (everything before ``fc``)."""
+    fc, model.fc = model.fc, nn.Identity()
+    was_training = model.training
+    model.eval()
+    try:
+        for images, targets in loader:
+            yield model(images.to(device)), targets
+    finally:
+        model.fc = fc
+        model.train(was_training)
+
+
+def extract_features(model, loader, device):
+    """Run the backbone over ``loader`` once.
+    Returns a TensorDataset of (features, labels) on ``device``."""
+    feats, labels = [], []
+    for f, targets in iter_features(model, loader, device):
+        feats.append(f)
+        labels.append(targets.to(device))
+    return TensorDataset(torch.cat(feats), torch.cat(labels))
@@ -0,0 +1,129 @@
+"""Pre-decoded, memory-mapped image store for train_image_model.py.
+
+``pack_image_folder`` decodes an ImageFolder tree once, shrinks every image to
+a fixed short side (256 px by default) and appends the raw RGB bytes to a single ``images.u8``
+file. ``index.npy`` holds (offset, height, width, label) per image and
+``meta.json`` the class names. ``PackedImageDataset`` memory-maps that file,
+so later epochs never open or decode a JPEG again; the OS page cache serves
+the bytes to every DataLoader worker.
+
+    pack_dir/
+        images.u8    concatenated HWC uint8 pixels
+        index.npy    structured array: offset, height, width, label
+        meta.json    classes, short_side, count, source
+
+``is_packed(pack_dir, src_dir, short_side)`` only accepts a store packed from
+that source directory, at that short side, with as many images as the source
+has now; anything else is reported and packed again.
+"""
+import json
+import os
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+
+INDEX_DTYPE = np.dtype([('offset', '<i8'), ('height', '<i4'), ('width', '<i4'), ('label', '<i4')])
+
+
+def _load_resized(args):
+    path, short_side = args
+    img = Image.open(path)
+    if img.format == 'JPEG':
+        img.draft('RGB', (short_side, short_side))
+    img = img.convert('RGB')
+    w, h = img.size
+    scale = short_side / min(w, h)
+    if scale < 1.0:
+        # Only shrink; small images are stored as-is and upscaled by the transforms
+        img = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.BILINEAR)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def pack_image_folder(src_dir, out_dir, short_side=256, workers=None):
+    """Pack an ImageFolder tree (class subfolders of images) into ``out_dir``."""
+    from torchvision import datasets
+    src_dir, out_dir = Path(src_dir), Path(out_dir)
+    folder = datasets.ImageFolder(str(src_dir))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    index = np.zeros(len(folder.samples), dtype=INDEX_DTYPE)
+
+    data_tmp = out_dir / 'images.u8.tmp'
+    offset = 0
+    jobs = [(path, short_side) for path, _ in folder.samples]
+    with open(data_tmp, 'wb') as f, Pool(workers or os.cpu_count()) as pool:
+        # imap keeps the input order, so row i of the index matches sample i
+        for i, arr in enumerate(pool.imap(_load_resized, jobs, chunksize=16)):
+            h, w = arr.shape[:2]
+            f.write(arr.tobytes())
+            index[i] = (offset, h, w, folder.samples[i][1])
+            offset += arr.nbytes
+            if (i + 1) % 1000 == 0:
+                print(f'  packed {i + 1}/{len(jobs)} images from {src_dir}')
+
+    np.save(out_dir / 'index.npy.tmp.npy', index)
+    meta = {'classes': folder.classes, 'short_side': short_side, 'count': len(index),
+            'bytes': offset, 'source': os.path.abspath(src_dir)}
+    with open(out_dir / 'meta.json.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    # Rename last, so an interrupted pack never looks complete
+    os.replace(data_tmp, out_dir / 'images.u8')
+    os.replace(out_dir / 'index.npy.tmp.npy', out_dir / 'index.npy')
+    os.replace(out_dir / 'meta.json.tmp', out_dir / 'meta.json')
+    print(f'Packed {len(index)} images ({offset / 2**20:.1f} MB) into {out_dir}')
+    return meta
+
+
+def is_packed(pack_dir, src_dir=None, short_side=None):
+    """True if ``pack_dir`` holds a complete store; with ``src_dir``, one packed from it at ``short_side``."""
+    pack_dir = Path(pack_dir)
+    if not all((pack_dir / name).exists() for name in ('images.u8', 'index.npy', 'meta.json')):
+        return False
+    if src_dir is None:
+        return True
+    from torchvision import datasets
+    with open(pack_dir / 'meta.json') as f:
+        meta = json.load(f)
+    current = {'source': os.path.abspath(src_dir), 'short_side': short_side,
+               'count': len(datasets.ImageFolder(str(src_dir)).samples)}
+    stale = [f'{name} {meta.get(name)!r} -> {value!r}' for name, value in current.items()
+             if meta.get(name) != value and not (name == 'short_side' and value is None)]
+    if stale:
+        print(f'Packed store {pack_dir} is out of date ({", ".join(stale)}); repacking')
+        return False
+    return True
+
+
+class PackedImageDataset(Dataset):
+    """Dataset over a packed store; returns (PIL image, label) like ImageFolder."""
+
+    def __init__(self, pack_dir, transform=None):
+        self.pack_dir = Path(pack_dir)
+        self.transform = transform
+        with open(self.pack_dir / 'meta.json') as f:
+            self.meta = json.load(f)
+        self.index = np.load(self.pack_dir / 'index.npy')
+        self.classes = self.meta['classes']
+        self.class_to_idx = {c: i for i, c in enumerate(self.classes)}
+        self.targets = self.index['label'].tolist()
+        self._data = None  # opened lazily so each DataLoader worker maps it itself
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+
+    def __getitem__(self, i):
+        if self._data is None:
+            self._data = np.memmap(self.pack_dir / 'images.u8', dtype=np.uint8, mode='r')
+        offset, h, w, label = self.index[i]
+        arr = self._data[offset:offset + int(h) * int(w) * 3].reshape(int(h), int(w), 3)
+        img = Image.fromarray(arr)
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, int(label)
@@ -0,0 +1,128 @@
+"""Single-machine DDP scaling report for train_image_model.py.
+
+Launches the training script under torchrun with 1, 2, 4 and 8 processes
+(``--processes``), reads the per-run ``runs.json`` that train() appends, and
+writes images/sec, speedup and parallel efficiency as JSON and Markdown. The
+per-rank batch size is fixed, so the global batch grows with the process
+count (weak scaling).
+
+No cluster or network access is needed: ``--synthetic`` generates a small
+random ImageFolder, and the runs start from a randomly initialized ResNet-18
+(passed through ``--finetune-from``) instead of downloading ImageNet weights.
+
+    python "Flower Recognition Model/scaling_report.py" --synthetic --epochs 2
+    python "Flower Recognition Model/scaling_report.py" --data-dir flower_images --processes 1,2,4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from torchvision import models
+
+HERE = Path(__file__).resolve().parent
+
+
+def make_synthetic_folder(root, classes=4, train_per_class=64, val_per_class=16, size=256, seed=0):
+    """Random JPEGs in an ImageFolder layout; each class gets its own base colour."""
+    rng = np.random.default_rng(seed)
+    for c in range(classes):
+        base = rng.integers(0, 256, size=3)
+        for split, count in (('train', train_per_class), ('val', val_per_class)):
+            out = Path(root) / split / f'class_{c}'
+            out.mkdir(parents=True, exist_ok=True)
+            for i in range(count):
+                noise = rng.integers(-60, 60, size=(size, size, 3))
+                pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+                Image.fromarray(pixels).save(out / f'{i:04d}.jpg', quality=90)
+    return root
+
+
+def random_weights(path, num_classes):
+    model = models.resnet18()
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    torch.save(model.state_dict(), path)
+    return path
+
+
+def run(nproc, args, data_dir, weights, out_dir):
+    cmd = [sys.executable, '-m', 'torch.distributed.run', '--standalone', f'--nproc_per_node={nproc}',
+           str(HERE / 'train_image_model.py'), '--data-dir', str(data_dir), '--output-dir', str(out_dir),
+           '--epochs', str(args.epochs), '--batch-size', str(args.batch_size),
+           '--num-workers', str(args.num_workers), '--checkpoint-every', '0']
+    if weights:
+        cmd += ['--finetune-from', str(weights)]
+    if args.threads_per_rank:
+        cmd += ['--threads-per-rank', str(args.threads_per_rank)]
+    print(f'\n=== {nproc} process(es) ===\n' + ' '.join(cmd))
+    subprocess.run(cmd, check=True)
+    with open(Path(out_dir) / 'runs.json') as f:
+        return json.load(f)[-1]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--data-dir', default=None, help='ImageFolder root with train/val (default: --synthetic)')
+    p.add_argument('--synthetic', action='store_true', help='Generate a random dataset instead of using --data-dir')
+    p.add_argument('--synthetic-classes', type=int, default=4)
+    p.add_argument('--synthetic-train-per-class', type=int, default=64)
+    p.add_argument('--processes', default='1,2,4,8')
+    p.add_argument('--epochs', type=int, default=2, help='Epoch 1 is warm-up; later epochs are timed')
+    p.add_argument('--batch-size', type=int, default=32, help='Per-rank batch size')
+    p.add_argument('--num-workers', type=int, default=2, help='DataLoader workers per rank')
+    p.add_argument('--threads-per-rank', type=int, default=None)
+    p.add_argument('--pretrained', action='store_true', help='Use ImageNet weights (needs network access)')
+    p.add_argument('--output', default='scaling_report', help='Report path prefix (.json and .md are added)')
+    args = p.parse_args()
+
+    results = []
+    # Synthetic data, weights and per-run checkpoints only live as long as the report run
+    with tempfile.TemporaryDirectory(prefix='ddp_scaling_') as tmp:
+        work = Path(tmp)
+        if args.synthetic or not args.data_dir:
+            data_dir = make_synthetic_folder(work / 'data', classes=args.synthetic_classes,
+                                             train_per_class=args.synthetic_train_per_class)
+        else:
+            data_dir = Path(args.data_dir)
+        num_classes = len([d for d in (data_dir / 'train').iterdir() if d.is_dir()])
+        weights = None if args.pretrained else random_weights(work / 'random_resnet18.pth', num_classes)
+
+        for nproc in (int(n) for n in args.processes.split(',')):
+            record = run(nproc, args, data_dir, weights, work / f'run_{nproc}')
+            results.append({'processes': nproc, 'mean_epoch_s': record['mean_epoch_s'],
+                            'images_per_sec': record['train_images'] / record['mean_epoch_s'],
+                            'final_val_acc': record['final_val_acc']})
+    base = results[0]
+    for r in results:
+        r['speedup'] = r['images_per_sec'] / base['images_per_sec']
+        r['efficiency'] = r['speedup'] * base['processes'] / r['processes']
+
+    # The synthetic data is gone by now, so don't report its temporary path
+    source = 'synthetic' if args.synthetic or not args.data_dir else str(data_dir)
+    report = {'cpus': os.cpu_count(), 'data_dir': source, 'epochs': args.epochs,
+              'batch_size_per_rank': args.batch_size, 'num_workers_per_rank': args.num_workers, 'results': results}
+    with open(args.output + '.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    lines = [f'# DDP scaling ({os.cpu_count()} CPUs, batch {args.batch_size}/rank)', '',
+             '| processes | s/epoch | img/s | speedup | efficiency | val acc |',
+             '|-----------|---------|-------|---------|------------|---------|']
+    for r in results:
+        acc = 'n/a' if r['final_val_acc'] is None else f"{r['final_val_acc']:.4f}"
+        lines.append(f"| {r['processes']} | {r['mean_epoch_s']:.1f} | {r['images_per_sec']:.1f} | "
+                     f"x{r['speedup']:.2f} | {100 * r['efficiency']:.0f}% | {acc} |")
+    with open(args.output + '.md', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+    print(f'Report saved to {args.output}.json / {args.output}.md')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,70 @@
 import os
-import json
+import copy
+import time
 import argparse
 from pathlib import Path
 
 import torch
 import torch.nn as nn
 from torch.optim import Adam
-from torch.utils.data import DataLoader
+from torch.utils.data import DistributedSampler, Subset
 from torchvision import datasets, transforms, models
 
+from checkpointing import CHECKPOINT_NAME, atomic_save, atomic_save_json, load_checkpoint, save_checkpoint
+from data_loading import auto_tune_loader, make_loader
+import feature_cache
+from distributed import all_reduce_sum, barrier, cleanup, init_distributed
+from finetune import extract_features, freeze_backbone, load_finetune_weights
+from packed_dataset import PackedImageDataset, is_packed, pack_image_folder
+from train_telemetry import StepTelemetry, parse_step_range
+from validation import BackgroundValidator, evaluate, stratified_subset
+from training_modes import PRECISIONS, autocast, prepare_model, record_run, summarize, to_device
 
-def train(data_dir, output_dir, epochs=5, batch_size=32, lr=1e-4, device=None):
+# Eval preprocessing: Resize(RESIZE) + CenterCrop(CROP); training crops are CROP too
+RESIZE = 256
+CROP = 224
+
+
+def pack_dataset(data_dir, packed_dir, short_side=256):
+    """One-time step: pack train/ and val/ into memory-mapped stores under packed_dir."""
+    data_dir = Path(data_dir)
+    packed_dir = Path(packed_dir)
+    for split in ('train', 'val'):
+        if (data_dir / split).exists() and not is_packed(packed_dir / split, data_dir / split, short_side):
+            pack_image_folder(data_dir / split, packed_dir / split, short_side=short_side)
+
+
+def train(data_dir, output_dir, epochs=5, batch_size=32, lr=1e-4, device=None, packed_dir=None,
+          num_workers=4, pin_memory=None, persistent_workers=True, prefetch_factor=2, auto_tune=False,
+          metrics_file=None, profile_steps=None, precision='fp32', channels_last=False, compile_model=False,
+          checkpoint_every=1, resume=False, finetune_from=None, freeze=False,
+          feature_cache_dir=None, aug_views=0, head_epochs=30, head_lr=1e-3, head_batch_size=1024,
+          threads_per_rank=None, val_batch_size=None, val_subsample=None, async_val=False, val_threads=1,
+          pack_short_side=256):
     device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+    if pin_memory is None:
+        pin_memory = torch.device(device).type == 'cuda'
     data_dir = Path(data_dir)
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
+    ctx = init_distributed(threads_per_rank)
+    if ctx.enabled and (freeze or feature_cache_dir):
+        raise ValueError('--freeze-backbone and --feature-cache run single-process; launch them without torchrun')
+    if async_val and (ctx.enabled or freeze):
+        raise ValueError('--async-val is not supported with torchrun or --freeze-backbone')
+    # Validation only runs forward passes, so it can use much larger batches than training
+    val_batch_size = val_batch_size or 4 * batch_size
 
     # ImageNet normalization
     train_transforms = transforms.Compose([
-        transforms.RandomResizedCrop(224),
+        transforms.RandomResizedCrop(CROP),
         transforms.RandomHorizontalFlip(),
         transforms.ToTensor(),
         transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
     ])
     val_transforms = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
+        transforms.Resize(RESIZE),
+        transforms.CenterCrop(CROP),
         transforms.ToTensor(),
         transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
     ])
@@ -34,71 +73,250 @@ def train(data_dir, output_dir, epochs=5, batch_size=32, lr=1e-4, device=None):
     val_dir = data_dir / 'val'
     assert train_dir.exists(), f"Train folder not found: {train_dir}"
 
-    train_dataset = datasets.ImageFolder(str(train_dir), transform=train_transforms)
-    val_dataset = datasets.ImageFolder(str(val_dir), transform=val_transforms) if val_dir.exists() else None
+    if packed_dir:
+        # Pre-decoded store: epochs read pixels from an mmap instead of decoding JPEGs.
+        # Only rank 0 packs; the others wait for it at the barrier.
+        packed_dir = Path(packed_dir)
+        if ctx.is_main:
+            pack_dataset(data_dir, packed_dir, short_side=pack_short_side)
+        barrier(ctx)
+        train_dataset = PackedImageDataset(packed_dir / 'train', transform=train_transforms)
+        val_dataset = PackedImageDataset(packed_dir / 'val', transform=val_transforms) if val_dir.exists() else None
+    else:
+        train_dataset = datasets.ImageFolder(str(train_dir), transform=train_transforms)
+        val_dataset = datasets.ImageFolder(str(val_dir), transform=val_transforms) if val_dir.exists() else None
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=4)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=4) if val_dataset else None
+    if auto_tune:
+        best = auto_tune_loader(train_dataset, batch_size, pin_memory=pin_memory)
+        num_workers, prefetch_factor = best['num_workers'], best['prefetch_factor']
+    # persistent_workers keeps the worker processes alive across epochs
+    loader_opts = dict(num_workers=num_workers, pin_memory=pin_memory,
+                       persistent_workers=persistent_workers, prefetch_factor=prefetch_factor)
+    # Under torchrun each rank sees its own 1/world_size shard of the train set per epoch
+    train_sampler = DistributedSampler(train_dataset, num_replicas=ctx.world_size, rank=ctx.rank) if ctx.enabled else None
+    train_loader = make_loader(train_dataset, batch_size, shuffle=True, sampler=train_sampler, **loader_opts)
+    if val_dataset is not None and ctx.enabled:
+        # Disjoint, unpadded shards, so the all-reduced accuracy counts every image exactly once
+        val_dataset = Subset(val_dataset, range(ctx.rank, len(val_dataset), ctx.world_size))
+    val_loader = make_loader(val_dataset, val_batch_size, shuffle=False, **loader_opts) if val_dataset else None
 
     num_classes = len(train_dataset.classes)
     print(f'Classes: {train_dataset.classes}')
 
-    model = models.resnet18(pretrained=True)
+    model = models.resnet18(pretrained=not finetune_from)
     # Replace final layer
     model.fc = nn.Linear(model.fc.in_features, num_classes)
+    if finetune_from:
+        load_finetune_weights(model, finetune_from)
     model = model.to(device)
 
+    if feature_cache_dir:
+        return train_from_feature_cache(model, train_dataset, val_dataset, train_transforms, val_transforms,
+                                        output_dir, Path(feature_cache_dir), packed_dir or data_dir,
+                                        finetune_from or 'imagenet', aug_views, batch_size, loader_opts, device,
+                                        head_epochs, head_lr, head_batch_size)
+
+    if freeze:
+        # Frozen backbone: compute its features once, then every epoch only trains fc on them.
+        # The loaders below yield (features, label) and run_model is just the head.
+        params = freeze_backbone(model)
+        print('Caching backbone features...')
+        # Deterministic transforms: a cached feature cannot carry a random crop or flip
+        if packed_dir:
+            feature_source = PackedImageDataset(packed_dir / 'train', transform=val_transforms)
+        else:
+            feature_source = datasets.ImageFolder(str(train_dir), transform=val_transforms)
+        train_features = extract_features(model, make_loader(feature_source, batch_size, **loader_opts), device)
+        train_loader = make_loader(train_features, batch_size, shuffle=True, num_workers=0)
+        if val_loader:
+            val_loader = make_loader(extract_features(model, val_loader, device), val_batch_size, num_workers=0)
+        run_model, channels_last, pin_memory = model.fc, False, False
+    else:
+        params = model.parameters()
+        # run_model is what the loops call (possibly compiled); model is what gets saved
+        run_model, model = prepare_model(model, channels_last=channels_last, compile_model=compile_model,
+                                         ddp=ctx.enabled)
+
+    val_sample_loader = None
+    if val_loader and val_subsample:
+        val_sample = stratified_subset(val_loader.dataset, val_subsample)
+        val_sample_loader = make_loader(val_sample, val_batch_size, num_workers=val_loader.num_workers,
+                                        pin_memory=pin_memory, persistent_workers=persistent_workers,
+                                        prefetch_factor=prefetch_factor)
+        print(f'Per-epoch validation on {len(val_sample)}/{len(val_loader.dataset)} images (stratified)')
+    validator = None
+    if val_loader and async_val:
+        validator = BackgroundValidator(val_loader.dataset, num_classes, val_batch_size, num_workers=num_workers,
+                                        threads=val_threads, precision=precision)
+    # DDP's forward hooks only matter for training; validate the plain (possibly compiled) module
+    eval_model = model if ctx.enabled else run_model
+
+    def validate(loader):
+        correct, total = evaluate(eval_model, loader, device, precision, channels_last)
+        counts = all_reduce_sum(torch.stack([correct, torch.tensor(total, device=device)]), ctx)
+        return counts[0].item() / counts[1].item()
+
+    def save_best(acc, state):
+        nonlocal best_acc
+        if acc > best_acc:
+            best_acc = acc
+            if ctx.is_main:
+                atomic_save(state, output_dir / 'image_model.pth')
+                print(' Saved best model')
+
     criterion = nn.CrossEntropyLoss()
-    optimizer = Adam(model.parameters(), lr=lr)
+    optimizer = Adam(params, lr=lr)
+
+    telemetry = StepTelemetry(device, metrics_file if ctx.is_main else None,
+                              parse_step_range(profile_steps) if ctx.is_main else None, output_dir / 'trace.json')
 
     best_acc = 0.0
-    for epoch in range(epochs):
-        model.train()
-        running_loss = 0.0
-        running_corrects = 0
+    best_sample_acc = -1.0
+    val_acc = None
+    full_val_done = False
+    epoch_times = []
+    start_epoch = 0
+    checkpoint_path = output_dir / CHECKPOINT_NAME
+    if resume:
+        state = load_checkpoint(checkpoint_path, model, optimizer, device)
+        start_epoch, best_acc = state['epoch'], state['best_acc']
+        val_acc, epoch_times = state.get('val_acc'), state.get('epoch_times', [])
+        print(f'Resumed from {checkpoint_path} after epoch {start_epoch} (best acc {best_acc:.4f})')
+
+    for epoch in range(start_epoch, epochs):
+        epoch_start = time.perf_counter()
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
+        run_model.train()
+        # Accumulated on-device and read once per epoch: a per-step .item()
+        # would force a synchronization on every step.
+        running_loss = torch.zeros((), device=device)
+        running_corrects = torch.zeros((), dtype=torch.long, device=device)
         total = 0
+        telemetry.epoch_start(epoch + 1)
         for images, labels in train_loader:
-            images = images.to(device)
-            labels = labels.to(device)
-            optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-
-            running_loss += loss.item() * images.size(0)
+            telemetry.batch_ready()
+            with telemetry.phase('forward'):
+                images = to_device(images, device, channels_last, non_blocking=pin_memory)
+                labels = labels.to(device, non_blocking=pin_memory)
+                optimizer.zero_grad()
+                with autocast(device, precision):
+                    outputs = run_model(images)
+                    loss = criterion(outputs, labels)
+            with telemetry.phase('backward'):
+                loss.backward()
+            with telemetry.phase('optimizer'):
+                optimizer.step()
+
+            running_loss += loss.detach() * images.size(0)
             preds = outputs.argmax(dim=1)
-            running_corrects += (preds == labels).sum().item()
+            running_corrects += (preds == labels).sum()
             total += images.size(0)
+            telemetry.step_end(images.size(0))
 
-        epoch_loss = running_loss / total
-        epoch_acc = running_corrects / total
-        print(f'Epoch {epoch+1}/{epochs} - loss: {epoch_loss:.4f} acc: {epoch_acc:.4f}')
+        stats = telemetry.epoch_end()
+        sums = all_reduce_sum(torch.stack([running_loss, running_corrects.to(running_loss.dtype),
+                                           torch.tensor(float(total), device=device)]), ctx)
+        epoch_loss = sums[0].item() / sums[2].item()
+        epoch_acc = sums[1].item() / sums[2].item()
+        print(f'Epoch {epoch+1}/{epochs} - loss: {epoch_loss:.4f} acc: {epoch_acc:.4f} - '
+              f"{stats['images_per_sec']} img/s, data wait {stats['data_wait_s']}s ({stats['data_wait_pct']}%) "
+              f"/ compute {stats['compute_s']}s")
 
-        if val_loader:
-            model.eval()
-            val_corrects = 0
-            val_total = 0
-            with torch.no_grad():
-                for images, labels in val_loader:
-                    images = images.to(device)
-                    labels = labels.to(device)
-                    outputs = model(images)
-                    preds = outputs.argmax(dim=1)
-                    val_corrects += (preds == labels).sum().item()
-                    val_total += images.size(0)
-            val_acc = val_corrects / val_total
+        full_val_done = False
+        if validator is not None:
+            # Snapshot now, read whichever earlier snapshots have finished meanwhile
+            validator.submit(epoch + 1, model)
+            for done_epoch, acc, state in validator.results():
+                val_acc = acc
+                print(f' Validation acc (epoch {done_epoch}, background): {acc:.4f}')
+                save_best(acc, state)
+        elif val_sample_loader is not None:
+            sample_acc = validate(val_sample_loader)
+            print(f' Validation acc (subsample): {sample_acc:.4f}')
+            if sample_acc > best_sample_acc:
+                best_sample_acc = sample_acc
+                val_acc = validate(val_loader)
+                full_val_done = True
+                print(f' Validation acc (full): {val_acc:.4f}')
+                save_best(val_acc, model.state_dict())
+        elif val_loader:
+            val_acc = validate(val_loader)
+            full_val_done = True
             print(f' Validation acc: {val_acc:.4f}')
-            if val_acc > best_acc:
-                best_acc = val_acc
-                torch.save(model.state_dict(), output_dir / 'image_model.pth')
-                print(' Saved best model')
+            save_best(val_acc, model.state_dict())
+        epoch_times.append(time.perf_counter() - epoch_start)
+
+        if ctx.is_main and checkpoint_every and ((epoch + 1) % checkpoint_every == 0 or epoch + 1 == epochs):
+            save_checkpoint(checkpoint_path, model, optimizer, epoch + 1, best_acc,
+                            val_acc=val_acc, epoch_times=epoch_times)
+
+    telemetry.close()
+    if validator is not None:
+        for done_epoch, acc, state in validator.close():
+            val_acc = acc
+            print(f' Validation acc (epoch {done_epoch}, background): {acc:.4f}')
+            save_best(acc, state)
+    elif val_sample_loader is not None and not full_val_done and epochs > start_epoch:
+        val_acc = validate(val_loader)
+        print(f' Final validation acc (full): {val_acc:.4f}')
+        save_best(val_acc, model.state_dict())
+    barrier(ctx)
+    if not ctx.is_main:
+        cleanup(ctx)
+        return
+
+    # Epoch 1 carries warm-up (and torch.compile) cost, so it is left out of the mean when possible
+    steady = epoch_times[1:] or epoch_times
+    run = {'precision': precision, 'channels_last': channels_last, 'compile': compile_model,
+           'freeze_backbone': freeze, 'finetune_from': str(finetune_from) if finetune_from else None,
+           'batch_size': batch_size, 'epoch_s': [round(t, 2) for t in epoch_times],
+           'mean_epoch_s': sum(steady) / len(steady), 'final_val_acc': val_acc,
+           'world_size': ctx.world_size, 'async_val': async_val, 'train_images': len(train_dataset)}
+    print(summarize(run, record_run(output_dir, run)))
 
     # Always save final model and classes mapping
-    torch.save(model.state_dict(), output_dir / 'image_model_final.pth')
-    with open(output_dir / 'classes.json', 'w') as f:
-        json.dump(train_dataset.classes, f)
+    atomic_save(model.state_dict(), output_dir / 'image_model_final.pth')
+    atomic_save_json(train_dataset.classes, output_dir / 'classes.json')
     print('Training complete. Models saved to', output_dir)
+    cleanup(ctx)
+
+
+def train_from_feature_cache(model, train_dataset, val_dataset, train_transforms, val_transforms, output_dir,
+                             cache_dir, source, backbone, aug_views, batch_size, loader_opts, device,
+                             head_epochs, head_lr, head_batch_size):
+    """Fast path: build (or reuse) the embedding cache, then fit only model.fc on it."""
+    def loader_fn(dataset, bs):
+        return make_loader(dataset, bs, shuffle=False, **loader_opts)
+
+    def with_transform(dataset, transform):
+        view = copy.copy(dataset)
+        view.transform = transform
+        return view
+
+    splits = {'train': [with_transform(train_dataset, val_transforms)]
+                       + [with_transform(train_dataset, train_transforms)] * aug_views}
+    if val_dataset is not None:
+        splits['val'] = [with_transform(val_dataset, val_transforms)]
+    for split, views in splits.items():
+        key = feature_cache.cache_key(backbone, Path(source) / split, len(views), resize=RESIZE, crop=CROP,
+                                      dataset=views[0])
+        if feature_cache.is_current(cache_dir / split, key):
+            print(f'Using cached {split} features in {cache_dir / split}')
+        else:
+            print(f'Caching {split} backbone features ({len(views)} view(s))...')
+            feature_cache.build_split(model, views, cache_dir / split, key, batch_size, loader_fn, device)
+
+    best_acc = feature_cache.train_head(model.fc, cache_dir / 'train', cache_dir / 'val' if 'val' in splits else None,
+                                        epochs=head_epochs, lr=head_lr, batch_size=head_batch_size, device=device)
+    if best_acc is not None:
+        print(f'Best head val acc: {best_acc:.4f}')
+
+    # Full ResNet-18 state dict (unchanged backbone + new fc), so app.py loads it like any other run
+    atomic_save_json(train_dataset.classes, output_dir / 'classes.json')
+    atomic_save(model.state_dict(), output_dir / 'image_model.pth')
+    atomic_save(model.state_dict(), output_dir / 'image_model_final.pth')
+    print('Head training complete. Models saved to', output_dir)
 
 
 if __name__ == '__main__':
@@ -108,5 +326,59 @@ if __name__ == '__main__':
     p.add_argument('--epochs', type=int, default=5)
     p.add_argument('--batch-size', type=int, default=32)
     p.add_argument('--lr', type=float, default=1e-4)
+    p.add_argument('--packed-dir', default=None, help='Use (and build on first run) a pre-decoded mmap store here')
+    p.add_argument('--pack-only', action='store_true', help='Only build the --packed-dir store, then exit')
+    p.add_argument('--pack-short-side', type=int, default=256, help='Short side in pixels of packed images')
+    p.add_argument('--num-workers', type=int, default=4, help='DataLoader worker processes')
+    p.add_argument('--pin-memory', action=argparse.BooleanOptionalAction, default=None,
+                   help='Pin host memory for faster GPU copies (default: on for CUDA)')
+    p.add_argument('--persistent-workers', action=argparse.BooleanOptionalAction, default=True,
+                   help='Keep DataLoader workers alive between epochs')
+    p.add_argument('--prefetch-factor', type=int, default=2, help='Batches prefetched per worker')
+    p.add_argument('--auto-tune', action='store_true',
+                   help='Probe worker counts / prefetch depths on this machine and use the fastest')
+    p.add_argument('--metrics-file', default=None, help='Write per-step telemetry as JSON lines')
+    p.add_argument('--profile-steps', default=None, metavar='START:END',
+                   help='Run torch.profiler over these global steps and save a Chrome trace to <output-dir>/trace.json')
+    p.add_argument('--precision', choices=PRECISIONS, default='fp32',
+                   help='bf16 runs forward/loss under torch.autocast (CPU or CUDA)')
+    p.add_argument('--channels-last', action='store_true', help='Use channels_last memory format for model and inputs')
+    p.add_argument('--compile', action='store_true', help='Wrap the model with torch.compile')
+    p.add_argument('--checkpoint-every', type=int, default=1,
+                   help='Write <output-dir>/checkpoint.pt every N epochs (0 disables)')
+    p.add_argument('--resume', action='store_true', help='Continue from <output-dir>/checkpoint.pt')
+    p.add_argument('--finetune-from', default=None, help='Start from this image_model.pth instead of ImageNet weights')
+    p.add_argument('--freeze-backbone', action='store_true',
+                   help='Train only the fc head, on backbone features computed once up front')
+    p.add_argument('--feature-cache', default=None, metavar='DIR',
+                   help='Cache backbone embeddings here (float16 memmap) and train only the fc head on them')
+    p.add_argument('--aug-views', type=int, default=0,
+                   help='Extra randomly augmented views per train image in the feature cache')
+    p.add_argument('--head-epochs', type=int, default=30, help='Epochs over the cached features')
+    p.add_argument('--head-lr', type=float, default=1e-3)
+    p.add_argument('--head-batch-size', type=int, default=1024)
+    p.add_argument('--threads-per-rank', type=int, default=None,
+                   help='torch intra-op threads per process (default: cores / processes under torchrun)')
+    p.add_argument('--val-batch-size', type=int, default=None, help='Validation batch size (default: 4x --batch-size)')
+    p.add_argument('--val-subsample', type=float, default=None, metavar='FRACTION',
+                   help='Validate each epoch on this stratified fraction of val; full pass on improvement and at the end')
+    p.add_argument('--async-val', action='store_true',
+                   help='Validate a snapshot of the weights in a background process while the next epoch trains')
+    p.add_argument('--val-threads', type=int, default=1, help='torch threads for the --async-val process')
     args = p.parse_args()
-    train(args.data_dir, args.output_dir, epochs=args.epochs, batch_size=args.batch_size, lr=args.lr)
+    if args.pack_only:
+        # Under torchrun only rank 0 writes the store
+        if args.packed_dir and int(os.environ.get('RANK', '0')) == 0:
+            pack_dataset(args.data_dir, args.packed_dir, short_side=args.pack_short_side)
+    else:
+        train(args.data_dir, args.output_dir, epochs=args.epochs, batch_size=args.batch_size, lr=args.lr,
+              packed_dir=args.packed_dir, num_workers=args.num_workers, pin_memory=args.pin_memory,
+              persistent_workers=args.persistent_workers, prefetch_factor=args.prefetch_factor,
+              auto_tune=args.auto_tune, metrics_file=args.metrics_file, profile_steps=args.profile_steps,
+              precision=args.precision, channels_last=args.channels_last, compile_model=args.compile,
+              checkpoint_every=args.checkpoint_every, resume=args.resume, finetune_from=args.finetune_from,
+              freeze=args.freeze_backbone, feature_cache_dir=args.feature_cache, aug_views=args.aug_views,
+              head_epochs=args.head_epochs, head_lr=args.head_lr, head_batch_size=args.head_batch_size,
+              threads_per_rank=args.threads_per_rank, val_batch_size=args.val_batch_size,
+              val_subsample=args.val_subsample, async_val=args.async_val, val_threads=args.val_threads,
+              pack_short_side=args.pack_short_side)
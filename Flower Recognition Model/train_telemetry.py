@@ -0,0 +1,170 @@
+"""Per-step throughput telemetry and optional torch.profiler window for train_image_model.py.
+
+Every step is split into data / forward / backward / optimizer phases. On
+CPU the phases are timed with perf_counter (CPU ops are synchronous); on CUDA
+they are recorded as CUDA events and only resolved at the end of the epoch,
+so the instrumentation never adds a synchronization point inside the loop.
+Steps are written as JSON lines (``--metrics-file``), followed by one
+``"type": "epoch"`` summary line per epoch.
+
+``--profile-steps START:END`` additionally runs torch.profiler over those
+global steps and writes a Chrome trace (open it in chrome://tracing or
+https://ui.perfetto.dev).
+"""
+import json
+import resource
+import time
+from contextlib import contextmanager
+
+import torch
+
+PHASES = ('forward', 'backward', 'optimizer')
+
+
+def parse_step_range(spec):
+    """'10:20' -> (10, 20); None -> None."""
+    if not spec:
+        return None
+    start, end = (int(x) for x in spec.split(':'))
+    if end <= start:
+        raise ValueError(f'--profile-steps end must be after start: {spec}')
+    return start, end
+
+
+class StepTelemetry:
+    """Collects per-step timings; flushes them to JSONL once per epoch."""
+
+    def __init__(self, device, metrics_file=None, profile_steps=None, trace_file='trace.json'):
+        self.cuda = torch.device(device).type == 'cuda'
+        self.metrics_file = metrics_file
+        self.profile_steps = profile_steps
+        self.trace_file = trace_file
+        self.global_step = 0
+        self._profiler = None
+        if metrics_file:
+            open(metrics_file, 'w').close()
+
+    # ==================== EPOCH ====================
+
+    def epoch_start(self, epoch):
+        self.epoch = epoch
+        self._steps = []
+        self._epoch_start = time.perf_counter()
+        self._mark = self._epoch_start
+
+    def epoch_end(self):
+        if self.cuda:
+            torch.cuda.synchronize()  # once per epoch, so the recorded events can be read
+        records = [self._resolve(step) for step in self._steps]
+        wall = time.perf_counter() - self._epoch_start
+        images = sum(r['batch_size'] for r in records)
+        data = sum(r['data_ms'] for r in records) / 1000.0
+        compute = sum(r['forward_ms'] + r['backward_ms'] + r['optimizer_ms'] for r in records) / 1000.0
+        summary = {
+            'type': 'epoch',
+            'epoch': self.epoch,
+            'steps': len(records),
+            'images': images,
+            'wall_s': round(wall, 3),
+            'images_per_sec': round(images / wall, 2) if wall else None,
+            'data_wait_s': round(data, 3),
+            'compute_s': round(compute, 3),
+            'data_wait_pct': round(100.0 * data / wall, 1) if wall else None,
+            'peak_mem_mb': max((r['peak_mem_mb'] for r in records), default=None),
+        }
+        if self.metrics_file:
+            with open(self.metrics_file, 'a') as f:
+                for r in records:
+                    f.write(json.dumps(r) + '\n')
+                f.write(json.dumps(summary) + '\n')
+        return summary
+
+    # ==================== STEP ====================
+
+    def batch_ready(self):
+        """Call right after the loader yields a batch."""
+        now = time.perf_counter()
+        self._current = {'data_s': now - self._mark, 'start': now, 'marks': {}}
+        if self.cuda:
+            self._current['events'] = {'start': self._event()}
+        self._maybe_start_profiler()
+
+    @contextmanager
+    def phase(self, name):
+        with torch.profiler.record_function(name):
+            yield
+        if self.cuda:
+            self._current['events'][name] = self._event()
+        else:
+            self._current['marks'][name] = time.perf_counter()
+
+    def step_end(self, batch_size):
+        now = time.perf_counter()
+        step = self._current
+        step.update({'batch_size': batch_size, 'end': now, 'step': self.global_step})
+        if self.cuda:
+            step['peak_mem_mb'] = torch.cuda.max_memory_allocated() / 2**20
+            torch.cuda.reset_peak_memory_stats()
+        else:
+            step['peak_mem_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        self._steps.append(step)
+        self._mark = now
+        self.global_step += 1
+        self._maybe_stop_profiler()
+
+    def _event(self):
+        e = torch.cuda.Event(enable_timing=True)
+        e.record()
+        return e
+
+    def _resolve(self, step):
+        if self.cuda:
+            ev = step['events']
+            times, prev = {}, ev['start']
+            for name in PHASES:
+                times[name] = prev.elapsed_time(ev[name]) if name in ev else 0.0
+                prev = ev.get(name, prev)
+        else:
+            times, prev = {}, step['start']
+            for name in PHASES:
+                mark = step['marks'].get(name, prev)
+                times[name] = (mark - prev) * 1000.0
+                prev = mark
+        data_ms = step['data_s'] * 1000.0
+        step_ms = data_ms + sum(times.values())
+        return {
+            'epoch': self.epoch,
+            'step': step['step'],
+            'batch_size': step['batch_size'],
+            'data_ms': round(data_ms, 3),
+            'forward_ms': round(times['forward'], 3),
+            'backward_ms': round(times['backward'], 3),
+            'optimizer_ms': round(times['optimizer'], 3),
+            'step_ms': round(step_ms, 3),
+            'images_per_sec': round(step['batch_size'] * 1000.0 / step_ms, 2) if step_ms else None,
+            'peak_mem_mb': round(step['peak_mem_mb'], 1),
+        }
+
+    # ==================== PROFILER ====================
+
+    def _maybe_start_profiler(self):
+        if self.profile_steps and self._profiler is None and self.global_step == self.profile_steps[0]:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.cuda:
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._profiler = torch.profiler.profile(activities=activities, record_shapes=True,
+                                                    profile_memory=True, with_stack=False)
+            self._profiler.start()
+            print(f' Profiling steps {self.profile_steps[0]}-{self.profile_steps[1] - 1}...')
+
+    def _maybe_stop_profiler(self):
+        if self._profiler is not None and self.global_step >= self.profile_steps[1]:
+            self.close()
+
+    def close(self):
+        if self._profiler is not None:
+            self._profiler.stop()
+            self._profiler.export_chrome_trace(str(self.trace_file))
+            print(f' Chrome trace saved to {self.trace_file}')
+            self._profiler = None
+            self.profile_steps = None
@@ -0,0 +1,125 @@
+"""Precision / memory-format / compile modes for train_image_model.py, and the
+run history used to compare them against a plain fp32 run.
+
+Every finished run is appended to ``<output-dir>/runs.json``. The end-of-run
+summary compares it with the most recent baseline in that file: a full
+fine-tuning run (no ``--freeze-backbone``) in fp32 / contiguous / eager, with
+the same batch size, starting weights (ImageNet or ``--finetune-from``),
+number of torchrun processes and ``--async-val`` setting. Train a baseline once with the defaults and then try
+``--precision bf16``, ``--channels-last`` and ``--compile``. Frozen-backbone
+runs train only the head on cached features, so they are never a baseline.
+"""
+import json
+import os
+import time
+from contextlib import nullcontext
+
+import torch
+from torch.nn.parallel import DistributedDataParallel
+
+PRECISIONS = ('fp32', 'bf16')
+
+
+def prepare_model(model, channels_last=False, compile_model=False, ddp=False):
+    """Returns (model to run, model to save). torch.compile and DDP wrap the module, and
+    their state_dict keys gain a prefix, so checkpoints come from the original."""
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    run_model = DistributedDataParallel(model) if ddp else model
+    if compile_model:
+        run_model = torch.compile(run_model)
+    return run_model, model
+
+
+def to_device(images, device, channels_last=False, non_blocking=False):
+    if channels_last:
+        return images.to(device, memory_format=torch.channels_last, non_blocking=non_blocking)
+    return images.to(device, non_blocking=non_blocking)
+
+
+def autocast(device, precision):
+    """Autocast context for ``precision``; fp32 runs without one."""
+    if precision == 'fp32':
+        return nullcontext()
+    if precision == 'bf16':
+        return torch.autocast(device_type=torch.device(device).type, dtype=torch.bfloat16)
+    raise ValueError(f'Unknown precision {precision!r}; expected one of {PRECISIONS}')
+
+
+def mode_name(run):
+    parts = [run['precision']]
+    if run['channels_last']:
+        parts.append('channels_last')
+    if run['compile']:
+        parts.append('compile')
+    if run.get('freeze_backbone'):
+        parts.append('frozen_backbone')
+    if run.get('finetune_from'):
+        parts.append('finetune')
+    if run.get('world_size', 1) > 1:
+        parts.append(f"ddp{run['world_size']}")
+    if run.get('async_val'):
+        parts.append('async_val')
+    return '+'.join(parts)
+
+
+def is_baseline(run):
+    """fp32 / contiguous / eager full fine-tuning (every layer trained)."""
+    return (run['precision'] == 'fp32' and not run['channels_last'] and not run['compile']
+            and not run.get('freeze_backbone'))
+
+
+def comparable(run, base):
+    """Same batch size, starting weights, process count and validation mode, so epoch
+    times and accuracy can be compared."""
+    return (run.get('batch_size') == base.get('batch_size')
+            and run.get('finetune_from') == base.get('finetune_from')
+            and run.get('world_size', 1) == base.get('world_size', 1)
+            and bool(run.get('async_val')) == bool(base.get('async_val')))
+
+
+# ==================== RUN HISTORY ====================
+
+def record_run(output_dir, run):
+    """Append ``run`` to runs.json; return the history before it."""
+    path = os.path.join(output_dir, 'runs.json')
+    history = []
+    if os.path.exists(path):
+        with open(path) as f:
+            history = json.load(f)
+    run = dict(run, finished_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(history + [run], f, indent=2)
+    os.replace(tmp, path)
+    return history
+
+
+def summarize(run, history):
+    """Text comparing ``run`` with the latest fp32 baseline in ``history``."""
+    lines = [f"Run summary ({mode_name(run)}): {run['mean_epoch_s']:.1f}s/epoch over {len(run['epoch_s'])} epochs, "
+             f"final val acc {_fmt_acc(run['final_val_acc'])}"]
+    baselines = [r for r in history if is_baseline(r) and comparable(run, r)]
+    if is_baseline(run):
+        lines.append(' This is an fp32 baseline; later runs in this output dir will be compared against it.')
+    elif not baselines:
+        lines.append(' No fp32 baseline with this batch size, starting weights, process count and validation '
+                     'mode in runs.json yet; run once without --precision/--channels-last/--compile/'
+                     '--freeze-backbone to get a comparison.')
+    else:
+        base = baselines[-1]
+        speedup = base['mean_epoch_s'] / run['mean_epoch_s'] if run['mean_epoch_s'] else float('nan')
+        lines.append(f" vs fp32 baseline ({base['finished_at']}): {base['mean_epoch_s']:.1f}s/epoch, "
+                     f"final val acc {_fmt_acc(base['final_val_acc'])}")
+        lines.append(f' speedup x{speedup:.2f}, val acc delta {_fmt_delta(run, base)}')
+    return '\n'.join(lines)
+
+
+def _fmt_acc(acc):
+    return 'n/a' if acc is None else f'{acc:.4f}'
+
+
+def _fmt_delta(run, base):
+    if run['final_val_acc'] is None or base['final_val_acc'] is None:
+        return 'n/a'
+    return f"{run['final_val_acc'] - base['final_val_acc']:+.4f}"
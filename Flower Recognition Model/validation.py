@@ -0,0 +1,121 @@
+"""Validation helpers for train_image_model.py.
+
+* ``evaluate`` runs a loader under torch.inference_mode and returns on-device
+  counts, so the caller reads one number per pass.
+* ``stratified_subset`` keeps the same fraction of every class, for cheap
+  per-epoch checks (``--val-subsample``); the full set is still evaluated when
+  the subsample improves and at the end of training.
+* ``BackgroundValidator`` (``--async-val``) evaluates a CPU snapshot of the
+  weights in a separate process while the next epoch trains. It reuses one
+  spawned process and one DataLoader for the whole run.
+"""
+import queue
+import random
+from collections import defaultdict
+
+import torch
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.utils.data import Subset, TensorDataset
+from torchvision import models
+
+from data_loading import make_loader
+from training_modes import autocast, to_device
+
+
+def evaluate(model, loader, device, precision='fp32', channels_last=False):
+    """(correct count as a tensor on ``device``, number of samples). Leaves ``model`` in eval mode."""
+    model.eval()
+    correct = torch.zeros((), dtype=torch.long, device=device)
+    total = 0
+    with torch.inference_mode(), autocast(device, precision):
+        for images, labels in loader:
+            images = to_device(images, device, channels_last)
+            labels = labels.to(device)
+            correct += (model(images).argmax(dim=1) == labels).sum()
+            total += labels.size(0)
+    return correct, total
+
+
+def _targets(dataset):
+    if isinstance(dataset, Subset):
+        parent = _targets(dataset.dataset)
+        return [parent[i] for i in dataset.indices]
+    if isinstance(dataset, TensorDataset):
+        return dataset.tensors[1].tolist()
+    return list(dataset.targets)
+
+
+def stratified_subset(dataset, fraction, seed=0):
+    """Subset with ``fraction`` of each class (at least one image per class)."""
+    by_class = defaultdict(list)
+    for i, label in enumerate(_targets(dataset)):
+        by_class[int(label)].append(i)
+    rng = random.Random(seed)
+    indices = []
+    for members in by_class.values():
+        indices.extend(rng.sample(members, max(1, round(len(members) * fraction))))
+    return Subset(dataset, sorted(indices))
+
+
+# ==================== BACKGROUND VALIDATION ====================
+
+def _worker(dataset, num_classes, batch_size, num_workers, threads, precision, jobs, results):
+    torch.set_num_threads(threads)
+    model = models.resnet18()
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    model.eval()
+    loader = make_loader(dataset, batch_size, num_workers=num_workers, persistent_workers=num_workers > 0)
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        epoch, state = job
+        model.load_state_dict(state)
+        correct, total = evaluate(model, loader, 'cpu', precision)
+        results.put((epoch, int(correct), total))
+
+
+class BackgroundValidator:
+    """Validates weight snapshots in a spawned process on the CPU.
+
+    ``submit`` copies the current weights and returns immediately; ``results``
+    returns ``(epoch, accuracy, state_dict)`` for every finished snapshot, so the
+    caller can save the weights that were actually evaluated.
+    """
+
+    def __init__(self, dataset, num_classes, batch_size, num_workers=0, threads=1, precision='fp32'):
+        ctx = mp.get_context('spawn')
+        self._jobs = ctx.Queue()
+        self._results = ctx.Queue()
+        self._pending = {}
+        # Not a daemon: the worker may start its own DataLoader worker processes
+        self._proc = ctx.Process(target=_worker, args=(dataset, num_classes, batch_size, num_workers, threads,
+                                                       precision, self._jobs, self._results))
+        self._proc.start()
+
+    def submit(self, epoch, model):
+        state = {k: v.detach().to('cpu', copy=True) for k, v in model.state_dict().items()}
+        self._pending[epoch] = state
+        self._jobs.put((epoch, state))
+
+    def results(self, block=False):
+        done = []
+        while self._pending:
+            try:
+                epoch, correct, total = self._results.get(timeout=1.0) if block else self._results.get_nowait()
+            except queue.Empty:
+                if not block:
+                    break
+                if not self._proc.is_alive():
+                    raise RuntimeError(f'Background validation process exited with code {self._proc.exitcode}')
+                continue
+            done.append((epoch, correct / max(total, 1), self._pending.pop(epoch)))
+        return done
+
+    def close(self):
+        """Wait for outstanding snapshots, stop the process and return their results."""
+        done = self.results(block=True)
+        self._jobs.put(None)
+        self._proc.join()
+        return done
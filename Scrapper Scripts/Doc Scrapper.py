@@ -1,9 +1,16 @@
 import os
+import threading
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from functools import partial
 import json
 
+from crawl_state import CrawlState, normalize_url
+from html_parsing import default_backend, iter_links, keyword_pattern
+from http_cache import DEFAULT_CACHE_DIR, HttpCache, install
+from resumable_download import DownloadError, fetch_file
+from scrape_engine import CrawlEngine, RetryPolicy
+
 # ==================== EASILY EDITABLE CONFIGURATION ====================
 
 # Target directory where PDFs will be saved
@@ -60,27 +67,106 @@ DIRECT_SOURCES = [
     }
 ]
 
-# ==================== END OF CONFIGURATION ====================
+# ==================== CONCURRENCY ====================
+# Pages are fetched by PAGE_WORKERS threads; the PDF links they find are
+# downloaded by DOWNLOAD_WORKERS threads. No host gets more than
+# MAX_CONNECTIONS_PER_HOST requests at once, or more than one new request
+# every POLITENESS_DELAY seconds.
+
+PAGE_WORKERS = 4
+DOWNLOAD_WORKERS = 8
+MAX_CONNECTIONS_PER_HOST = 2
+POLITENESS_DELAY = 0.5
+REQUEST_TIMEOUT = 15
+
+# Timeouts, connection errors, 429 and 5xx are retried up to MAX_RETRIES times
+# with exponential backoff (BACKOFF_BASE * 2^n seconds, jittered, at most
+# BACKOFF_MAX) or after the server's Retry-After. A broken PDF transfer is
+# resumed from where it stopped. A 429 / 503 also slows that host down. A host
+# where BREAKER_FAILURES requests in a row fail (after their retries) is skipped
+# for the rest of the run.
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+BREAKER_FAILURES = 5
+
+# Crawl state (visited pages, downloads, ETags) kept in TARGET_DIR between runs.
+# Re-runs send conditional GETs and skip anything unchanged. Set to None to disable.
+CRAWL_STATE_FILE = 'crawl_state.sqlite'
+
+# ==================== HTTP CACHE ====================
+# Fetched pages (not PDFs) are kept in an on-disk cache shared with
+# Wiki Table Data Scraper.py, so re-runs while tuning the extractors are fast.
+# 'normal' follows Cache-Control / ETag, 'replay' serves only from the cache and
+# never touches the network (offline / CI runs), 'refresh' re-fetches everything.
+# Set HTTP_CACHE_DIR = None to disable.
 
-# Create target directory
-os.makedirs(TARGET_DIR, exist_ok=True)
+HTTP_CACHE_DIR = DEFAULT_CACHE_DIR
+HTTP_CACHE_MODE = os.environ.get('SCRAPER_CACHE_MODE', 'normal')
+HTTP_CACHE_MAX_MB = 200
 
-print("🔍 Starting Web Scraper for SQL, Python, and PostgreSQL Documents...")
-print(f"📁 Target directory: {TARGET_DIR}\n")
+# ==================== PARSING ====================
+# 'selectolax', 'lxml' or 'bs4'; None picks the fastest one installed.
+# Only <a href> elements are extracted from each page.
+
+HTML_PARSER = None
+
+# Broader terms that make a book/resource link on a direct source worth trying
+RESOURCE_TERMS = ['sql', 'python', 'postgres', 'database', 'data', 'programming']
+
+# ==================== END OF CONFIGURATION ====================
 
 # ==================== SCRAPER CLASS ====================
 
 class PDFScraper:
     """Main scraper class for downloading PDFs with configurable sources"""
     
-    def __init__(self):
+    def __init__(self, target_dir=None, max_downloads=None, search_sources=None, direct_sources=None,
+                 include_fallbacks=True, host_delay=None, state_file=CRAWL_STATE_FILE,
+                 cache_dir=HTTP_CACHE_DIR, cache_mode=HTTP_CACHE_MODE):
+        self.target_dir = target_dir or TARGET_DIR
+        self.max_downloads = MAX_DOWNLOADS if max_downloads is None else max_downloads
+        self.search_sources = SEARCH_SOURCES if search_sources is None else search_sources
+        self.direct_sources = DIRECT_SOURCES if direct_sources is None else direct_sources
+        self.include_fallbacks = include_fallbacks
+        self.state_file = state_file
+        self.state = None
+        self.cache_dir = cache_dir
+        self.cache_mode = cache_mode
+        self.cache = None
         self.documents = []
-        self.downloaded_count = 0
+        self._seen = set()
+        self.downloaded = []
+        self.manifest = []
+        self._hashes = {}
+        self._in_flight = set()  # filenames a download worker is writing right now
+        self._lock = threading.Lock()
+        self.parser = HTML_PARSER or default_backend()
+        self.keyword_re = keyword_pattern(REQUIRED_KEYWORDS)
+        self.resource_re = keyword_pattern(RESOURCE_TERMS)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         }
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
+        self.engine = CrawlEngine(
+            self.new_session, self.max_downloads,
+            page_workers=PAGE_WORKERS, download_workers=DOWNLOAD_WORKERS,
+            max_per_host=MAX_CONNECTIONS_PER_HOST,
+            host_delay=POLITENESS_DELAY if host_delay is None else host_delay,
+            timeout=REQUEST_TIMEOUT, page_headers=self._page_headers,
+            retry=RetryPolicy(MAX_RETRIES, BACKOFF_BASE, BACKOFF_MAX),
+            breaker_threshold=BREAKER_FAILURES, max_delay=BACKOFF_MAX)
+    
+    def new_session(self):
+        """One session per worker thread"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        if self.cache:
+            install(session, self.cache)
+        return session
+    
+    @property
+    def downloaded_count(self):
+        return self.engine.budget.count
     
     # ==================== VALIDATION METHODS ====================
     
@@ -90,198 +176,239 @@ class PDFScraper:
     
     def has_required_keywords(self, title):
         """Check if title contains required keywords"""
-        title_lower = title.lower()
-        return any(keyword in title_lower for keyword in REQUIRED_KEYWORDS)
+        return self.keyword_re.search(title) is not None
     
     def is_duplicate(self, url):
-        """Check if document already exists in list"""
-        return any(doc['url'] == url for doc in self.documents)
+        """Check if document already exists in list (normalized URL, O(1))"""
+        return normalize_url(url) in self._seen
+    
+    def add_document(self, doc):
+        """Record a newly found document; False if another worker already has it"""
+        key = normalize_url(doc['url'])
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            self.documents.append(doc)
+            return True
     
     def file_exists(self, filename):
         """Check if file already downloaded"""
-        return os.path.exists(os.path.join(TARGET_DIR, filename))
+        return os.path.exists(os.path.join(self.target_dir, filename))
+    
+    def _reserve_filename(self, filename):
+        """Claim a filename for one download; a name another worker is writing gets a (2), (3)... suffix"""
+        stem, ext = os.path.splitext(filename)
+        with self._lock:
+            candidate, n = filename, 1
+            while candidate in self._in_flight or (candidate != filename and self.file_exists(candidate)):
+                n += 1
+                candidate = f"{stem} ({n}){ext}"
+            self._in_flight.add(candidate)
+            return candidate
+    
+    def _release_filename(self, filename):
+        with self._lock:
+            self._in_flight.discard(filename)
     
     # ==================== DOWNLOAD METHODS ====================
     
-    def download_file(self, url, filename):
-        """Download a file from URL and save it"""
+    def download_file(self, url, filename, session, conditional=None, source=None):
+        """Download a file from URL and save it (resumable, verified, atomic)"""
+        filepath = os.path.join(self.target_dir, filename)
+        fetch = partial(fetch_file, session, url, filepath, timeout=REQUEST_TIMEOUT, conditional=conditional,
+                        accept=partial(self._claim_content, filename))
+        
+        def on_retry(retry, reason):
+            # The .part file stays, so the retry (or the next run) resumes with a Range request
+            print(f"   ⬇️  {filename} ⚠️  {reason[:50]} - retrying ({retry}/{MAX_RETRIES})")
+        
         try:
-            print(f"   ⬇️  Downloading: {filename}...", end=" ")
-            
-            response = self.session.get(url, timeout=15, stream=True)
-            response.raise_for_status()
-            
-            filepath = os.path.join(TARGET_DIR, filename)
-            
-            # Write file in chunks
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            file_size_mb = os.path.getsize(filepath) / (1024 * 1024)
-            print(f"✅ ({file_size_mb:.2f} MB)")
-            return True
-            
+            result = self.engine.call(url, fetch, source, retry_on=(DownloadError, requests.RequestException),
+                                      on_retry=on_retry)
         except Exception as e:
-            print(f"❌ Failed: {str(e)[:50]}")
-            # Clean up failed download
-            try:
-                os.remove(os.path.join(TARGET_DIR, filename))
-            except:
-                pass
+            print(f"   ⬇️  {filename} ❌ Failed: {str(e)[:50]}")
+            return False
+        
+        if result.status == 'not-modified':
+            print(f"   ⏭️  {filename} (unchanged since last run)")
+            return False
+        if result.status == 'duplicate':
+            print(f"   ⏭️  {filename} (same content as {self._content_owner(result.sha256)})")
             return False
+        
+        if self.state:
+            self.state.record_download(url, filename, result.size, result.sha256, result.response)
+        with self._lock:
+            self.manifest.append({'filename': filename, 'url': url, 'size': result.size, 'sha256': result.sha256})
+        resumed = f", resumed at {result.resumed_from / (1024 * 1024):.2f} MB" if result.resumed_from else ""
+        print(f"   ⬇️  {filename} ✅ ({result.size / (1024 * 1024):.2f} MB{resumed})")
+        return True
+    
+    def _claim_content(self, filename, sha256):
+        """Content-hash dedup: False if these bytes are already stored under another name"""
+        with self._lock:
+            owner = self._hashes.get(sha256)
+            if owner is None and self.state:
+                owner = self.state.filename_for_sha256(sha256)
+                if owner and not self.file_exists(owner):
+                    owner = None
+            if owner is not None and owner != filename:
+                return False
+            self._hashes[sha256] = filename
+            return True
+    
+    def _content_owner(self, sha256):
+        with self._lock:
+            return self._hashes.get(sha256) or (self.state and self.state.filename_for_sha256(sha256))
     
-    def try_download_document(self, title, url):
-        """Attempt to download a document"""
+    def try_download_document(self, doc, session):
+        """Attempt to download a document (runs on a download worker)"""
+        title, url = doc['title'], doc['url']
         try:
             # Clean filename
             clean_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
             filename = f"{clean_title[:60]}.pdf"
             
-            # Check if file already exists
-            if self.file_exists(filename):
-                print(f"   ⏭️  {filename} (already exists)")
+            if self.cache and self.cache.mode == 'replay':
+                print(f"   ⏭️  {filename} (replay mode: PDFs are not cached)")
                 return False
             
-            return self.download_file(url, filename)
+            known = self.state.download(url) if self.state else None
+            if known and self.file_exists(known['filename']):
+                filename = known['filename']
+            
+            # Two links with the same title must not share a .part file
+            filename = self._reserve_filename(filename)
+            try:
+                # Downloaded on an earlier run: ask the server whether it changed
+                conditional = None
+                if self.file_exists(filename):
+                    if not known or known['filename'] != filename:
+                        print(f"   ⏭️  {filename} (already exists)")
+                        return False
+                    conditional = self.state.download_headers(url)
+                
+                if self.download_file(url, filename, session, conditional, doc.get('source')):
+                    if doc.get('counts', True):
+                        with self._lock:
+                            self.downloaded.append(doc)
+                    return True
+                return False
+            finally:
+                self._release_filename(filename)
         
         except Exception as e:
             print(f"   ❌ Error preparing download for {title}: {str(e)[:40]}")
             return False
     
-    # ==================== SCRAPING METHODS ====================
+    # ==================== LINK EXTRACTION ====================
+    # Each extractor gets a fetched page and yields (label, document) for every
+    # matching link; they run on the page workers. _process_page records the
+    # links in the crawl state and passes on the ones not seen yet this run.
+    
+    def _page_headers(self, url):
+        """Conditional GET headers for pages fetched on an earlier run"""
+        return self.state.page_headers(url) if self.state else None
+    
+    def _process_page(self, url, extractor, response):
+        if response.status_code == 304 and self.state:
+            # Unchanged since last run: replay the links found then instead of parsing
+            found = [("Found (unchanged page)", doc) for doc in self.state.page_links(url)]
+        else:
+            found = list(extractor(response))
+            if self.state and response.status_code == 200:
+                self.state.record_page(url, response, [doc for _, doc in found])
+        
+        for label, doc in found:
+            if self.add_document(doc):
+                print(f"   {label}: {doc['title']}")
+                yield doc
+    
+    def _page_job(self, url, extractor, source):
+        return url, partial(self._process_page, url, extractor), source
+    
+    def _document(self, title, full_url, source_name, label="Found"):
+        return label, {'title': title, 'url': full_url, 'source': source_name, 'type': 'PDF'}
+    
+    def _extract_welib(self, base_url, response):
+        """welib.org pages: any keyword link that points to a downloadable resource"""
+        if response.status_code != 200:
+            return
+        
+        for href, title in iter_links(response.content, self.parser):
+            href_lower = href.lower()
+            
+            # Check if link contains keywords and points to a downloadable resource
+            if (href and title and len(title) > 3 and
+                ('.pdf' in href_lower or '/download' in href_lower or '/file' in href_lower) and
+                (self.keyword_re.search(title) or self.keyword_re.search(href))):
+                yield self._document(title, urljoin(base_url, href), 'Welib.org')
+    
+    def _extract_search_results(self, search_url, source_name, response):
+        """Search result pages"""
+        if response.status_code != 200:
+            return
+        
+        for href, title in iter_links(response.content, self.parser):
+            href_lower = href.lower()
+            
+            # Validate document - keywords in title or href, and it looks like a PDF/download
+            if (title and len(title) > 3 and
+                ('.pdf' in href_lower or 'download' in href_lower or 'pdf' in title.lower()) and
+                (self.keyword_re.search(title) or self.keyword_re.search(href))):
+                
+                # Make absolute URL if relative
+                yield self._document(title, urljoin(search_url, href), source_name)
     
-    def scrape_search_sources(self):
-        """Scrape from all configured search sources"""
-        for source in SEARCH_SOURCES:
-            if not source['enabled'] or self.downloaded_count >= MAX_DOWNLOADS:
+    def _extract_direct_source(self, source, response):
+        """Configured direct source pages"""
+        if response.status_code != 200:
+            return
+        
+        for href, title in iter_links(response.content, self.parser):
+            if not (href and title and len(title) > 2):
                 continue
+            href_lower, title_lower = href.lower(), title.lower()
+            
+            # Direct PDF links with keywords (highest priority)
+            if '.pdf' in href_lower and (self.keyword_re.search(title) or self.keyword_re.search(href)):
+                yield self._document(title, urljoin(source['url'], href), source['name'], "Found PDF")
             
-            print(f"🌐 Scraping {source['name']}...")
+            # Links that look like book/resource links with keywords
+            elif (('download' in href_lower or 'pdf' in title_lower or
+                   'book' in title_lower or 'guide' in title_lower) and
+                  (self.resource_re.search(title) or self.resource_re.search(href))):
+                yield self._document(title, urljoin(source['url'], href), source['name'], "Found Resource")
+    
+    # ==================== SCRAPING METHODS ====================
+    
+    def search_source_pages(self):
+        """(url, extractor, source) jobs for all configured search sources"""
+        for source in self.search_sources:
+            if not source['enabled']:
+                continue
             
             # Special handling for Welib
             if 'welib' in source['base_url'].lower():
-                self._scrape_welib()
+                for base_url in ['https://welib.org/', 'https://welib.org/books/', 'https://welib.org/resources/']:
+                    yield self._page_job(base_url, partial(self._extract_welib, base_url), 'Welib.org')
                 continue
             
             for keyword in SEARCH_KEYWORDS:
-                if self.downloaded_count >= MAX_DOWNLOADS:
-                    break
-                
                 for template in source['search_templates']:
-                    if self.downloaded_count >= MAX_DOWNLOADS:
-                        break
-                    
                     search_url = source['base_url'] + template.format(keyword=keyword)
-                    self._process_search_results(search_url, source['name'])
+                    yield self._page_job(search_url, partial(self._extract_search_results, search_url, source['name']),
+                                         source['name'])
     
-    def _scrape_welib(self):
-        """Special scraper for welib.org - fetches PDF list from their catalog"""
-        try:
-            # Try to access welib's books/resources page
-            base_urls = [
-                'https://welib.org/',
-                'https://welib.org/books/',
-                'https://welib.org/resources/'
-            ]
-            
-            for base_url in base_urls:
-                if self.downloaded_count >= MAX_DOWNLOADS:
-                    return
-                
-                try:
-                    response = self.session.get(base_url, timeout=15)
-                    if response.status_code != 200:
-                        continue
-                    
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Look for all links that might contain PDFs
-                    links = soup.find_all('a', href=True)
-                    
-                    for link in links:
-                        if self.downloaded_count >= MAX_DOWNLOADS:
-                            return
-                        
-                        href = link.get('href')
-                        title = link.get_text(strip=True)
-                        
-                        # Check if link contains keywords and points to a downloadable resource
-                        has_keywords = any(kw in title.lower() or kw in href.lower() for kw in REQUIRED_KEYWORDS)
-                        
-                        if (href and title and len(title) > 3 and has_keywords and 
-                            ('.pdf' in href.lower() or '/download' in href.lower() or '/file' in href.lower())):
-                            
-                            full_url = urljoin(base_url, href)
-                            
-                            if not self.is_duplicate(full_url):
-                                self.documents.append({
-                                    'title': title,
-                                    'url': full_url,
-                                    'source': 'Welib.org',
-                                    'type': 'PDF'
-                                })
-                                
-                                print(f"   Found: {title}")
-                                if self.try_download_document(title, full_url):
-                                    self.downloaded_count += 1
-                
-                except Exception as inner_e:
-                    continue
-        
-        except Exception as e:
-            pass
+    def direct_source_pages(self):
+        """(url, extractor, source) jobs for all configured direct sources"""
+        for source in self.direct_sources:
+            if source['enabled']:
+                yield self._page_job(source['url'], partial(self._extract_direct_source, source), source['name'])
     
-    def _process_search_results(self, search_url, source_name):
-        """Process search results from a given URL"""
-        try:
-            response = self.session.get(search_url, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            links = soup.find_all('a', href=True)
-            
-            for link in links:
-                if self.downloaded_count >= MAX_DOWNLOADS:
-                    return
-                
-                href = link.get('href')
-                title = link.get_text(strip=True)
-                
-                # Check if link has keywords in title or in the href
-                has_keywords_in_title = self.has_required_keywords(title)
-                has_keywords_in_url = any(kw in href.lower() for kw in REQUIRED_KEYWORDS)
-                
-                # Validate document - more flexible matching
-                if (title and len(title) > 3 and
-                    (has_keywords_in_title or has_keywords_in_url) and
-                    not self.is_duplicate(href) and
-                    ('.pdf' in href.lower() or 'download' in href.lower() or 'pdf' in title.lower())):
-                    
-                    # Make absolute URL if relative
-                    full_url = urljoin(search_url, href)
-                    
-                    if not self.is_duplicate(full_url):
-                        self.documents.append({
-                            'title': title,
-                            'url': full_url,
-                            'source': source_name,
-                            'type': 'PDF'
-                        })
-                        
-                        print(f"   Found: {title}")
-                        if self.try_download_document(title, full_url):
-                            self.downloaded_count += 1
-        
-        except Exception as e:
-            pass  # Silently continue on error
-    
-    def scrape_direct_sources(self):
-        """Scrape from direct source URLs"""
-        print("🌐 Scraping Direct Sources...")
-        
-        # Add known public PDF sources that commonly have tutorials
+    def fallback_documents(self):
+        """Known public tutorial pages; tried, but they don't count towards MAX_DOWNLOADS"""
         fallback_pdfs = [
             {
                 'title': 'PostgreSQL Tutorial - Official Documentation',
@@ -324,91 +451,32 @@ class PDFScraper:
                 'source': 'TutorialsPoint'
             }
         ]
-        
-        # Add fallback resources
         for pdf in fallback_pdfs:
-            if self.downloaded_count >= MAX_DOWNLOADS:
-                return
-            
-            if not self.is_duplicate(pdf['url']):
-                self.documents.append(pdf)
+            if self.add_document(pdf):
                 print(f"   Found: {pdf['title']}")
-                # Attempt download but don't fail if it's not a direct PDF
-                self.try_download_document(pdf['title'], pdf['url'])
-        
-        # Try scraping configured sources
-        for source in DIRECT_SOURCES:
-            if not source['enabled'] or self.downloaded_count >= MAX_DOWNLOADS:
-                continue
-            
-            try:
-                print(f"   Checking {source['name']}...")
-                response = self.session.get(source['url'], timeout=15)
-                
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    links = soup.find_all('a', href=True)
-                    
-                    for link in links:
-                        if self.downloaded_count >= MAX_DOWNLOADS:
-                            return
-                        
-                        href = link.get('href')
-                        title = link.get_text(strip=True)
-                        
-                        # More flexible matching - look for PDFs with or without keywords
-                        is_pdf_link = '.pdf' in href.lower()
-                        has_keywords = any(kw in title.lower() or kw in href.lower() for kw in REQUIRED_KEYWORDS)
-                        has_any_db_term = any(term in title.lower() or term in href.lower() 
-                                             for term in ['sql', 'python', 'postgres', 'database', 'data', 'programming'])
-                        
-                        if (href and title and len(title) > 2):
-                            # Direct PDF links with keywords (highest priority)
-                            if is_pdf_link and has_keywords:
-                                full_url = urljoin(source['url'], href)
-                                if not self.is_duplicate(full_url):
-                                    self.documents.append({
-                                        'title': title,
-                                        'url': full_url,
-                                        'source': source['name'],
-                                        'type': 'PDF'
-                                    })
-                                    print(f"   Found PDF: {title}")
-                                    if self.try_download_document(title, full_url):
-                                        self.downloaded_count += 1
-                            
-                            # Links that look like book/resource links with keywords
-                            elif (('download' in href.lower() or 'pdf' in title.lower() or 
-                                   'book' in title.lower() or 'guide' in title.lower()) and 
-                                  has_any_db_term):
-                                full_url = urljoin(source['url'], href)
-                                if not self.is_duplicate(full_url):
-                                    print(f"   Found Resource: {title}")
-                                    self.documents.append({
-                                        'title': title,
-                                        'url': full_url,
-                                        'source': source['name'],
-                                        'type': 'PDF'
-                                    })
-                                    if self.try_download_document(title, full_url):
-                                        self.downloaded_count += 1
-            
-            except Exception as e:
-                pass  # Silently continue on error
+                yield dict(pdf, counts=False)
+    
+    def scrape_all(self):
+        """Search sources, then direct sources, through the concurrent engine"""
+        print(f"🌐 Scraping {len(self.search_sources)} search and {len(self.direct_sources)} direct sources "
+              f"({PAGE_WORKERS} page / {DOWNLOAD_WORKERS} download workers)...")
+        pages = list(self.search_source_pages()) + list(self.direct_source_pages())
+        fallbacks = list(self.fallback_documents()) if self.include_fallbacks else []
+        self.engine.run(pages, self.try_download_document, seeds=fallbacks)
     
     # ==================== REPORTING METHODS ====================
     
     def save_documents_list(self):
         """Save list of documents to file"""
-        output_file = os.path.join(TARGET_DIR, "downloaded_documents_list.txt")
+        output_file = os.path.join(self.target_dir, "downloaded_documents_list.txt")
         
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write("=" * 80 + "\n")
             f.write("SQL, Python, and PostgreSQL Documents - Downloaded\n")
             f.write("=" * 80 + "\n\n")
-            f.write(f"Total Downloaded: {self.downloaded_count}/{MAX_DOWNLOADS}\n\n")
+            f.write(f"Total Downloaded: {self.downloaded_count}/{self.max_downloads}\n\n")
             
-            for idx, doc in enumerate(self.documents[:self.downloaded_count], 1):
+            for idx, doc in enumerate(self.downloaded, 1):
                 f.write(f"{idx}. {doc['title']}\n")
                 f.write(f"   URL: {doc['url']}\n")
                 f.write(f"   Source: {doc['source']}\n")
@@ -417,17 +485,48 @@ class PDFScraper:
         
         print(f"\n✅ Saved documents list to: {output_file}")
     
+    def save_manifest(self):
+        """Save filename / URL / size / SHA-256 of every stored PDF"""
+        manifest_file = os.path.join(self.target_dir, "manifest.json")
+        entries = self.state.manifest() if self.state else self.manifest
+        
+        tmp = manifest_file + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp, manifest_file)
+        
+        print(f"✅ Saved manifest ({len(entries)} files) to: {manifest_file}")
+    
+    def save_source_stats(self):
+        """Print and save per-source request stats (latency, bytes, failures, retries)"""
+        stats_file = os.path.join(self.target_dir, "source_stats.json")
+        report = self.engine.stats.report()
+        
+        with open(stats_file, 'w', encoding='utf-8') as f:
+            json.dump({'sources': report, 'tripped_hosts': sorted(self.engine.breaker.open_hosts)}, f, indent=2)
+        
+        print(f"\n📈 Per-source stats:")
+        print(f"   {'source':<32}{'req':>5}{'ok':>5}{'fail':>5}{'retry':>6}{'429/503':>8}{'skip':>5}"
+              f"{'cache':>6}{'MB':>8}{'avg ms':>8}{'max ms':>8}")
+        for source, row in report.items():
+            print(f"   {source[:31]:<32}{row['requests']:>5}{row['ok']:>5}{row['failed']:>5}{row['retries']:>6}"
+                  f"{row['throttled']:>8}{row['skipped']:>5}{row['cached']:>6}{row['bytes'] / (1024 * 1024):>8.2f}"
+                  f"{row['avg_ms']:>8.0f}{row['max_ms']:>8.0f}")
+        for host in sorted(self.engine.breaker.open_hosts):
+            print(f"   🚫 {host} was skipped after repeated failures")
+        print(f"✅ Saved source stats to: {stats_file}")
+    
     def save_config_template(self):
         """Save a template config file for easy updates"""
-        config_file = os.path.join(TARGET_DIR, "scraper_config.json")
+        config_file = os.path.join(self.target_dir, "scraper_config.json")
         
         template = {
             'description': 'Scraper configuration - modify to update URLs and keywords',
             'required_keywords': REQUIRED_KEYWORDS,
             'search_keywords': SEARCH_KEYWORDS,
-            'search_sources': SEARCH_SOURCES,
-            'direct_sources': DIRECT_SOURCES,
-            'max_downloads': MAX_DOWNLOADS
+            'search_sources': self.search_sources,
+            'direct_sources': self.direct_sources,
+            'max_downloads': self.max_downloads
         }
         
         with open(config_file, 'w', encoding='utf-8') as f:
@@ -439,31 +538,47 @@ class PDFScraper:
     
     def run(self):
         """Execute all scrapers"""
+        os.makedirs(self.target_dir, exist_ok=True)
+        if self.state_file:
+            self.state = CrawlState(os.path.join(self.target_dir, self.state_file))
+            known = self.state.stats()
+            print(f"🗂️  Crawl state: {known['pages']} pages, {known['downloads']} downloads known")
+        if self.cache_dir:
+            self.cache = HttpCache(self.cache_dir, HTTP_CACHE_MAX_MB * 1024 * 1024, self.cache_mode)
+            print(f"💾 HTTP cache ({self.cache_mode}): {self.cache.stats()['entries']} pages in {self.cache_dir}")
+        print(f"🧩 HTML parser: {self.parser}")
         print("=" * 80)
         print("Starting PDF Document Download Process...")
         print("=" * 80 + "\n")
         
-        # Run all scraping methods
-        self.scrape_search_sources()
-        
-        if self.downloaded_count < MAX_DOWNLOADS:
-            self.scrape_direct_sources()
+        self.scrape_all()
         
         # Save results
         self.save_documents_list()
+        self.save_manifest()
+        self.save_source_stats()
         self.save_config_template()
+        if self.state:
+            self.state.close()
+        if self.cache:
+            stats = self.cache.stats()
+            print(f"💾 HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, "
+                  f"{stats['misses']} fetched, {stats['bytes'] / 1024 / 1024:.1f} MB stored")
+            self.cache.close()
         
         # Print summary
         print(f"\n{'=' * 80}")
         print(f"✅ Scraping and Download Complete!")
-        print(f"📊 Documents Downloaded: {self.downloaded_count}/{MAX_DOWNLOADS}")
-        print(f"📁 Location: {TARGET_DIR}")
-        print(f"⚙️  Config Template: {os.path.join(TARGET_DIR, 'scraper_config.json')}")
+        print(f"📊 Documents Downloaded: {self.downloaded_count}/{self.max_downloads}")
+        print(f"📁 Location: {self.target_dir}")
+        print(f"⚙️  Config Template: {os.path.join(self.target_dir, 'scraper_config.json')}")
         print(f"{'=' * 80}")
 
 # ==================== MAIN EXECUTION ====================
 
 if __name__ == "__main__":
+    print("🔍 Starting Web Scraper for SQL, Python, and PostgreSQL Documents...")
+    print(f"📁 Target directory: {TARGET_DIR}\n")
     scraper = PDFScraper()
     scraper.run()
-    print("\n✨ Web scraper finished successfully!")
\ No newline at end of file
+    print("\n✨ Web scraper finished successfully!")
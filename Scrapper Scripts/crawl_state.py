@@ -0,0 +1,149 @@
+"""URL normalization and persistent crawl state for Doc Scrapper.py.
+
+``normalize_url`` maps the spellings of one URL (host case, default port,
+fragment, query parameter order) to a single key, so in-run dedup can use a
+plain set.
+
+``CrawlState`` is a small SQLite database kept next to the downloads. It
+records:
+
+    pages       url, ETag / Last-Modified, status, fetched_at, links found on the page
+    downloads   url, filename, size, sha256, ETag / Last-Modified, downloaded_at
+
+On the next run, pages and known downloads are fetched with If-None-Match /
+If-Modified-Since. A 304 costs one round trip and no body. For an unchanged
+page, the links recorded last time are replayed instead of re-parsing it.
+"""
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    status INTEGER,
+    fetched_at REAL,
+    links TEXT
+);
+CREATE TABLE IF NOT EXISTS downloads (
+    url TEXT PRIMARY KEY,
+    filename TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    downloaded_at REAL
+);
+CREATE INDEX IF NOT EXISTS downloads_sha256 ON downloads (sha256);
+"""
+
+
+def normalize_url(url):
+    """Canonical form used as the dedup / state key."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+    if parts.username:
+        host = f'{parts.username}@{host}'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def validators(response):
+    """(ETag, Last-Modified) from a response, either may be None."""
+    return response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+
+def conditional_headers(etag, last_modified):
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+class CrawlState:
+    """Thread-safe wrapper around the crawl-state database."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _one(self, sql, args):
+        with self._lock:
+            return self._db.execute(sql, args).fetchone()
+
+    def _write(self, sql, args):
+        with self._lock, self._db:
+            self._db.execute(sql, args)
+
+    # ==================== PAGES ====================
+
+    def page_headers(self, url):
+        """Conditional-request headers for a page fetched on an earlier run."""
+        row = self._one('SELECT etag, last_modified FROM pages WHERE url = ?', (normalize_url(url),))
+        return conditional_headers(*row) if row else {}
+
+    def record_page(self, url, response, links):
+        etag, last_modified = validators(response)
+        self._write('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)',
+                    (normalize_url(url), etag, last_modified, response.status_code, time.time(), json.dumps(links)))
+
+    def page_links(self, url):
+        """Links recorded for ``url`` on the last full fetch."""
+        row = self._one('SELECT links FROM pages WHERE url = ?', (normalize_url(url),))
+        return json.loads(row[0]) if row and row[0] else []
+
+    # ==================== DOWNLOADS ====================
+
+    def download(self, url):
+        """Recorded download for ``url`` as a dict, or None."""
+        row = self._one('SELECT filename, size, sha256, etag, last_modified FROM downloads WHERE url = ?',
+                        (normalize_url(url),))
+        if row is None:
+            return None
+        return dict(zip(('filename', 'size', 'sha256', 'etag', 'last_modified'), row))
+
+    def download_headers(self, url):
+        known = self.download(url)
+        return conditional_headers(known['etag'], known['last_modified']) if known else {}
+
+    def record_download(self, url, filename, size, sha256, response):
+        etag, last_modified = validators(response)
+        self._write('INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (normalize_url(url), filename, size, sha256, etag, last_modified, time.time()))
+
+    def filename_for_sha256(self, sha256):
+        """Filename of an earlier download with this content hash, or None."""
+        row = self._one('SELECT filename FROM downloads WHERE sha256 = ? LIMIT 1', (sha256,))
+        return row[0] if row else None
+
+    def manifest(self):
+        """Every recorded download, oldest first."""
+        with self._lock:
+            rows = self._db.execute('SELECT filename, url, size, sha256, etag, last_modified, downloaded_at '
+                                    'FROM downloads ORDER BY downloaded_at').fetchall()
+        keys = ('filename', 'url', 'size', 'sha256', 'etag', 'last_modified', 'downloaded_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            pages = self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            downloads = self._db.execute('SELECT COUNT(*) FROM downloads').fetchone()[0]
+        return {'pages': pages, 'downloads': downloads}
@@ -0,0 +1,303 @@
+"""Local stand-in for the PDF sites, for running Doc Scrapper.py offline.
+
+Serves ``fixtures/`` (search and listing pages plus small PDFs) from
+127.0.0.1 with an optional per-request latency, so that the concurrent
+engine's behaviour shows up in timings. Query strings are ignored, so every
+``search.html?q=<keyword>`` request gets the same result page. PDFs are
+served with an ETag and support ``Range`` / ``If-Range``; with ``--flaky``
+the first transfer of each PDF is cut off halfway, to exercise resuming.
+With ``--throttle`` the first request for every other PDF gets a 429 with
+Retry-After, and everything under ``/down/`` answers 503. The check adds a
+search source on ``localhost`` (a separate host for the scraper) that points
+there, to exercise retries, rate adaptation and the circuit breaker.
+
+    python fixture_server.py --check                 # offline end-to-end run of PDFScraper
+    python fixture_server.py --check --max-downloads 3 --latency 0.2
+    python fixture_server.py --check --flaky
+    python fixture_server.py --check --throttle
+    python fixture_server.py --port 8765             # just serve the fixtures
+
+``--check`` runs PDFScraper against the server twice into the same temporary
+directory and exits with status 1 unless the expected files arrived,
+MAX_DOWNLOADS was respected, no more than MAX_CONNECTIONS_PER_HOST requests
+were in flight at once, the mirrored copy of a PDF was not stored twice, and
+the second run re-used the crawl state (conditional GETs answered with 304,
+nothing downloaded twice). A third run stops the server and replays the pages
+from the HTTP cache; it must find the same documents. With ``--flaky`` it also
+checks that the cut-off transfers were resumed with Range requests. With
+``--throttle`` it checks that the 429s were retried and that the failing host
+was cut off by its circuit breaker.
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, 'fixtures')
+FIXTURE_PDFS = sorted(f for f in os.listdir(os.path.join(FIXTURES, 'pdfs')) if f.endswith('.pdf'))
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+    lock = threading.Lock()
+    in_flight = {}  # per Host header: 127.0.0.1 and localhost are separate hosts to the scraper
+    peak_in_flight = 0
+    requests = 0
+    not_modified = 0
+    partial = 0
+    flaky = False
+    cut = set()
+    throttle = False
+    throttled_paths = set()
+    throttled = 0
+    down = 0
+
+    def do_GET(self):
+        cls = type(self)
+        host = self.headers.get('Host', '')
+        with cls.lock:
+            cls.in_flight[host] = cls.in_flight.get(host, 0) + 1
+            cls.requests += 1
+            cls.peak_in_flight = max(cls.peak_in_flight, cls.in_flight[host])
+        try:
+            if cls.latency:
+                time.sleep(cls.latency)
+            if cls.throttle and self.path.startswith('/down/'):
+                with cls.lock:
+                    cls.down += 1
+                self.send_error(503)
+            elif self.path.split('?')[0].endswith('.pdf'):
+                self._send_pdf()
+            else:
+                super().do_GET()
+        finally:
+            with cls.lock:
+                cls.in_flight[host] -= 1
+
+    def _send_pdf(self):
+        cls = type(self)
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        name = os.path.basename(path)
+        with cls.lock:
+            throttle = (cls.throttle and name in FIXTURE_PDFS and FIXTURE_PDFS.index(name) % 2 == 0
+                        and path not in cls.throttled_paths)
+            if throttle:
+                cls.throttled_paths.add(path)
+                cls.throttled += 1
+        if throttle:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        st = os.stat(path)
+        etag = f'"{st.st_size:x}-{int(st.st_mtime):x}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        start = 0
+        match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match and self.headers.get('If-Range', etag) == etag:
+            start = int(match.group(1))
+            if start >= len(body):
+                self.send_error(416)
+                return
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(body) - start))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.date_time_string(st.st_mtime))
+        self.send_header('Accept-Ranges', 'bytes')
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+            with cls.lock:
+                cls.partial += 1
+        self.end_headers()
+
+        payload = body[start:]
+        with cls.lock:
+            cut = cls.flaky and not start and path not in cls.cut
+            if cut:
+                cls.cut.add(path)
+        if cut:
+            # Drop the connection halfway through the first transfer of this file
+            self.wfile.write(payload[:len(payload) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(payload)
+
+    def send_response(self, code, message=None):
+        if code == 304:
+            with type(self).lock:
+                type(self).not_modified += 1
+        super().send_response(code, message)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, latency=0.0, flaky=False, throttle=False):
+    """Start the fixture server on a daemon thread; returns (server, base_url)."""
+    handler = type('Handler', (FixtureHandler,), {'latency': latency, 'flaky': flaky, 'in_flight': {},
+                                                  'throttle': throttle, 'lock': threading.Lock(), 'cut': set(),
+                                                  'throttled_paths': set()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), partial(handler, directory=FIXTURES))
+    server.handler_class = handler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def fixture_sources(base_url, outage=False):
+    """SEARCH_SOURCES / DIRECT_SOURCES pointing at the fixture server.
+
+    ``outage`` adds a search source that only ever gets 503s, reached as
+    ``localhost`` so that it is a host of its own.
+    """
+    search = [{'name': 'Fixture search', 'base_url': base_url + '/',
+               'search_templates': ['search.html?q={keyword}'], 'enabled': True}]
+    direct = [{'name': 'Fixture listing', 'url': base_url + '/direct.html', 'enabled': True}]
+    if outage:
+        search.append({'name': 'Fixture outage', 'base_url': base_url.replace('127.0.0.1', 'localhost') + '/down/',
+                       'search_templates': ['search?q={keyword}', 'find?q={keyword}'], 'enabled': True})
+    return search, direct
+
+
+def load_doc_scrapper():
+    """Import ``Doc Scrapper.py`` (the space in the name rules out a plain import)."""
+    sys.path.insert(0, HERE)
+    spec = importlib.util.spec_from_file_location('doc_scrapper', os.path.join(HERE, 'Doc Scrapper.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_scraper(doc_scrapper, target, max_downloads, search, direct, cache_dir=None, cache_mode='normal'):
+    scraper = doc_scrapper.PDFScraper(target_dir=target, max_downloads=max_downloads, search_sources=search,
+                                      direct_sources=direct, include_fallbacks=False, host_delay=0.0,
+                                      cache_dir=cache_dir, cache_mode=cache_mode)
+    start = time.perf_counter()
+    scraper.run()
+    return scraper, time.perf_counter() - start
+
+
+def check(max_downloads, latency, flaky=False, throttle=False):
+    doc_scrapper = load_doc_scrapper()
+    if throttle:
+        doc_scrapper.BACKOFF_BASE = 0.05  # keep the outage retries short
+    server, base_url = serve(latency=latency, flaky=flaky, throttle=throttle)
+    handler = server.handler_class
+    search, direct = fixture_sources(base_url, outage=throttle)
+    failures = []
+    with tempfile.TemporaryDirectory() as target, tempfile.TemporaryDirectory() as cache_dir:
+        first, elapsed = run_scraper(doc_scrapper, target, max_downloads, search, direct, cache_dir)
+        pdfs = [f for f in os.listdir(target) if f.endswith('.pdf')]
+        expected = min(max_downloads, len(FIXTURE_PDFS))
+        if first.downloaded_count != expected or len(pdfs) != expected:
+            failures.append(f'expected {expected} downloads, counted {first.downloaded_count}, '
+                            f'found {len(pdfs)} files')
+        for name in pdfs:
+            with open(os.path.join(target, name), 'rb') as f:
+                if f.read(5) != b'%PDF-':
+                    failures.append(f'{name} is not a PDF')
+        leftovers = [f for f in os.listdir(target) if f.endswith(('.part', '.part.json'))]
+        if leftovers and expected == len(FIXTURE_PDFS):
+            failures.append(f'partial files left behind: {leftovers}')
+        if flaky and handler.partial == 0:
+            failures.append('no interrupted transfer was resumed with a Range request')
+        if throttle:
+            failures += check_throttle(doc_scrapper, first, handler)
+        print(f'\nRun 1: {handler.requests} requests in {elapsed:.2f}s, peak {handler.peak_in_flight} in flight, '
+              f'{handler.partial} resumed with Range')
+
+        # Second run over the same target: everything known should come back 304
+        requests_before = handler.requests
+        second, elapsed = run_scraper(doc_scrapper, target, max_downloads, search, direct, cache_dir)
+        expected = min(max_downloads, len(FIXTURE_PDFS) - expected)
+        if second.downloaded_count != expected:
+            failures.append(f're-run: expected {expected} new downloads, counted {second.downloaded_count}')
+        if handler.not_modified == 0:
+            failures.append('re-run sent no conditional requests that came back 304')
+        print(f'Run 2: {handler.requests - requests_before} requests in {elapsed:.2f}s, '
+              f'{handler.not_modified} answered 304 Not Modified')
+
+        # Replay from the HTTP cache with the server gone: the same pages must be
+        # served, so the same documents are found (PDFs are not cached)
+        server.shutdown()
+        server.server_close()
+        with tempfile.TemporaryDirectory() as replay_target:
+            replay, elapsed = run_scraper(doc_scrapper, replay_target, max_downloads, search, direct,
+                                          cache_dir, 'replay')
+        found = sorted(doc['url'] for doc in first.documents)
+        replayed = sorted(doc['url'] for doc in replay.documents)
+        if replayed != found:
+            failures.append(f'replay found {len(replayed)} documents, the live run {len(found)}')
+        print(f'Replay: {len(replayed)} documents found from the HTTP cache in {elapsed:.2f}s, no network')
+    if handler.peak_in_flight > doc_scrapper.MAX_CONNECTIONS_PER_HOST:
+        failures.append(f'{handler.peak_in_flight} concurrent requests to one host '
+                        f'(limit {doc_scrapper.MAX_CONNECTIONS_PER_HOST})')
+
+    for failure in failures:
+        print(f'❌ {failure}')
+    if not failures:
+        print('✅ Offline check passed')
+    return not failures
+
+
+def check_throttle(doc_scrapper, scraper, handler):
+    """Failures of the --throttle expectations for the first run."""
+    failures = []
+    stats = scraper.engine.stats.report()
+    listing, outage = stats.get('Fixture listing', {}), stats.get('Fixture outage', {})
+    if handler.throttled == 0 or sum(row['throttled'] for row in stats.values()) != handler.throttled:
+        failures.append(f'server sent {handler.throttled} 429s, the scraper saw '
+                        f'{sum(row["throttled"] for row in stats.values())}')
+    if not listing.get('retries') and not stats.get('Fixture search', {}).get('retries'):
+        failures.append('no throttled request was retried')
+    if not any(host.startswith('localhost') for host in scraper.engine.breaker.open_hosts):
+        failures.append('the failing localhost source did not trip its circuit breaker')
+    pages = len(doc_scrapper.SEARCH_KEYWORDS) * 2
+    if not outage.get('skipped') or handler.down >= pages * (doc_scrapper.MAX_RETRIES + 1):
+        failures.append(f'outage source: {handler.down} requests sent, {outage.get("skipped", 0)} skipped')
+    print(f'Throttle: {handler.throttled} answered 429, {handler.down} sent to the failing host, '
+          f'{outage.get("skipped", 0)} skipped by its breaker')
+    return failures
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--port', type=int, default=0)
+    p.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    p.add_argument('--check', action='store_true', help='Run PDFScraper against the fixtures and verify the result')
+    p.add_argument('--max-downloads', type=int, default=20)
+    p.add_argument('--flaky', action='store_true', help='Cut off the first transfer of every PDF halfway')
+    p.add_argument('--throttle', action='store_true',
+                   help='Answer 429 to the first request for every other PDF and 503 under /down/')
+    args = p.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.max_downloads, args.latency, args.flaky, args.throttle) else 1)
+    server, base_url = serve(args.port, args.latency, args.flaky, args.throttle)
+    print(f'Serving {FIXTURES} at {base_url} (Ctrl+C to stop)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Parsing layer shared by the scrapers: only the elements we need, with the fastest parser installed.
+
+Backends, in order of preference:
+
+    selectolax   lexbor (C) parser, CSS selection         pip install selectolax
+    lxml         libxml2 HTML parser, XPath                pip install lxml
+    bs4          BeautifulSoup + SoupStrainer, so only the wanted tags become
+                 Python objects (uses lxml as the tokenizer if installed,
+                 otherwise the stdlib html.parser)
+
+``iter_links`` yields ``(href, text)`` for every ``<a href>``, ``iter_tables``
+yields ``Table`` objects. Text is built the same way on every backend, so the
+scrapers behave the same whichever parser is installed. Link text follows
+BeautifulSoup's ``get_text(strip=True)``: each text node is stripped and the
+pieces are joined without a separator. Table and caption text keep the
+spaces between inline elements, with runs of whitespace collapsed to one.
+
+``keyword_pattern`` compiles a keyword list into one case-insensitive regex,
+so filtering a link is one ``search`` instead of a loop of ``in`` tests.
+"""
+import re
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html as lxml_html
+    from lxml.etree import ParserError
+except ImportError:
+    lxml_html = None
+
+BACKENDS = ('selectolax', 'lxml', 'bs4')
+
+
+def available_backends():
+    """Installed backends, fastest first."""
+    found = []
+    if LexborHTMLParser is not None:
+        found.append('selectolax')
+    if lxml_html is not None:
+        found.append('lxml')
+    try:
+        import bs4  # noqa: F401
+        found.append('bs4')
+    except ImportError:
+        pass
+    return found
+
+
+def default_backend():
+    backends = available_backends()
+    if not backends:
+        raise ImportError('No HTML parser available: pip install selectolax, lxml or beautifulsoup4')
+    return backends[0]
+
+
+def keyword_pattern(keywords):
+    """One case-insensitive regex matching any of ``keywords`` as a substring."""
+    # Longest first, so overlapping keywords ('postgres' / 'postgresql') match the longer one
+    words = sorted({k.lower() for k in keywords if k}, key=len, reverse=True)
+    if not words:
+        return re.compile(r'(?!)')  # matches nothing
+    return re.compile('|'.join(map(re.escape, words)), re.IGNORECASE)
+
+
+class Cell:
+    __slots__ = ('text', 'header', 'rowspan', 'colspan')
+
+    def __init__(self, text, header=False, rowspan=1, colspan=1):
+        self.text = text
+        self.header = header
+        self.rowspan = rowspan
+        self.colspan = colspan
+
+    def __repr__(self):
+        return f'Cell({self.text!r}, header={self.header}, rowspan={self.rowspan}, colspan={self.colspan})'
+
+
+class Table:
+    """A parsed ``<table>``: caption text and rows of ``Cell`` (spans not expanded)."""
+
+    def __init__(self, caption, rows, attrs=None):
+        self.caption = caption
+        self.rows = rows
+        self.attrs = attrs or {}
+
+    def __repr__(self):
+        return f'Table({self.caption!r}, {len(self.rows)} rows)'
+
+
+def _span(value):
+    try:
+        return max(1, int(str(value).strip().rstrip(';')))
+    except (TypeError, ValueError):
+        return 1
+
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def _squash(text):
+    return ' '.join(text.split())
+
+
+def _as_text(html):
+    """Decode raw page bytes using the <meta> charset (UTF-8 if none is declared)."""
+    if isinstance(html, str):
+        return html
+    match = _META_CHARSET.search(html[:2048])
+    try:
+        return html.decode(match.group(1).decode('ascii') if match else 'utf-8')
+    except (LookupError, UnicodeDecodeError):
+        return html.decode('utf-8', errors='replace')
+
+
+# ==================== SELECTOLAX ====================
+
+def _text_selectolax(node):
+    return node.text(deep=True, separator='', strip=True)
+
+
+def _links_selectolax(html):
+    tree = LexborHTMLParser(_as_text(html))
+    for node in tree.css('a[href]'):
+        yield node.attributes.get('href') or '', _text_selectolax(node)
+
+
+def _tables_selectolax(html):
+    tree = LexborHTMLParser(_as_text(html))
+    for table in tree.css('table'):
+        caption = table.css_first('caption')
+        rows = []
+        for tr in table.css('tr'):
+            # Rows of a nested table belong to that table, not this one (selectolax
+            # hands out a new wrapper per access, so compare the underlying nodes)
+            if _closest_table_selectolax(tr).mem_id != table.mem_id:
+                continue
+            rows.append([Cell(_squash(cell.text(deep=True)), cell.tag == 'th',
+                              _span(cell.attributes.get('rowspan', 1)), _span(cell.attributes.get('colspan', 1)))
+                         for cell in tr.iter() if cell.tag in ('td', 'th')])
+        yield Table(_squash(caption.text(deep=True)) if caption else None, rows, dict(table.attributes))
+
+
+def _closest_table_selectolax(node):
+    parent = node.parent
+    while parent is not None and parent.tag != 'table':
+        parent = parent.parent
+    return parent
+
+
+# ==================== LXML ====================
+
+def _text_lxml(element):
+    return ''.join(piece.strip() for piece in element.itertext())
+
+
+_UTF8_PARSER = lxml_html.HTMLParser(encoding='utf-8') if lxml_html is not None else None
+
+
+def _lxml_root(html):
+    """Parsed document, or None for an empty one."""
+    # lxml refuses str input that carries an encoding declaration, so hand it
+    # UTF-8 bytes; raw bytes keep libxml2's own charset detection
+    if isinstance(html, str):
+        html, parser = html.encode('utf-8'), _UTF8_PARSER
+    else:
+        parser = None
+    try:
+        return lxml_html.fromstring(html, parser=parser)
+    except ParserError:  # "Document is empty"
+        return None
+
+
+def _links_lxml(html):
+    root = _lxml_root(html)
+    if root is None:
+        return
+    for element in root.iter('a'):
+        href = element.get('href')
+        if href is not None:
+            yield href, _text_lxml(element)
+
+
+def _tables_lxml(html):
+    root = _lxml_root(html)
+    if root is None:
+        return
+    for table in root.iter('table'):
+        caption = table.find('caption')
+        rows = []
+        for tr in table.iter('tr'):
+            if next(tr.iterancestors('table')) is not table:
+                continue
+            rows.append([Cell(_squash(cell.text_content()), cell.tag == 'th', _span(cell.get('rowspan', 1)),
+                              _span(cell.get('colspan', 1)))
+                         for cell in tr if cell.tag in ('td', 'th')])
+        yield Table(_squash(caption.text_content()) if caption is not None else None, rows, dict(table.attrib))
+
+
+# ==================== BEAUTIFULSOUP ====================
+
+def _soup(html, strainer):
+    from bs4 import BeautifulSoup
+    features = 'lxml' if lxml_html is not None else 'html.parser'
+    return BeautifulSoup(html, features, parse_only=strainer)
+
+
+def _links_bs4(html):
+    from bs4 import SoupStrainer
+    for link in _soup(html, SoupStrainer('a', href=True)).find_all('a', href=True):
+        yield link.get('href'), link.get_text(strip=True)
+
+
+def _tables_bs4(html):
+    from bs4 import SoupStrainer
+    for table in _soup(html, SoupStrainer('table')).find_all('table'):
+        caption = table.find('caption')
+        rows = []
+        for tr in table.find_all('tr'):
+            if tr.find_parent('table') is not table:
+                continue
+            rows.append([Cell(_squash(cell.get_text()), cell.name == 'th', _span(cell.get('rowspan', 1)),
+                              _span(cell.get('colspan', 1)))
+                         for cell in tr.find_all(['td', 'th'], recursive=False)])
+        # bs4 returns multi-valued attributes (class) as lists; the other backends give strings
+        attrs = {k: ' '.join(v) if isinstance(v, list) else v for k, v in table.attrs.items()}
+        yield Table(_squash(caption.get_text()) if caption else None, rows, attrs)
+
+
+_LINKS = {'selectolax': _links_selectolax, 'lxml': _links_lxml, 'bs4': _links_bs4}
+_TABLES = {'selectolax': _tables_selectolax, 'lxml': _tables_lxml, 'bs4': _tables_bs4}
+
+
+def iter_links(html, backend=None):
+    """``(href, text)`` for every ``<a href>`` in ``html`` (str or bytes)."""
+    return _LINKS[backend or default_backend()](html)
+
+
+def iter_tables(html, backend=None):
+    """``Table`` for every ``<table>`` in ``html`` (nested tables are yielded separately)."""
+    return _TABLES[backend or default_backend()](html)
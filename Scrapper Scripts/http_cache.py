@@ -0,0 +1,310 @@
+"""On-disk HTTP cache for the scrapers' requests sessions.
+
+``HttpCache`` keeps an SQLite index next to zlib-compressed response bodies:
+
+    <cache_dir>/index.sqlite       key, url, status, headers, validators, freshness, size, last_used
+    <cache_dir>/bodies/ab/<key>.z  decoded body, zlib-compressed
+
+``CacheAdapter`` is a transport adapter: ``install(session, cache)`` mounts it
+for http:// and https://, so existing ``session.get`` calls go through the
+cache unchanged. Only plain GETs are cached. Streamed requests (PDF downloads,
+which have their own resume logic) and Range requests go straight to the
+network.
+
+The key is the method, the normalized URL and the request headers that
+select a representation (``KEY_HEADERS``). Freshness follows the response:
+``Cache-Control: max-age`` or ``Expires``. Without either, it is 10% of the
+time since Last-Modified, capped at a day. ``no-store`` responses are not
+cached. A stale entry is revalidated with If-None-Match / If-Modified-Since,
+and a 304 serves the stored body. If the caller sends its own validators
+(the crawl state does) and a fresh entry matches them, the adapter answers
+304 itself.
+
+Modes:
+
+    normal   as above
+    replay   never touch the network; a miss raises CacheMiss (a requests
+             ConnectionError), so runs are deterministic and work offline
+    refresh  always go to the network, but store what comes back
+
+The cache is bounded by ``max_bytes`` of compressed bodies. When a store goes
+over the limit, the least recently used entries are evicted down to 90%.
+"""
+import email.utils
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from crawl_state import normalize_url
+
+MODES = ('normal', 'replay', 'refresh')
+# Shared by Doc Scrapper.py and Wiki Table Data Scraper.py
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.http_cache')
+KEY_HEADERS = ('Accept', 'Accept-Language')
+CACHEABLE_STATUS = {200, 203, 300, 301, 404, 410}
+HEURISTIC_MAX = 24 * 3600
+# Hop-by-hop / transfer headers that no longer describe the stored (decoded) body
+DROP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT,
+    status INTEGER,
+    reason TEXT,
+    headers TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL,
+    fresh_until REAL,
+    size INTEGER,
+    last_used REAL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+_MAX_AGE = re.compile(r'(?:^|,)\s*max-age\s*=\s*"?(\d+)', re.IGNORECASE)
+
+
+class CacheMiss(requests.ConnectionError):
+    """Replay mode asked for a response that is not in the cache."""
+
+    retryable = False  # retrying cannot help: the cache will not change
+
+
+def cache_control(headers):
+    return {part.strip().split('=', 1)[0].lower() for part in headers.get('Cache-Control', '').split(',')
+            if part.strip()}
+
+
+def _http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, now):
+    """Seconds a response may be served without revalidation."""
+    directives = cache_control(headers)
+    if 'no-cache' in directives:
+        return 0
+    match = _MAX_AGE.search(headers.get('Cache-Control', ''))
+    if match:
+        return max(0, int(match.group(1)) - int(headers.get('Age', 0) or 0))
+    expires = _http_date(headers.get('Expires'))
+    if expires is not None:
+        return max(0, expires - (_http_date(headers.get('Date')) or now))
+    last_modified = _http_date(headers.get('Last-Modified'))
+    if last_modified is not None:
+        return min(HEURISTIC_MAX, max(0, ((_http_date(headers.get('Date')) or now) - last_modified) / 10))
+    return 0
+
+
+class HttpCache:
+    """Thread-safe cache store shared by every session (and thread) of a run."""
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024, mode='normal'):
+        if mode not in MODES:
+            raise ValueError(f'Unknown cache mode {mode!r}; expected one of {MODES}')
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = self.misses = self.revalidated = 0
+        os.makedirs(os.path.join(cache_dir, 'bodies'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        self._total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def key(method, url, headers):
+        parts = [method.upper(), normalize_url(url)]
+        parts += [f'{name.lower()}:{headers.get(name, "")}' for name in KEY_HEADERS]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, 'bodies', key[:2], key + '.z')
+
+    # ==================== LOOKUP ====================
+
+    def get(self, key):
+        """Stored entry as a dict (body included), or None."""
+        with self._lock:
+            row = self._db.execute('SELECT url, status, reason, headers, etag, last_modified, fresh_until '
+                                   'FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            self.delete(key)  # index row without a usable body
+            return None
+        url, status, reason, headers, etag, last_modified, fresh_until = row
+        return {'url': url, 'status': status, 'reason': reason, 'headers': json.loads(headers), 'etag': etag,
+                'last_modified': last_modified, 'fresh_until': fresh_until, 'body': body}
+
+    # ==================== STORE ====================
+
+    def put(self, key, response):
+        """Store a fully read response unless it is uncacheable or too large."""
+        if response.status_code not in CACHEABLE_STATUS or 'no-store' in cache_control(response.headers):
+            return False
+        data = zlib.compress(response.content, 6)
+        if len(data) > self.max_bytes // 10:
+            return False
+        now = time.time()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROP_HEADERS}
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock, self._db:
+            old = self._db.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (key, response.url, response.status_code, response.reason, json.dumps(headers),
+                              response.headers.get('ETag'), response.headers.get('Last-Modified'), now,
+                              now + freshness_lifetime(response.headers, now), len(data), now))
+            self._total += len(data) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+        return True
+
+    def refresh(self, key, response):
+        """A 304 revalidated ``key``: take over its new validators and freshness."""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute('UPDATE entries SET fresh_until = ?, last_used = ?, '
+                             'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?',
+                             (now + freshness_lifetime(response.headers, now), now, response.headers.get('ETag'),
+                              response.headers.get('Last-Modified'), key))
+
+    def delete(self, key):
+        with self._lock, self._db:
+            row = self._db.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            if row:
+                self._total -= row[0]
+        self._unlink(key)
+
+    def _unlink(self, key):
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+    def _evict(self, target):
+        """Drop least recently used entries until the total is at most ``target`` (lock held)."""
+        for key, size in self._db.execute('SELECT key, size FROM entries ORDER BY last_used').fetchall():
+            if self._total <= target:
+                break
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._unlink(key)
+            self._total -= size
+
+    def count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return {'entries': entries, 'bytes': self._total, 'hits': self.hits, 'misses': self.misses,
+                'revalidated': self.revalidated}
+
+
+class CacheAdapter(HTTPAdapter):
+    """HTTPAdapter that answers from / fills an ``HttpCache``."""
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != 'GET' or stream or 'Range' in request.headers:
+            if self.cache.mode == 'replay':
+                raise CacheMiss(f'replay mode: {request.method} {request.url} is not cacheable', request=request)
+            return super().send(request, stream=stream, **kwargs)
+
+        cache = self.cache
+        key = cache.key(request.method, request.url, request.headers)
+        entry = cache.get(key) if cache.mode != 'refresh' else None
+        caller_validators = 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+
+        if entry is not None and (cache.mode == 'replay' or entry['fresh_until'] > time.time()):
+            cache.count('hits')
+            if caller_validators and self._matches(entry, request.headers):
+                return self._build(request, entry, status=304)
+            return self._build(request, entry)
+        if cache.mode == 'replay':
+            cache.count('misses')
+            raise CacheMiss(f'replay mode: {request.url} is not in the cache', request=request)
+
+        if entry is not None and not caller_validators:
+            # Stale: revalidate with our own validators
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+        response = super().send(request, stream=stream, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            cache.count('revalidated')
+            cache.refresh(key, response)
+            if caller_validators:
+                return response
+            response.close()
+            return self._build(request, entry)
+        if response.status_code != 304:
+            cache.count('misses')
+            cache.put(key, response)
+        return response
+
+    @staticmethod
+    def _matches(entry, headers):
+        etag = headers.get('If-None-Match')
+        if etag:
+            return entry['etag'] is not None and etag in (entry['etag'], '*')
+        return entry['last_modified'] is not None and headers.get('If-Modified-Since') == entry['last_modified']
+
+    def _build(self, request, entry, status=None):
+        response = requests.Response()
+        response.status_code = status or entry['status']
+        response.reason = 'Not Modified' if status == 304 else entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = b'' if status == 304 else entry['body']
+        response._content_consumed = True
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = entry['url'] if status != 304 else request.url
+        response.request = request
+        response.connection = self
+        response.from_cache = True
+        return response
+
+
+def install(session, cache):
+    """Route ``session``'s http(s) requests through ``cache``; returns the session."""
+    adapter = CacheAdapter(cache)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
@@ -0,0 +1,121 @@
+"""Micro-benchmark of the HTML parsing backends on the saved fixture pages.
+
+Each page in ``fixtures/`` is blown up to listing-page size by repeating its
+<body> ``--repeat`` times. Then it is parsed with:
+
+    baseline     what the scrapers used to do: a full BeautifulSoup(..., 'html.parser')
+                 tree followed by find_all('a') / find_all('table')
+    selectolax   \\
+    lxml          > html_parsing.iter_links / iter_tables with that backend
+    bs4          /  (SoupStrainer, so only <a> / <table> subtrees are built)
+
+The extracted links / tables are checked to be identical across backends.
+A second table times the REQUIRED_KEYWORDS filter, a loop of ``in`` tests
+against the single precompiled regex.
+
+    python parse_benchmark.py
+    python parse_benchmark.py --repeat 500 --rounds 7
+"""
+import argparse
+import os
+import time
+
+from html_parsing import available_backends, iter_links, iter_tables, keyword_pattern
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, 'fixtures')
+PAGES = [('search.html', 'links'), ('direct.html', 'links'), ('wiki_table.html', 'tables')]
+KEYWORDS = ['sql', 'python', 'postgres']
+
+
+def scaled_page(name, repeat):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        html = f.read()
+    head, rest = html.split(b'<body>', 1)
+    body, tail = rest.split(b'</body>', 1)
+    return head + b'<body>' + body * repeat + b'</body>' + tail
+
+
+def baseline_links(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    return [(link.get('href'), link.get_text(strip=True)) for link in soup.find_all('a', href=True)]
+
+
+def baseline_tables(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    return [[[cell.text.strip() for cell in tr.find_all(['td', 'th'])] for tr in table.find_all('tr')]
+            for table in soup.find_all('table')]
+
+
+def table_texts(html, backend):
+    return [[[cell.text for cell in row] for row in table.rows] for table in iter_tables(html, backend)]
+
+
+def best_of(rounds, fn, *args):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def bench_parsing(repeat, rounds):
+    backends = available_backends()
+    print(f"{'page':<18}{'size':>9}  {'parser':<12}{'ms':>9}{'speedup':>9}")
+    ok = True
+    for name, kind in PAGES:
+        html = scaled_page(name, repeat)
+        size = f'{len(html) / 1024:.0f} KB'
+        baseline = baseline_links if kind == 'links' else baseline_tables
+        base_time, _ = best_of(rounds, baseline, html)
+        print(f"{name:<18}{size:>9}  {'baseline':<12}{base_time * 1000:>9.1f}{'1.0x':>9}")
+        reference = None
+        for backend in backends:
+            if kind == 'links':
+                elapsed, result = best_of(rounds, lambda h, b=backend: list(iter_links(h, b)), html)
+            else:
+                elapsed, result = best_of(rounds, table_texts, html, backend)
+            if reference is None:
+                reference = result
+            elif result != reference:
+                ok = False
+                print(f'   ❌ {backend} extracted something different from {backends[0]}')
+            print(f"{'':<18}{'':>9}  {backend:<12}{elapsed * 1000:>9.1f}{base_time / elapsed:>8.1f}x")
+    return ok
+
+
+def bench_keywords(repeat, rounds):
+    texts = [text for _, text in iter_links(scaled_page('search.html', repeat))] * 20
+    pattern = keyword_pattern(KEYWORDS)
+
+    def loop():
+        return sum(any(kw in text.lower() for kw in KEYWORDS) for text in texts)
+
+    def regex():
+        return sum(pattern.search(text) is not None for text in texts)
+
+    loop_time, expected = best_of(rounds, loop)
+    regex_time, found = best_of(rounds, regex)
+    print(f"\nKeyword filter over {len(texts)} link texts: loop {loop_time * 1000:.1f} ms, "
+          f"regex {regex_time * 1000:.1f} ms ({loop_time / regex_time:.1f}x)")
+    return found == expected
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--repeat', type=int, default=200, help='Copies of each fixture <body> per page')
+    p.add_argument('--rounds', type=int, default=5, help='Timed runs per parser (best is reported)')
+    args = p.parse_args()
+
+    print(f"Backends installed: {', '.join(available_backends())}\n")
+    ok = bench_parsing(args.repeat, args.rounds)
+    ok = bench_keywords(args.repeat, args.rounds) and ok
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
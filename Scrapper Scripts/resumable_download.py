@@ -0,0 +1,151 @@
+"""Resumable, integrity-checked streaming downloads for Doc Scrapper.py.
+
+``fetch_file`` streams into ``<dest>.part``. A ``<dest>.part.json`` sidecar
+records the URL and the server's ETag / Last-Modified. If a transfer breaks
+off, the partial file is kept, and the next attempt (in this run or a later
+one) asks for only the remaining bytes with ``Range`` + ``If-Range``. If the
+server has a different version by then it answers 200 and the download
+restarts from zero.
+
+Chunk size adapts to throughput: it starts at 64 KB and doubles or halves so
+that each read takes about ``CHUNK_SECONDS``, between 64 KB and 4 MB. The
+received size is checked against Content-Length / Content-Range, and the
+SHA-256 is computed by reading back the finished ``.part``, so it covers
+exactly the bytes that are renamed onto ``dest`` (resumed prefix included).
+Only then is the ``.part`` renamed with os.replace, unless ``accept(sha256)``
+rejects it as a copy of a file that is already stored.
+
+The ``.part`` name is derived from ``dest`` so that a later run can resume
+it; callers must not fetch two URLs into the same ``dest`` at once.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+MIN_CHUNK = 64 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+CHUNK_SECONDS = 0.25
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class DownloadError(Exception):
+    """Transfer failed; any partial data is kept for a Range resume."""
+
+
+class FetchResult:
+    def __init__(self, status, path=None, size=0, sha256=None, response=None, resumed_from=0):
+        self.status = status  # 'downloaded', 'not-modified' or 'duplicate'
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.response = response
+        self.resumed_from = resumed_from
+
+
+def _read_sidecar(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(MAX_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fetch_file(session, url, dest, timeout=15, conditional=None, accept=None):
+    """Download ``url`` into ``dest``, resuming a matching ``dest.part`` if present.
+
+    ``conditional`` (If-None-Match / If-Modified-Since) is sent only when there
+    is nothing to resume. Raises DownloadError on a short or failed transfer.
+    """
+    part, sidecar = dest + '.part', dest + '.part.json'
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    meta = _read_sidecar(sidecar) if offset else None
+    headers = {}
+    if offset and meta and meta.get('url') == url and (meta.get('etag') or meta.get('last_modified')):
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = meta.get('etag') or meta['last_modified']
+    else:
+        offset = 0
+        headers.update(conditional or {})
+
+    response = session.get(url, timeout=timeout, stream=True, headers=headers)
+    with response:
+        if response.status_code == 304:
+            return FetchResult('not-modified', response=response)
+        if response.status_code == 416 and offset:
+            # Our partial no longer fits the resource; start over next attempt
+            _discard(part, sidecar)
+            raise DownloadError('range not satisfiable, partial discarded')
+        response.raise_for_status()
+
+        expected = None
+        if response.status_code == 206:
+            match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+            if not match or int(match.group(1)) != offset:
+                _discard(part, sidecar)
+                raise DownloadError('unexpected Content-Range, partial discarded')
+            if match.group(3) != '*':
+                expected = int(match.group(3))
+            mode = 'ab'
+        else:
+            offset = 0  # full body: the server ignored Range or the file changed
+            mode = 'wb'
+        if expected is None and response.headers.get('Content-Length') and \
+                not response.headers.get('Content-Encoding'):
+            expected = offset + int(response.headers['Content-Length'])
+
+        with open(sidecar, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'etag': response.headers.get('ETag'),
+                       'last_modified': response.headers.get('Last-Modified'), 'expected': expected}, f)
+
+        size = offset
+        chunk = MIN_CHUNK
+        # read1 returns what has arrived (up to ``chunk``), so bytes received
+        # before a dropped connection still reach the .part file
+        read = getattr(response.raw, 'read1', response.raw.read)
+        try:
+            with open(part, mode) as f:
+                while True:
+                    start = time.perf_counter()
+                    data = read(chunk, decode_content=True)
+                    if not data:
+                        break
+                    f.write(data)
+                    size += len(data)
+                    elapsed = time.perf_counter() - start
+                    if elapsed < CHUNK_SECONDS / 2 and len(data) == chunk:
+                        chunk = min(chunk * 2, MAX_CHUNK)
+                    elif elapsed > CHUNK_SECONDS * 2:
+                        chunk = max(chunk // 2, MIN_CHUNK)
+        except Exception as e:
+            raise DownloadError(f'interrupted at {size} bytes: {e}') from e
+
+    if expected is not None and size != expected:
+        if size > expected:
+            _discard(part, sidecar)  # more than announced: the partial cannot be trusted
+        raise DownloadError(f'got {size} of {expected} bytes')
+    sha256 = _file_sha256(part)
+    if accept is not None and not accept(sha256):
+        _discard(part, sidecar)
+        return FetchResult('duplicate', None, size, sha256, response)
+    os.replace(part, dest)
+    os.remove(sidecar)
+    return FetchResult('downloaded', dest, size, sha256, response, resumed_from=offset)
+
+
+def _discard(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
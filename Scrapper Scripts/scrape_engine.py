@@ -0,0 +1,485 @@
+"""Bounded-concurrency crawl engine used by Doc Scrapper.py.
+
+Two thread pools joined by a bounded queue:
+
+    page workers  --(candidates)-->  download queue  -->  download workers
+    fetch + extract links               (backpressure)      claim budget, download
+
+* ``HostLimiter`` caps simultaneous connections per host and paces request
+  starts with a per-host ``TokenBucket``. The rate is adaptive: a 429 / 503
+  halves it (and a Retry-After pauses the host), and successes win it back
+  step by step, never above the politeness rate.
+* ``RetryPolicy`` retries timeouts, connection errors, 429 and 5xx with
+  exponential backoff and full jitter, or after the server's Retry-After.
+* ``CircuitBreaker`` counts requests per host that failed even after their
+  retries; after too many in a row the host is skipped for the rest of the
+  run (``HostUnavailable``).
+* ``SourceStats`` collects requests, latency, bytes, failures and retries per
+  source for the end-of-run report.
+* ``DownloadBudget`` is the atomic MAX_DOWNLOADS counter: a worker claims a
+  slot before downloading and gives it back if the download fails, so the
+  limit holds exactly however many workers race for the last slot.
+* Each thread gets its own ``requests.Session`` (sessions are not
+  thread-safe), created by the ``session_factory`` passed in.
+"""
+import email.utils
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+_DONE = object()
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class HostUnavailable(requests.ConnectionError):
+    """The host's circuit breaker is open; the request was not sent."""
+
+    retryable = False
+
+
+# ==================== RATE CONTROL ====================
+
+class TokenBucket:
+    """Token bucket for one host. ``rate`` is tokens per second (None = unlimited)."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token; returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate is None:
+                wait = max(0.0, self._updated - now)  # only a pause() can hold us back
+                return wait
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1  # may go negative: later callers queue up behind us
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds):
+        """Hand out no tokens for ``seconds`` (Retry-After)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate is None:
+                self._updated = max(self._updated, now + seconds)
+            else:
+                self._tokens = min(self._tokens, -seconds * self.rate)
+                self._updated = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            if self.rate is not None:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            else:
+                self._tokens = min(self._tokens, self.capacity)
+                self._updated = time.monotonic()
+            self.rate = rate
+
+
+class HostLimiter:
+    """Per-host connection cap plus an adaptive token bucket for request starts.
+
+    ``delay`` is the politeness interval: the bucket starts at (and never goes
+    above) one request per ``delay`` seconds. ``throttled`` halves a host's
+    rate, down to one request per ``max_delay``; each ``succeeded`` raises it
+    by a tenth of the politeness rate. With ``delay=0`` a host is unlimited
+    until it throttles, and goes back to unlimited once it has recovered.
+    """
+
+    UNLIMITED_STEP = 2.0  # requests/s regained per success when delay is 0
+    UNLIMITED_CEILING = 20.0
+
+    def __init__(self, max_per_host=2, delay=0.5, max_delay=30.0):
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._buckets = {}
+
+    def _host(self, url):
+        return host_of(url)
+
+    def _bucket(self, host):
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(1 / self.delay if self.delay else None)
+            return bucket
+
+    def acquire(self, url):
+        host = self._host(url)
+        with self._lock:
+            slots = self._slots.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        slots.acquire()
+        # Reserve this host's next token, then sleep outside any lock
+        wait = self._bucket(host).reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return host
+
+    def release(self, host):
+        self._slots[host].release()
+
+    def rate(self, url):
+        return self._bucket(self._host(url)).rate
+
+    def throttled(self, url, retry_after=None):
+        """The host answered 429 (or 503 with Retry-After): halve its rate and honour Retry-After."""
+        bucket = self._bucket(self._host(url))
+        current = bucket.rate if bucket.rate is not None else self.UNLIMITED_CEILING
+        bucket.set_rate(max(1 / self.max_delay, current / 2))
+        if retry_after:
+            bucket.pause(min(retry_after, self.max_delay))
+
+    def succeeded(self, url):
+        bucket = self._bucket(self._host(url))
+        if bucket.rate is None:
+            return
+        if self.delay:
+            ceiling = 1 / self.delay
+            if bucket.rate < ceiling:
+                bucket.set_rate(min(ceiling, bucket.rate + ceiling / 10))
+        else:
+            rate = bucket.rate + self.UNLIMITED_STEP
+            bucket.set_rate(None if rate >= self.UNLIMITED_CEILING else rate)
+
+    def __call__(self, url):
+        return _HostSlot(self, url)
+
+
+class _HostSlot:
+    def __init__(self, limiter, url):
+        self.limiter = limiter
+        self.url = url
+
+    def __enter__(self):
+        self.host = self.limiter.acquire(self.url)
+        return self
+
+    def __exit__(self, *exc):
+        self.limiter.release(self.host)
+
+
+class RetryPolicy:
+    """How often and how long to wait before retrying a transient failure."""
+
+    def __init__(self, max_retries=3, base=0.5, cap=30.0):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+
+    def delay(self, retry, retry_after=None):
+        """Seconds before retry number ``retry`` (0-based): Retry-After, else full jitter."""
+        if retry_after is not None:
+            return min(retry_after, self.cap)
+        return random.uniform(0, min(self.cap, self.base * 2 ** retry))
+
+
+def retry_after(response):
+    """Retry-After of a response in seconds (delta-seconds or HTTP date), or None."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class CircuitBreaker:
+    """Trips a host after ``threshold`` requests in a row failed even after retries.
+
+    Once open it stays open for the run. Any successful request resets the count.
+    """
+
+    def __init__(self, threshold=5):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._failures = {}
+        self.open_hosts = set()
+
+    def allow(self, host):
+        return host not in self.open_hosts
+
+    def success(self, host):
+        with self._lock:
+            self._failures[host] = 0
+
+    def failure(self, host):
+        """Record a transient failure; True if this one tripped the breaker."""
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= self.threshold and host not in self.open_hosts:
+                self.open_hosts.add(host)
+                return True
+            return False
+
+
+class SourceStats:
+    """Per-source counters for the end-of-run report."""
+
+    FIELDS = ('requests', 'ok', 'failed', 'retries', 'throttled', 'skipped', 'cached', 'bytes', 'latency')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._max_latency = {}
+
+    def add(self, source, **counts):
+        with self._lock:
+            entry = self._stats.setdefault(source, dict.fromkeys(self.FIELDS, 0))
+            for name, value in counts.items():
+                entry[name] += value
+            if 'latency' in counts:
+                self._max_latency[source] = max(self._max_latency.get(source, 0.0), counts['latency'])
+
+    def report(self):
+        """{source: counters} with average / max latency in milliseconds."""
+        with self._lock:
+            result = {}
+            for source, entry in sorted(self._stats.items()):
+                row = dict(entry)
+                latency = row.pop('latency')
+                row['avg_ms'] = round(1000 * latency / row['requests'], 1) if row['requests'] else 0.0
+                row['max_ms'] = round(1000 * self._max_latency.get(source, 0.0), 1)
+                result[source] = row
+            return result
+
+
+class DownloadBudget:
+    """Thread-safe download counter with an upper bound.
+
+    ``claim`` reserves a slot. While every slot is reserved but some downloads
+    are still in flight, it waits: a failed download hands its slot back.
+    It returns False only once the limit has actually been reached.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._cond = threading.Condition()
+        self._claimed = 0
+        self._done = 0
+
+    def claim(self):
+        with self._cond:
+            while self._claimed >= self.limit and self._done < self.limit:
+                self._cond.wait()
+            if self._done >= self.limit:
+                return False
+            self._claimed += 1
+            return True
+
+    def release(self):
+        """Give back a claimed slot after a failed download."""
+        with self._cond:
+            self._claimed -= 1
+            self._cond.notify()
+
+    def commit(self):
+        with self._cond:
+            self._done += 1
+            if self._done >= self.limit:
+                self._cond.notify_all()
+            return self._done
+
+    @property
+    def count(self):
+        return self._done
+
+    @property
+    def exhausted(self):
+        with self._cond:
+            return self._done >= self.limit
+
+
+class CrawlEngine:
+    """Runs page jobs and downloads concurrently.
+
+    ``run(pages, download)`` takes an iterable of ``(url, extract, source)`` jobs. The
+    engine fetches each ``url`` and calls ``extract(response)``, which yields
+    candidate dicts with ``title``, ``url`` and optionally ``counts`` (False
+    for best-effort downloads that do not use up the budget). Each candidate
+    goes to ``download(candidate, session)``, which returns True on success.
+    ``seeds`` are candidates that are already known and skip the page stage.
+    ``page_headers(url)`` may add request headers per page (e.g. conditional GETs).
+
+    Every request goes through ``call``: host limits, retries, the circuit
+    breaker and ``stats`` (keyed by ``source``, the host if none is given).
+    """
+
+    def __init__(self, session_factory, max_downloads, page_workers=4, download_workers=8,
+                 max_per_host=2, host_delay=0.5, timeout=15, queue_size=64, page_headers=None,
+                 retry=None, breaker_threshold=5, max_delay=30.0):
+        self.session_factory = session_factory
+        self.page_headers = page_headers
+        self.budget = DownloadBudget(max_downloads)
+        self.limiter = HostLimiter(max_per_host, host_delay, max_delay)
+        self.retry = retry or RetryPolicy()
+        self.breaker = CircuitBreaker(breaker_threshold)
+        self.stats = SourceStats()
+        self.page_workers = page_workers
+        self.download_workers = download_workers
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.stop = threading.Event()
+        self._local = threading.local()
+
+    # ==================== HTTP ====================
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.session_factory()
+        return session
+
+    def get(self, url, source=None, **kwargs):
+        """GET through this thread's session via ``call`` (limits, retries, breaker, stats)."""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.call(url, lambda: self.session.get(url, **kwargs), source)
+
+    def call(self, url, request, source=None, retry_on=(requests.ConnectionError, requests.Timeout), on_retry=None):
+        """Run ``request()`` for ``url`` and return its result, retrying transient failures.
+
+        ``request`` returns a Response, or an object with ``.response`` and
+        ``.size`` (a download result). Retried: exceptions in ``retry_on``,
+        and 429 / 5xx whether returned or raised as HTTPError, unless the
+        exception has ``retryable = False``. The last
+        attempt's response is returned, or its exception re-raised.
+        Raises HostUnavailable without sending anything once the host's
+        breaker is open. ``on_retry(retry, reason)`` is called before each
+        backoff sleep.
+        """
+        host = host_of(url)
+        source = source or host
+        for attempt in range(self.retry.max_retries + 1):
+            if not self.breaker.allow(host):
+                self.stats.add(source, skipped=1)
+                raise HostUnavailable(f'{host} skipped: circuit breaker open after repeated failures')
+            error = result = response = None
+            start = time.perf_counter()
+            try:
+                with self.limiter(url):
+                    result = request()
+                response = getattr(result, 'response', result)
+            except requests.HTTPError as e:
+                error, response = e, e.response
+            except retry_on as e:
+                error = e
+            latency = time.perf_counter() - start
+            status = response.status_code if response is not None else None
+            if error is not None and not getattr(error, 'retryable', True):
+                # Failed without reaching the host (e.g. a cache miss in replay mode)
+                self.stats.add(source, requests=1, latency=latency, failed=1)
+                raise error
+
+            transient = status in RETRY_STATUS or (error is not None and not isinstance(error, requests.HTTPError))
+            if not transient:
+                self.limiter.succeeded(url)
+                self.breaker.success(host)
+                size = getattr(result, 'size', None)
+                if size is None and response is not None and not isinstance(error, requests.HTTPError):
+                    # A streamed body that nobody has read yet is not counted
+                    size = len(response.content) if response._content_consumed else 0
+                self.stats.add(source, requests=1, latency=latency, bytes=size or 0, ok=int(error is None),
+                               failed=int(error is not None), cached=int(getattr(response, 'from_cache', False)))
+                if error is not None:
+                    raise error
+                return result
+
+            wait_hint = retry_after(response)
+            # The host is asking us to slow down; a bare 503 is an outage, left to the breaker
+            if status == 429 or (status == 503 and wait_hint is not None):
+                self.limiter.throttled(url, wait_hint)
+                self.stats.add(source, throttled=1)
+            last = attempt == self.retry.max_retries or self.stop.is_set() or not self.breaker.allow(host)
+            self.stats.add(source, requests=1, latency=latency, failed=int(last), retries=int(not last))
+            if last:
+                if self.breaker.failure(host):
+                    print(f"   🚫 {host}: {self.breaker.threshold} requests failed in a row, "
+                          f"skipping it for the rest of the run")
+                if error is not None:
+                    raise error
+                return result
+            if on_retry:
+                on_retry(attempt + 1, str(error) if error is not None else f'HTTP {status}')
+            time.sleep(self.retry.delay(attempt, wait_hint))
+
+    # ==================== STAGES ====================
+
+    def _produce(self, url, extract, source, candidates):
+        if self.stop.is_set():
+            return
+        try:
+            headers = self.page_headers(url) if self.page_headers else None
+            response = self.get(url, source, headers=headers)
+        except Exception as e:
+            print(f"   ⚠️  {url}: {str(e)[:60]}")
+            return
+        for candidate in extract(response):
+            if self.stop.is_set():
+                return
+            candidates.put(candidate)
+
+    def _consume(self, candidates, download):
+        while True:
+            candidate = candidates.get()
+            if candidate is _DONE:
+                return
+            if self.stop.is_set():
+                continue  # drain, so producers blocked on put() can finish
+            counts = candidate.get('counts', True)
+            if counts and not self.budget.claim():
+                self.stop.set()
+                continue
+            ok = False
+            try:
+                ok = download(candidate, self.session)
+            finally:
+                if counts:
+                    if ok:
+                        if self.budget.commit() >= self.budget.limit:
+                            self.stop.set()
+                    else:
+                        self.budget.release()
+
+    def run(self, pages, download, seeds=()):
+        """Process every page job; returns the number of counted downloads."""
+        candidates = queue.Queue(maxsize=self.queue_size)
+        consumers = [threading.Thread(target=self._consume, args=(candidates, download), daemon=True)
+                     for _ in range(self.download_workers)]
+        for t in consumers:
+            t.start()
+        for candidate in seeds:
+            candidates.put(candidate)
+        with ThreadPoolExecutor(max_workers=self.page_workers) as pool:
+            futures = [pool.submit(self._produce, url, extract, source, candidates) for url, extract, source in pages]
+            for f in futures:
+                f.result()
+        for _ in consumers:
+            candidates.put(_DONE)
+        for t in consumers:
+            t.join()
+        return self.budget.count
@@ -0,0 +1,329 @@
+"""Table extraction pipeline behind Wiki Table Data Scraper.py.
+
+    fetch_pages     pages are fetched concurrently (a few at a time, at most
+                    ``max_per_host`` per site) and handed over as they arrive
+    expand_rows     rows are streamed with rowspan / colspan expanded, so a
+                    spanned cell repeats its value in every row and column it covers
+    TableData       the expanded rows go into per-column lists; when the table
+                    ends, each column gets a type (int, float or str) from its values
+    write_table     CSV always, Parquet / Arrow IPC when pyarrow is installed
+
+Only one page and one table are held at a time, so memory is bounded by the
+biggest table, not by the whole run.
+
+Header rows are the leading rows made only of <th> cells. A two-row header
+such as ``Regions`` spanning ``Count`` / ``Availability zones`` becomes the
+column names ``Regions / Count`` and ``Regions / Availability zones``.
+Citation markers (``105[1]``) and thousands separators are stripped before
+numbers are recognised; ``''``, ``n/a`` and ``—`` become missing values.
+"""
+import csv
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import unquote, urlsplit
+
+import requests
+
+from html_parsing import iter_tables
+from http_cache import install
+from scrape_engine import HostLimiter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/122.0 Safari/537.36"
+}
+
+_CITATION = re.compile(r'\[(?:\d+|[a-z]|note \d+|citation needed)\]', re.IGNORECASE)
+_INT = re.compile(r'[+-]?\d{1,3}(?:,\d{3})+|[+-]?\d+')
+_FLOAT = re.compile(r'[+-]?(?:\d{1,3}(?:,\d{3})+|\d+)?\.\d+(?:[eE][+-]?\d+)?')
+MISSING = {'', 'n/a', 'na', '—', '–', '-', '?'}
+
+
+# ==================== FETCHING ====================
+
+def fetch_pages(urls, workers=4, max_per_host=2, host_delay=0.0, timeout=30, session_factory=None, cache=None):
+    """Yield ``(url, html, error)`` in completion order.
+
+    At most ``workers`` pages are in flight (or waiting to be consumed) at once,
+    so a long URL list never piles up in memory. With an ``http_cache.HttpCache``
+    the pages are served from / stored in it.
+    """
+    limiter = HostLimiter(max_per_host, host_delay)
+    local = threading.local()
+
+    def new_session():
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        if cache is not None:
+            install(session, cache)
+        return session
+
+    session_factory = session_factory or new_session
+
+    def fetch(url):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = session_factory()
+        with limiter(url):
+            response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    urls = iter(urls)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for url in urls:
+            pending[pool.submit(fetch, url)] = url
+            if len(pending) >= workers:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = pending.pop(future)
+                try:
+                    yield url, future.result(), None
+                except Exception as e:
+                    yield url, None, e
+                next_url = next(urls, None)
+                if next_url is not None:
+                    pending[pool.submit(fetch, next_url)] = next_url
+
+
+# ==================== ROWS ====================
+
+def expand_rows(rows):
+    """Yield each row as a list of (text, is_header), with rowspan/colspan filled in.
+
+    ``rows`` is any iterable of Cell lists; spans carried down from earlier
+    rows are kept in a dict keyed by column, so rows are never buffered.
+    """
+    carried = {}  # column -> [rows_left, text, is_header]
+    for cells in rows:
+        out = []
+        col = 0
+        cells = iter(cells)
+        while True:
+            if col in carried:
+                left, text, header = carried[col]
+                out.append((text, header))
+                if left == 1:
+                    del carried[col]
+                else:
+                    carried[col][0] = left - 1
+                col += 1
+                continue
+            cell = next(cells, None)
+            if cell is None:
+                if carried and max(carried) > col:
+                    out.append(('', False))  # hole before a span further right
+                    col += 1
+                    continue
+                break
+            for _ in range(cell.colspan):
+                out.append((cell.text, cell.header))
+                if cell.rowspan > 1:
+                    carried[col] = [cell.rowspan - 1, cell.text, cell.header]
+                col += 1
+        yield out
+
+
+def clean_text(text):
+    return _CITATION.sub('', text).strip()
+
+
+def parse_value(text):
+    """Cleaned cell text -> None, int, float or the string itself."""
+    if text.lower() in MISSING:
+        return None
+    if _INT.fullmatch(text):
+        return int(text.replace(',', ''))
+    if _FLOAT.fullmatch(text):
+        return float(text.replace(',', ''))
+    return text
+
+
+# ==================== TABLES ====================
+
+def header_names(header_rows, width):
+    """Column names from the expanded header rows (multi-row headers joined with ' / ')."""
+    names = []
+    for col in range(width):
+        parts = []
+        for row in header_rows:
+            text = clean_text(row[col][0]) if col < len(row) else ''
+            if text and (not parts or parts[-1] != text):
+                parts.append(text)
+        names.append(' / '.join(parts) or f'Column_{col}')
+    # Duplicate names would collide in Parquet / DataFrames
+    seen = {}
+    for i, name in enumerate(names):
+        if name in seen:
+            seen[name] += 1
+            names[i] = f'{name}_{seen[name]}'
+        else:
+            seen[name] = 1
+    return names
+
+
+class TableData:
+    """Columnar buffer for one table; rows are appended as they are expanded."""
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = list(columns)
+        self.values = [[] for _ in self.columns]
+        self.num_rows = 0
+
+    def append(self, row):
+        if len(row) > len(self.columns):
+            for col in range(len(self.columns), len(row)):
+                self.columns.append(f'Column_{col}')
+                self.values.append([None] * self.num_rows)
+        for col, values in enumerate(self.values):
+            values.append(parse_value(clean_text(row[col][0])) if col < len(row) else None)
+        self.num_rows += 1
+
+    def types(self):
+        """Per-column type: int, float or str (a column mixing kinds falls back to str)."""
+        result = []
+        for values in self.values:
+            kinds = {type(v) for v in values if v is not None}
+            if kinds <= {int}:
+                result.append(int)
+            elif kinds <= {int, float}:
+                result.append(float)
+            else:
+                result.append(str)
+        return result
+
+    def typed_columns(self):
+        for name, kind, values in zip(self.columns, self.types(), self.values):
+            if kind is str:
+                values = [None if v is None else str(v) for v in values]
+            elif kind is float:
+                values = [None if v is None else float(v) for v in values]
+            yield name, kind, values
+
+
+def table_name(table, index, page_url=None):
+    """File-safe name from the caption, like the original script (``table_<i>`` without one)."""
+    name = f'table_{index}'
+    if table.caption:
+        name = ''.join(c if c.isalnum() or c in (' ', '_', '-') else '' for c in clean_text(table.caption))
+        name = name.strip().replace(' ', '_') or f'table_{index}'
+    if page_url:
+        page = unquote(urlsplit(page_url).path.rstrip('/').rsplit('/', 1)[-1]) or 'page'
+        page = ''.join(c if c.isalnum() or c in ('_', '-') else '_' for c in page)
+        name = f'{page}__{name}'
+    return name
+
+
+def read_table(table, name):
+    """Stream ``table``'s rows into a TableData; None if it has no data rows."""
+    rows = expand_rows(table.rows)
+    header_rows = []
+    data = None
+    for row in rows:
+        if not row:
+            continue
+        if data is None:
+            if all(header for _, header in row):
+                header_rows.append(row)
+                continue
+            width = max([len(row)] + [len(h) for h in header_rows])
+            data = TableData(name, header_names(header_rows, width) if header_rows else
+                             [f'Column_{i}' for i in range(width)])
+        if any(clean_text(text) for text, _ in row):
+            data.append(row)
+    if data is None or not data.num_rows:
+        return None
+    return data
+
+
+# ==================== OUTPUT ====================
+
+def unique_path(out_dir, name, ext, taken):
+    """``name.ext`` in ``out_dir``, numbered if another table of this run already used it."""
+    candidate, n = name, 1
+    while (candidate, ext) in taken:
+        n += 1
+        candidate = f'{name}_{n}'
+    taken.add((candidate, ext))
+    return os.path.join(out_dir, f'{candidate}.{ext}')
+
+
+def write_table(data, out_dir, formats=('csv',), taken=None):
+    """Write one table in each of ``formats``; returns the paths written."""
+    taken = set() if taken is None else taken
+    paths = []
+    if 'csv' in formats:
+        path = unique_path(out_dir, data.name, 'csv', taken)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(data.columns)
+            for i in range(data.num_rows):
+                writer.writerow(['' if v[i] is None else v[i] for v in data.values])
+        paths.append(path)
+
+    columnar = [fmt for fmt in formats if fmt in ('parquet', 'arrow')]
+    if columnar:
+        if pa is None:
+            print(f"   ⚠️  pyarrow not installed, skipping {', '.join(columnar)} for {data.name}")
+            return paths
+        arrow_types = {int: pa.int64(), float: pa.float64(), str: pa.string()}
+        arrays = {name: pa.array(values, type=arrow_types[kind]) for name, kind, values in data.typed_columns()}
+        arrow_table = pa.table(arrays)
+        if 'parquet' in columnar:
+            path = unique_path(out_dir, data.name, 'parquet', taken)
+            pq.write_table(arrow_table, path)
+            paths.append(path)
+        if 'arrow' in columnar:
+            path = unique_path(out_dir, data.name, 'arrow', taken)
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+            paths.append(path)
+    return paths
+
+
+# ==================== PIPELINE ====================
+
+def scrape_tables(urls, out_dir='.', formats=('csv',), table_class=None, workers=4, max_per_host=2,
+                  parser=None, session_factory=None, cache=None):
+    """Fetch ``urls`` concurrently and write every table found; returns the paths written.
+
+    ``table_class`` keeps only tables with that CSS class (e.g. ``'wikitable'``).
+    Output names get a page prefix when more than one URL is given.
+    """
+    urls = list(urls)
+    os.makedirs(out_dir, exist_ok=True)
+    prefix = len(urls) > 1
+    taken = set()
+    written = []
+    for url, html, error in fetch_pages(urls, workers, max_per_host, session_factory=session_factory, cache=cache):
+        if error is not None:
+            print(f"❌ {url}: {str(error)[:80]}")
+            continue
+        found = 0
+        for index, table in enumerate(iter_tables(html, parser)):
+            if table_class and table_class not in table.attrs.get('class', '').split():
+                continue
+            data = read_table(table, table_name(table, index, url if prefix else None))
+            if data is None:
+                continue
+            found += 1
+            for path in write_table(data, out_dir, formats, taken):
+                written.append(path)
+                print(f"Saved {os.path.basename(path)} ({data.num_rows} rows x {len(data.columns)} columns)")
+        print(f"{url}: {found} tables")
+    return written
@@ -1,53 +1,213 @@
 from flask import Flask, request, jsonify, render_template_string
+import hashlib
+import io
 import joblib
+import json
 import numpy as np
 import os
-from PIL import Image
+import threading
+import time
+
+from batching import MicroBatcher
+from prediction_cache import PredictionCache
+from preprocessing import ImagePreprocessor
+
+# torch / torchvision are imported on first use of the image model (see
+# import_torch), so numeric-only deployments never pay for them.
+torch = None
+F = None
+prepare_image_model = None
+load_state_dict = None
+to_input = None
+
+def import_torch():
+        global torch, F, prepare_image_model, load_state_dict, to_input
+        if torch is not None:
+                return True
+        try:
+                import torch as torch_module
+                import torch.nn.functional as functional
+                import image_backends
+        except Exception:
+                return False
+        F = functional
+        prepare_image_model = image_backends.prepare_image_model
+        load_state_dict = image_backends.load_state_dict
+        to_input = image_backends.to_input
+        torch = torch_module
+        # Under gunicorn --preload the master stays single-threaded; each worker
+        # applies the real policy in post_fork (see gunicorn.conf.py).
+        configure_torch_threads(1 if os.environ.get('TORCH_SINGLE_THREAD_UNTIL_FORK') == '1' else None)
+        return True
+
+# Inference executor and torch threading. IMAGE_INFER_WORKERS batches run in
+# parallel per process; TORCH_NUM_THREADS=auto splits the CPUs this process may
+# use (after any CPU_AFFINITY pinning) evenly between them so concurrent
+# forward passes do not oversubscribe the cores. When several processes share
+# the same CPUs (gunicorn workers without CPU_AFFINITY), the CPUs are first
+# divided between them: gunicorn.conf.py sets CPU_SHARING_PROCESSES.
+IMAGE_INFER_WORKERS = int(os.environ.get('IMAGE_INFER_WORKERS', '1'))
+TORCH_NUM_THREADS = os.environ.get('TORCH_NUM_THREADS', 'auto')
+TORCH_INTEROP_THREADS = int(os.environ.get('TORCH_INTEROP_THREADS', '1'))
+
+def available_cpus():
+        try:
+                return len(os.sched_getaffinity(0))
+        except AttributeError:
+                return os.cpu_count() or 1
 
-try:
-        import torch
-        import torch.nn.functional as F
-        from torchvision import transforms, models
-except Exception:
-        torch = None
+def configure_torch_threads(num_threads=None, processes=None):
+        # processes: how many processes run on this process's CPU set (default: CPU_SHARING_PROCESSES or 1)
+        if torch is None:
+                return
+        if num_threads is None:
+                if TORCH_NUM_THREADS == 'auto':
+                        if processes is None:
+                                processes = int(os.environ.get('CPU_SHARING_PROCESSES', '1'))
+                        num_threads = max(1, available_cpus() // (max(1, processes) * max(1, IMAGE_INFER_WORKERS)))
+                else:
+                        num_threads = int(TORCH_NUM_THREADS)
+        torch.set_num_threads(num_threads)
+        try:
+                torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError:
+                pass  # only settable once per process, before any inter-op work
 
 app = Flask(__name__)
 
+# Requests larger than this are refused with 413 (also used by asgi_app.py)
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
 # Numeric model (scikit-learn)
-NUMERIC_MODEL_PATH = os.path.join("AI & ML Models", "iris_model.pkl")
+NUMERIC_MODEL_PATH = os.environ.get('NUMERIC_MODEL_PATH', os.path.join("AI & ML Models", "iris_model.pkl"))
 numeric_model = None
-if os.path.exists(NUMERIC_MODEL_PATH):
-        try:
-                numeric_model = joblib.load(NUMERIC_MODEL_PATH)
-        except Exception:
-                numeric_model = None
+
+def load_numeric_model():
+        global numeric_model
+        model = None
+        if os.path.exists(NUMERIC_MODEL_PATH):
+                try:
+                        model = joblib.load(NUMERIC_MODEL_PATH)
+                except Exception:
+                        model = None
+        numeric_model = model
+
+load_numeric_model()
 
 # Image model (PyTorch) - optional, saved by training script
-IMAGE_MODEL_DIR = os.path.join("Flower Recognition Model")
+IMAGE_MODEL_DIR = os.environ.get('IMAGE_MODEL_DIR', os.path.join("Flower Recognition Model"))
 IMAGE_MODEL_PATH = os.path.join(IMAGE_MODEL_DIR, "image_model.pth")
 IMAGE_CLASSES_PATH = os.path.join(IMAGE_MODEL_DIR, "classes.json")
 image_model = None
 image_classes = None
 device = 'cpu'
 
+# Inference backend: eager | torchscript | int8-dynamic | int8-static (see image_backends.py)
+IMAGE_MODEL_BACKEND = os.environ.get('IMAGE_MODEL_BACKEND', 'eager')
+IMAGE_MODEL_CHANNELS_LAST = os.environ.get('IMAGE_MODEL_CHANNELS_LAST', '0') == '1'
+# Memory-map image_model.pth so workers share its pages. The file must then be
+# replaced atomically (the trainer does); set 0 if it may be overwritten in place.
+IMAGE_MODEL_MMAP = os.environ.get('IMAGE_MODEL_MMAP', '1') == '1'
+IMAGE_CALIBRATION_DIR = os.environ.get('IMAGE_CALIBRATION_DIR', os.path.join('flower_images', 'train'))
+IMAGE_CALIBRATION_SAMPLES = int(os.environ.get('IMAGE_CALIBRATION_SAMPLES', '64'))
+image_backend = None
+
+# IMAGE_MODEL_WARMUP: lazy (load on first /predict-image), background (load in
+# a thread at startup) or eager (load during import, blocking startup).
+IMAGE_MODEL_WARMUP = os.environ.get('IMAGE_MODEL_WARMUP', 'lazy')
+# not-loaded -> loading -> ready | unavailable (no model files / no torch) | error
+image_model_status = 'not-loaded'
+image_model_load_seconds = None
+image_model_error = None
+_image_model_lock = threading.Lock()
+
 def load_image_model():
-        global image_model, image_classes, device
-        if torch is None:
-                return
+        global image_model, image_classes, image_backend, device
+        global image_model_status, image_model_load_seconds, image_model_error
         if not os.path.exists(IMAGE_MODEL_PATH) or not os.path.exists(IMAGE_CLASSES_PATH):
+                # Checked before importing torch so pods without an image model never load it
+                image_model, image_model_status = None, 'unavailable'
                 return
-        import json
-        with open(IMAGE_CLASSES_PATH, 'r') as f:
-                image_classes = json.load(f)
-        num_classes = len(image_classes)
-        model = models.resnet18(pretrained=False)
-        model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
-        state = torch.load(IMAGE_MODEL_PATH, map_location='cpu')
-        model.load_state_dict(state)
-        model.eval()
-        image_model = model
-
-load_image_model()
+        if image_model is None:
+                image_model_status = 'loading'
+        started = time.perf_counter()
+        if not import_torch():
+                image_model_status, image_model_error = 'unavailable', 'torch not installed'
+                return
+        try:
+                with open(IMAGE_CLASSES_PATH, 'r') as f:
+                        classes = json.load(f)
+                num_classes = len(classes)
+                state = load_state_dict(IMAGE_MODEL_PATH, mmap=IMAGE_MODEL_MMAP)
+                backend = IMAGE_MODEL_BACKEND
+                try:
+                        model = prepare_image_model(state, num_classes, backend, IMAGE_MODEL_CHANNELS_LAST,
+                                                    IMAGE_CALIBRATION_DIR, IMAGE_CALIBRATION_SAMPLES)
+                except Exception as e:
+                        print(f'Image backend {backend!r} unavailable ({e}); falling back to eager')
+                        backend = 'eager'
+                        model = prepare_image_model(state, num_classes, backend, IMAGE_MODEL_CHANNELS_LAST)
+        except Exception as e:
+                # Keep serving the previous model (if any) when a reload fails
+                image_model_error = str(e)
+                image_model_status = 'ready' if image_model is not None else 'error'
+                return
+        # Swap together so a reload never serves a half-updated model
+        image_model, image_classes, image_backend = model, classes, backend
+        image_model_load_seconds = round(time.perf_counter() - started, 3)
+        image_model_error = None
+        image_model_status = 'ready'
+
+def ensure_image_model():
+        # Loads the image model on first use; concurrent callers wait for the same load
+        if image_model_status in ('not-loaded', 'loading'):
+                with _image_model_lock:
+                        if image_model_status == 'not-loaded':
+                                load_image_model()
+        return image_model
+
+def reload_image_model():
+        # Called by the prediction cache when the model files change on disk
+        if image_model_status == 'not-loaded':
+                return
+        with _image_model_lock:
+                load_image_model()
+
+if IMAGE_MODEL_WARMUP == 'eager':
+        ensure_image_model()
+elif IMAGE_MODEL_WARMUP == 'background':
+        threading.Thread(target=ensure_image_model, name='image-model-warmup', daemon=True).start()
+
+# Built once at startup; equivalent to Resize(256) + CenterCrop(224) + ToTensor() + Normalize(ImageNet)
+preprocess_image = ImagePreprocessor(resize=256, crop=224)
+
+# Micro-batching: concurrent /predict-image requests are coalesced into one
+# forward pass. Set IMAGE_BATCH_MAX_SIZE=1 to run every image on its own.
+IMAGE_BATCH_MAX_SIZE = int(os.environ.get('IMAGE_BATCH_MAX_SIZE', '8'))
+IMAGE_BATCH_MAX_WAIT_MS = float(os.environ.get('IMAGE_BATCH_MAX_WAIT_MS', '5'))
+
+def run_image_batch(tensors):
+        # tensors: list of C,H,W tensors -> list of per-image probability arrays
+        batch = to_input(torch.stack(tensors), IMAGE_MODEL_CHANNELS_LAST)
+        with torch.no_grad():
+                outputs = image_model(batch)
+                probs = F.softmax(outputs, dim=1).cpu().numpy()
+        return list(probs)
+
+image_batcher = MicroBatcher(run_image_batch, max_batch_size=IMAGE_BATCH_MAX_SIZE, max_wait_ms=IMAGE_BATCH_MAX_WAIT_MS,
+                             num_workers=IMAGE_INFER_WORKERS)
+
+# Prediction cache: identical uploads / feature vectors are answered from an
+# LRU+TTL cache. PREDICTION_CACHE_DIR adds a disk tier shared by all workers.
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '4096'))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', '3600'))
+PREDICTION_CACHE_DIR = os.environ.get('PREDICTION_CACHE_DIR') or None
+PREDICTION_CACHE_DECIMALS = int(os.environ.get('PREDICTION_CACHE_DECIMALS', '4'))
+numeric_cache = PredictionCache('numeric', PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_DIR,
+                                watch_paths=[NUMERIC_MODEL_PATH], on_change=load_numeric_model)
+image_cache = PredictionCache('image', PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_DIR,
+                              watch_paths=[IMAGE_MODEL_PATH, IMAGE_CLASSES_PATH], on_change=reload_image_model)
 
 SPECIES = {0: 'setosa', 1: 'versicolor', 2: 'virginica'}
 
@@ -221,66 +381,160 @@ def health():
         return jsonify({'status': 'ok'}), 200
 
 
+def readiness():
+        # Unlike /health, reports whether each model is actually loaded. A lazily
+        # loaded image model does not block readiness; eager/background ones do.
+        image_pending = IMAGE_MODEL_WARMUP != 'lazy' and image_model_status in ('not-loaded', 'loading')
+        body = {
+                'ready': not image_pending,
+                'numeric_model': 'ready' if numeric_model is not None else 'unavailable',
+                'image_model': image_model_status,
+                'image_model_warmup': IMAGE_MODEL_WARMUP,
+                'image_model_load_seconds': image_model_load_seconds,
+                'image_backend': image_backend,
+                'torch_imported': torch is not None
+        }
+        if image_model_error:
+                body['image_model_error'] = image_model_error
+        return body, 200 if body['ready'] else 503
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+        body, status = readiness()
+        return jsonify(body), status
+
+
+def metrics_payload():
+        return {
+                'image_backend': image_backend,
+                'image_channels_last': IMAGE_MODEL_CHANNELS_LAST,
+                'cpus_available': available_cpus(),
+                'torch_threads': torch.get_num_threads() if torch is not None else None,
+                'torch_interop_threads': torch.get_num_interop_threads() if torch is not None else None,
+                'image_batcher': image_batcher.metrics(),
+                'numeric_cache': numeric_cache.stats(),
+                'image_cache': image_cache.stats()
+        }
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+        return jsonify(metrics_payload()), 200
+
+
+def score_numeric(input_arr):
+        # One model pass for N rows: the prediction is the argmax of
+        # predict_proba, so the model is not run a second time via predict().
+        probs = None
+        try:
+                if hasattr(numeric_model, 'predict_proba'):
+                        probs = numeric_model.predict_proba(input_arr)
+        except Exception:
+                probs = None
+        if probs is None:
+                pred = np.asarray(numeric_model.predict(input_arr)).astype(int)
+                return pred, np.ones(len(pred))
+        top = probs.argmax(axis=1)
+        classes = getattr(numeric_model, 'classes_', None)
+        pred = np.asarray(classes)[top].astype(int) if classes is not None else top
+        return pred, probs[np.arange(len(top)), top]
+
+
+def numeric_feature_count():
+        return int(getattr(numeric_model, 'n_features_in_', 4))
+
+
+def parse_numeric_batch(req):
+        # JSON: {"inputs": [[...], ...]}; binary: .npy (application/x-npy) or
+        # raw little-endian float32 rows (application/octet-stream).
+        n_features = numeric_feature_count()
+        content_type = (req.mimetype or '').lower()
+        if content_type in ('application/x-npy', 'application/octet-stream'):
+                body = req.get_data(cache=False)
+                if body[:6] == b'\x93NUMPY':
+                        arr = np.load(io.BytesIO(body), allow_pickle=False)
+                else:
+                        if len(body) % (4 * n_features):
+                                raise ValueError(f'binary body must be float32 rows of {n_features} values')
+                        arr = np.frombuffer(body, dtype='<f4').reshape(-1, n_features)
+        else:
+                data = req.get_json(force=True)
+                arr = np.asarray(data.get('inputs', data.get('input')), dtype=np.float64)
+        if arr.size == 0:
+                arr = arr.reshape(0, n_features)
+        if arr.ndim != 2 or arr.shape[1] != n_features:
+                raise ValueError(f'expected an N x {n_features} matrix, got shape {list(arr.shape)}')
+        return arr
+
+
+def predict_numeric(values):
+        # Returns (payload, status) for one feature vector; shared by the Flask and ASGI apps
+        if numeric_model is None:
+                return {'error': 'numeric model not available'}, 500
+        input_arr = np.array(values).reshape(1, -1)
+        key = ','.join(f'{x:.{PREDICTION_CACHE_DECIMALS}f}' for x in input_arr[0].astype(float))
+        cached = numeric_cache.get(key)
+        if cached is not None:
+                return cached, 200
+        generation = numeric_cache.generation
+        pred, conf = score_numeric(input_arr)
+        pred_index = int(pred[0])
+        pred_name = SPECIES.get(pred_index, str(pred_index))
+        payload = {'method': 'numeric', 'prediction_index': pred_index, 'prediction_name': pred_name, 'confidence': round(float(conf[0]), 3)}
+        numeric_cache.put(key, payload, generation)
+        return payload, 200
+
+
 @app.route('/predict', methods=['POST'])
 def predict():
+        data = request.get_json(force=True)
+        payload, status = predict_numeric(data['input'])
+        return jsonify(payload), status
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
         if numeric_model is None:
                 return jsonify({'error': 'numeric model not available'}), 500
-        data = request.get_json(force=True)
-        input_arr = np.array(data['input']).reshape(1, -1)
-        pred_index = int(numeric_model.predict(input_arr)[0])
-        pred_name = SPECIES.get(pred_index, str(pred_index))
-        # Try to provide a confidence score when model supports it
-        conf = None
         try:
-                if hasattr(numeric_model, 'predict_proba'):
-                        probs = numeric_model.predict_proba(input_arr)[0]
-                        conf = float(probs.max())
-        except Exception:
-                conf = None
-        if conf is None:
-                conf = 1.0
-        return jsonify({'method': 'numeric', 'prediction_index': pred_index, 'prediction_name': pred_name, 'confidence': round(float(conf), 3)})
+                input_arr = parse_numeric_batch(request)
+        except Exception as e:
+                return jsonify({'error': 'invalid batch', 'detail': str(e)}), 400
+        if len(input_arr) == 0:
+                return jsonify({'method': 'numeric', 'count': 0, 'prediction_index': [], 'prediction_name': [], 'confidence': []})
+        pred, conf = score_numeric(input_arr)
+        return jsonify({
+                'method': 'numeric',
+                'count': int(len(pred)),
+                'prediction_index': pred.tolist(),
+                'prediction_name': [SPECIES.get(i, str(i)) for i in pred.tolist()],
+                'confidence': np.round(conf.astype(float), 3).tolist()
+        })
 
 
-@app.route('/predict-image', methods=['POST'])
-def predict_image():
-        # Accepts multipart/form-data with file field named 'file'
-        if 'file' not in request.files:
-                return jsonify({'error': 'no file uploaded'}), 400
-        f = request.files['file']
+def classify_image_bytes(data):
+        # Returns (payload, status) for one uploaded image; shared by the route and the cache
         try:
-                img = Image.open(f.stream).convert('RGB')
+                # One decode + resize gives both the model input and the average color
+                model = ensure_image_model()
+                chw, (r,g,b) = preprocess_image(io.BytesIO(data), with_tensor=model is not None)
         except Exception as e:
-                return jsonify({'error': 'cannot open image', 'detail': str(e)}), 400
-
-        # Compute average color
-        arr = np.array(img.resize((64,64))) / 255.0
-        avg = arr.mean(axis=(0,1))
-        r,g,b = avg.tolist()
+                return {'error': 'cannot open image', 'detail': str(e)}, 400
 
         # If a trained image model exists, use it
-        if image_model is not None:
-                if torch is None:
-                        return jsonify({'error': 'torch not available on server'}), 500
-                preprocess = transforms.Compose([
-                        transforms.Resize(256),
-                        transforms.CenterCrop(224),
-                        transforms.ToTensor(),
-                        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-                ])
-                input_tensor = preprocess(img).unsqueeze(0)  # shape 1,C,H,W
-                with torch.no_grad():
-                        outputs = image_model(input_tensor)
-                        probs = F.softmax(outputs, dim=1).cpu().numpy()[0]
-                        top_idx = int(probs.argmax())
-                        top_conf = float(probs[top_idx])
-                        top_name = image_classes[top_idx] if image_classes else str(top_idx)
-                return jsonify({
+        if model is not None:
+                input_tensor = torch.from_numpy(chw)  # shape C,H,W; batched by image_batcher
+                probs = image_batcher(input_tensor)
+                top_idx = int(probs.argmax())
+                top_conf = float(probs[top_idx])
+                top_name = image_classes[top_idx] if image_classes else str(top_idx)
+                return {
                         'method': 'image-model',
                         'prediction_name': top_name,
                         'confidence': round(top_conf, 3),
                         'avg_color_rgb': [round(float(x),3) for x in (r,g,b)]
-                })
+                }, 200
 
         # Fallback: simple visual heuristic (if no image model)
         if g > r and g > b and g > 0.38:
@@ -293,12 +547,33 @@ def predict_image():
                 guess = 'virginica'
                 conf = 0.35 + max(r,g,b) - 0.3
         conf = float(min(max(conf, 0.0), 0.99))
-        return jsonify({
+        return {
                 'method': 'visual-heuristic-placeholder',
                 'prediction_name': guess,
                 'confidence': round(conf, 3),
                 'avg_color_rgb': [round(float(x),3) for x in (r,g,b)]
-        })
+        }, 200
+
+
+def predict_image_bytes(data):
+        key = hashlib.sha256(data).hexdigest()
+        cached = image_cache.get(key)
+        if cached is not None:
+                return cached, 200
+        generation = image_cache.generation
+        payload, status = classify_image_bytes(data)
+        if status == 200:
+                image_cache.put(key, payload, generation)
+        return payload, status
+
+
+@app.route('/predict-image', methods=['POST'])
+def predict_image():
+        # Accepts multipart/form-data with file field named 'file'
+        if 'file' not in request.files:
+                return jsonify({'error': 'no file uploaded'}), 400
+        payload, status = predict_image_bytes(request.files['file'].read())
+        return jsonify(payload), status
 
 
 if __name__ == '__main__':
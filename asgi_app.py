@@ -0,0 +1,240 @@
+"""ASGI entry point serving the same /predict, /predict-image and /health contract as app.py.
+
+Uploads are parsed incrementally as the body arrives, so a slow client costs
+one coroutine instead of a worker thread, and oversized uploads are refused
+from Content-Length (or as soon as the streamed size passes the limit) with
+413. Decoding and inference run on a bounded thread pool; the models, caches
+and micro-batcher are the ones from app.py.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 80 --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker asgi_app:app
+
+    MAX_UPLOAD_BYTES       largest accepted request body (default 20 MB, shared with app.py)
+    ASGI_EXECUTOR_WORKERS  threads for decode + inference (default: batch size x infer workers x 2)
+    ASGI_MAX_PENDING       CPU jobs allowed to wait for the pool before 503 (default 256)
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+import app as core
+
+MAX_UPLOAD_BYTES = core.MAX_UPLOAD_BYTES
+ASGI_EXECUTOR_WORKERS = int(os.environ.get('ASGI_EXECUTOR_WORKERS',
+                                           str(max(4, core.IMAGE_BATCH_MAX_SIZE * core.IMAGE_INFER_WORKERS * 2))))
+ASGI_MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', '256'))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_EXECUTOR_WORKERS, thread_name_prefix='asgi-cpu')
+_pending = 0
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+# ==================== HELPERS ====================
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def run_cpu(fn, *args):
+    """Run ``fn`` on the bounded pool; None means the queue is full."""
+    global _pending
+    if _pending >= ASGI_MAX_PENDING:
+        return None
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        _pending -= 1
+
+
+def request_headers(scope):
+    return {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+
+
+async def iter_body(receive, limit):
+    received = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionError('client disconnected')
+        chunk = message.get('body', b'')
+        received += len(chunk)
+        if received > limit:
+            raise UploadTooLarge()
+        if chunk:
+            yield chunk
+        if not message.get('more_body', False):
+            return
+
+
+async def read_body(receive, limit):
+    chunks = []
+    async for chunk in iter_body(receive, limit):
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+async def read_multipart_file(receive, content_type, field_name, limit):
+    """Stream a multipart body through the parser, keeping only ``field_name``'s bytes."""
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b'boundary')
+    if not boundary:
+        raise ValueError('missing multipart boundary')
+
+    state = {'header_field': b'', 'header_value': b'', 'headers': {}, 'capture': False}
+    data = bytearray()
+
+    def on_part_begin():
+        state['headers'] = {}
+        state['capture'] = False
+
+    def on_header_field(buf, start, end):
+        state['header_field'] += buf[start:end]
+
+    def on_header_value(buf, start, end):
+        state['header_value'] += buf[start:end]
+
+    def on_header_end():
+        state['headers'][state['header_field'].lower()] = state['header_value']
+        state['header_field'] = b''
+        state['header_value'] = b''
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state['headers'].get(b'content-disposition', b''))
+        state['capture'] = disposition.get(b'name', b'').decode('latin-1') == field_name
+
+    def on_part_data(buf, start, end):
+        if state['capture']:
+            data.extend(buf[start:end])
+
+    parser = MultipartParser(boundary, callbacks={
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+    })
+    async for chunk in iter_body(receive, limit):
+        parser.write(chunk)
+    parser.finalize()
+    return bytes(data) if data else None
+
+
+# ==================== ROUTES ====================
+
+async def health(scope, receive, send):
+    await send_json(send, {'status': 'ok'})
+
+
+async def ready(scope, receive, send):
+    body, status = core.readiness()
+    await send_json(send, body, status)
+
+
+async def metrics(scope, receive, send):
+    payload = core.metrics_payload()
+    payload['asgi'] = {'executor_workers': ASGI_EXECUTOR_WORKERS, 'pending_cpu_jobs': _pending}
+    await send_json(send, payload)
+
+
+async def predict(scope, receive, send):
+    try:
+        data = json.loads(await read_body(receive, MAX_UPLOAD_BYTES))
+        values = data['input']
+    except UploadTooLarge:
+        return await send_json(send, {'error': 'request too large'}, 413)
+    except (ValueError, KeyError, TypeError) as e:
+        return await send_json(send, {'error': 'invalid request', 'detail': str(e)}, 400)
+    result = await run_cpu(core.predict_numeric, values)
+    if result is None:
+        return await send_json(send, {'error': 'server busy'}, 503)
+    await send_json(send, *result)
+
+
+async def predict_image(scope, receive, send):
+    headers = request_headers(scope)
+    content_type = headers.get('content-type', '')
+    if not content_type.startswith('multipart/form-data'):
+        return await send_json(send, {'error': 'no file uploaded'}, 400)
+    try:
+        content_length = int(headers.get('content-length', '0') or 0)
+    except ValueError:
+        return await send_json(send, {'error': 'invalid content-length'}, 400)
+    if content_length > MAX_UPLOAD_BYTES:
+        return await send_json(send, {'error': 'upload too large', 'max_bytes': MAX_UPLOAD_BYTES}, 413)
+    try:
+        data = await read_multipart_file(receive, content_type.encode('latin-1'), 'file', MAX_UPLOAD_BYTES)
+    except UploadTooLarge:
+        return await send_json(send, {'error': 'upload too large', 'max_bytes': MAX_UPLOAD_BYTES}, 413)
+    except ValueError as e:
+        return await send_json(send, {'error': 'invalid multipart body', 'detail': str(e)}, 400)
+    if data is None:
+        return await send_json(send, {'error': 'no file uploaded'}, 400)
+    result = await run_cpu(core.predict_image_bytes, data)
+    if result is None:
+        return await send_json(send, {'error': 'server busy'}, 503)
+    await send_json(send, *result)
+
+
+ROUTES = {
+    ('GET', '/health'): health,
+    ('GET', '/ready'): ready,
+    ('GET', '/metrics'): metrics,
+    ('POST', '/predict'): predict,
+    ('POST', '/predict-image'): predict_image,
+}
+
+
+# ==================== ASGI APP ====================
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        return await send_json(send, {'error': 'not found'}, 404)
+    started = False
+
+    async def tracked_send(message):
+        nonlocal started
+        started = started or message['type'] == 'http.response.start'
+        await send(message)
+
+    try:
+        await handler(scope, receive, tracked_send)
+    except ConnectionError:
+        pass  # client went away mid-upload; nothing to answer
+    except Exception as e:
+        # Same JSON error shape as app.py instead of a bare server error
+        if started:
+            raise
+        await send_json(send, {'error': 'internal error', 'detail': str(e)}, 500)
@@ -0,0 +1,171 @@
+"""Request-coalescing micro-batcher used by app.py for image inference.
+
+Callers hand in one item at a time; a worker thread collects items until
+either ``max_batch_size`` is reached or the oldest item has waited
+``max_wait_ms``, runs one batched call and hands each caller its own result.
+With ``num_workers`` > 1 several batches run concurrently, so the batcher
+also serves as the bounded inference executor for the process.
+"""
+import os
+import threading
+import time
+import weakref
+from collections import Counter, deque
+from concurrent.futures import Future
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item requests into batched calls of ``fn``.
+
+    ``fn`` receives a list of items and must return a list of results of the
+    same length, in the same order.
+    """
+
+    def __init__(self, fn, max_batch_size=8, max_wait_ms=5.0, num_workers=1, metrics_window=4096):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.num_workers = max(1, int(num_workers))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.metrics_window = metrics_window
+        self._pid = None
+        # Guards the fork check, _reset and worker start-up together
+        self._start_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # A parent thread may have held the lock at fork(); the child gets a fresh one
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._new_start_lock())
+        self._reset()
+
+    def _new_start_lock(self):
+        self._start_lock = threading.Lock()
+
+    def _reset(self):
+        # Called on first use and again after a fork: threads and locks
+        # inherited from the parent process are not usable in the child.
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._workers = []
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=self.metrics_window)
+        self._batch_latencies = deque(maxlen=self.metrics_window)
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._pid = os.getpid()
+
+    def _ensure_worker(self):
+        # One lock for the whole check: two threads arriving together after a
+        # fork must not both reset, or the second would drop the first's item.
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if len(self._workers) == self.num_workers and all(t.is_alive() for t in self._workers):
+                return
+            self._workers = [t for t in self._workers if t.is_alive()]
+            while len(self._workers) < self.num_workers:
+                t = threading.Thread(target=self._run, name=f'micro-batcher-{len(self._workers)}', daemon=True)
+                t.start()
+                self._workers.append(t)
+
+    # ==================== PUBLIC API ====================
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result."""
+        future = Future()
+        self._ensure_worker()
+        with self._cond:
+            self._queue.append((item, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit one item and block until its result is ready."""
+        return self.submit(item).result(timeout=timeout)
+
+    def metrics(self):
+        """Snapshot of batch-size distribution and queue wait times."""
+        with self._cond:
+            waits = sorted(self._queue_waits)
+            latencies = sorted(self._batch_latencies)
+            sizes = dict(sorted(self._batch_sizes.items()))
+            requests, batches, errors = self._requests, self._batches, self._errors
+            pending = len(self._queue)
+
+        def ms(v):
+            return None if v is None else round(v * 1000.0, 3)
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'num_workers': self.num_workers,
+            'max_wait_ms': round(self.max_wait * 1000.0, 3),
+            'requests': requests,
+            'batches': batches,
+            'errors': errors,
+            'pending': pending,
+            'mean_batch_size': round(requests / batches, 3) if batches else None,
+            'batch_size_histogram': {str(k): v for k, v in sizes.items()},
+            'queue_wait_ms': {
+                'p50': ms(_percentile(waits, 50)),
+                'p95': ms(_percentile(waits, 95)),
+                'p99': ms(_percentile(waits, 99)),
+                'max': ms(waits[-1] if waits else None),
+            },
+            'batch_latency_ms': {
+                'p50': ms(_percentile(latencies, 50)),
+                'p95': ms(_percentile(latencies, 95)),
+                'p99': ms(_percentile(latencies, 99)),
+            },
+        }
+
+    # ==================== WORKER ====================
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                while not self._queue:
+                    self._cond.wait()
+                # Another worker may take the head while we wait, so the
+                # deadline always follows the oldest item still queued.
+                while self._queue and len(self._queue) < self.max_batch_size:
+                    remaining = self._queue[0][2] + self.max_wait - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._queue:
+                    break
+            n = min(self.max_batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(n)]
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f'batch function returned {len(results)} results for {len(items)} items')
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                with self._cond:
+                    self._errors += 1
+                continue
+            finished = time.perf_counter()
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            with self._cond:
+                self._requests += len(batch)
+                self._batches += 1
+                self._batch_sizes[len(batch)] += 1
+                self._batch_latencies.append(finished - started)
+                for _, _, enqueued in batch:
+                    self._queue_waits.append(started - enqueued)
@@ -0,0 +1,95 @@
+"""Per-image CPU time of the old /predict-image preprocessing vs the fused path.
+
+Usage (from the repository root):
+    python benchmarks/bench_preprocess.py --repeat 50
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocessing import ImagePreprocessor  # noqa: E402
+
+
+def make_image(size, fmt):
+    rng = np.random.default_rng(0)
+    w, h = size
+    # Smooth gradient plus noise so JPEG/PNG sizes look like real photos
+    base = np.linspace(0, 255, w, dtype=np.float32)[None, :, None].repeat(h, axis=0).repeat(3, axis=2)
+    arr = np.clip(base + rng.normal(0, 20, (h, w, 3)), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    kwargs = {'quality': 90} if fmt == 'JPEG' else {}
+    Image.fromarray(arr).save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def legacy(data):
+    # The pipeline app.py used before: full decode, 64x64 resize for the
+    # average colour, then a freshly built torchvision Compose per request.
+    from torchvision import transforms
+    img = Image.open(io.BytesIO(data)).convert('RGB')
+    arr = np.array(img.resize((64, 64))) / 255.0
+    avg = arr.mean(axis=(0, 1))
+    preprocess = transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    ])
+    return preprocess(img), avg
+
+
+def fused_factory():
+    import torch
+    pre = ImagePreprocessor()
+
+    def fused(data):
+        chw, avg = pre(io.BytesIO(data))
+        return torch.from_numpy(chw), avg
+    return fused
+
+
+def cpu_ms_per_image(fn, data, repeat):
+    fn(data)  # warm-up
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(data)
+    return (time.process_time() - start) * 1000.0 / repeat
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--repeat', type=int, default=30)
+    p.add_argument('--sizes', default='640x480,1920x1080,4032x3024')
+    p.add_argument('--formats', default='JPEG,PNG')
+    args = p.parse_args()
+
+    import torch
+    torch.set_num_threads(1)  # CPU time per image, not wall time across cores
+    fused = fused_factory()
+
+    print(f"{'image':<18}{'legacy ms':>12}{'fused ms':>12}{'speedup':>10}")
+    for fmt in args.formats.split(','):
+        for size in args.sizes.split(','):
+            w, h = (int(x) for x in size.split('x'))
+            data = make_image((w, h), fmt)
+            a = cpu_ms_per_image(legacy, data, args.repeat)
+            b = cpu_ms_per_image(fused, data, args.repeat)
+            print(f"{fmt + ' ' + size:<18}{a:>12.2f}{b:>12.2f}{a / b:>9.1f}x")
+
+            # Sanity check: the fused tensor should match torchvision closely
+            # (draft() decoding and a single resize introduce small differences).
+            t_old, _ = legacy(data)
+            t_new, _ = fused(data)
+            diff = float((t_old - t_new).abs().mean())
+            if diff > 0.1:
+                print(f"   warning: mean abs difference vs torchvision is {diff:.3f}")
+
+
+if __name__ == '__main__':
+    main()
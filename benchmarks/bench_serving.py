@@ -0,0 +1,348 @@
+"""Latency / throughput benchmark for the serving endpoints in app.py.
+
+Runs a fixed set of scenarios against two targets:
+
+    flask     the Flask test client, in-process (no network, no server)
+    gunicorn  a local ``gunicorn -c gunicorn.conf.py app:app`` over HTTP
+
+and two image-model variants:
+
+    heuristic  no image model on disk -> visual-heuristic fallback
+    resnet18   a randomly initialized ResNet-18 written to a temp dir
+
+Scenarios: /predict with one vector, /predict/batch with N-row matrices, and
+/predict-image across image sizes and formats. The iris model is a
+LogisticRegression fitted on sklearn's bundled iris data, so nothing needs to
+be downloaded. The prediction cache is disabled for every run.
+
+Each result has p50/p95/p99 latency, requests/sec and the peak RSS of the
+serving process(es). ``--output`` writes JSON. ``--baseline`` compares that
+JSON against a stored run and exits non-zero on regressions beyond ``--tolerance``.
+
+    python benchmarks/bench_serving.py --targets flask --output bench.json
+    python benchmarks/bench_serving.py --targets flask,gunicorn --baseline bench.json
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IRIS_ROW = [5.1, 3.5, 1.4, 0.2]
+
+
+# ==================== FIXTURES ====================
+
+def write_iris_model(path):
+    import joblib
+    from sklearn.datasets import load_iris
+    from sklearn.linear_model import LogisticRegression
+    X, y = load_iris(return_X_y=True)
+    joblib.dump(LogisticRegression(max_iter=500).fit(X, y), path)
+
+
+def write_random_resnet(model_dir, num_classes=5):
+    import torch
+    from torchvision import models
+    torch.manual_seed(0)
+    model = models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
+    torch.save(model.state_dict(), os.path.join(model_dir, 'image_model.pth'))
+    with open(os.path.join(model_dir, 'classes.json'), 'w') as f:
+        json.dump([f'class_{i}' for i in range(num_classes)], f)
+
+
+def make_image(width, height, fmt):
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(width * 31 + height)
+    base = np.linspace(40, 220, width, dtype=np.float32)[None, :, None].repeat(height, axis=0).repeat(3, axis=2)
+    arr = np.clip(base + rng.normal(0, 15, (height, width, 3)), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def multipart(data, filename):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def build_scenarios(args):
+    scenarios = [{
+        'name': 'predict/single',
+        'path': '/predict',
+        'body': json.dumps({'input': IRIS_ROW}).encode(),
+        'content_type': 'application/json',
+        'rows': 1,
+    }]
+    for n in (int(x) for x in args.batch_rows.split(',')):
+        scenarios.append({
+            'name': f'predict/batch-{n}',
+            'path': '/predict/batch',
+            'body': json.dumps({'inputs': [IRIS_ROW] * n}).encode(),
+            'content_type': 'application/json',
+            'rows': n,
+        })
+    for fmt in args.image_formats.split(','):
+        for size in args.image_sizes.split(','):
+            w, h = (int(x) for x in size.split('x'))
+            body, content_type = multipart(make_image(w, h, fmt), f'img.{fmt.lower()}')
+            scenarios.append({
+                'name': f'predict-image/{fmt.lower()}-{size}',
+                'path': '/predict-image',
+                'body': body,
+                'content_type': content_type,
+                'rows': 1,
+            })
+    return scenarios
+
+
+# ==================== MEASUREMENT ====================
+
+def percentile(sorted_values, pct):
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def run_scenario(send, scenario, requests, concurrency, warmup):
+    for _ in range(warmup):
+        send(scenario)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker():
+        local = []
+        for _ in range(per_thread):
+            t0 = time.perf_counter()
+            status = send(scenario)
+            local.append(time.perf_counter() - t0)
+            if status != 200:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    lat = sorted(latencies)
+    return {
+        'scenario': scenario['name'],
+        'requests': len(lat),
+        'errors': errors[0],
+        'concurrency': concurrency,
+        'p50_ms': round(percentile(lat, 50) * 1000, 3),
+        'p95_ms': round(percentile(lat, 95) * 1000, 3),
+        'p99_ms': round(percentile(lat, 99) * 1000, 3),
+        'requests_per_sec': round(len(lat) / elapsed, 2),
+        'rows_per_sec': round(len(lat) * scenario['rows'] / elapsed, 1),
+    }
+
+
+def flask_worker(config_path):
+    # Runs inside a fresh interpreter whose environment points app.py at the fixtures
+    with open(config_path) as f:
+        config = json.load(f)
+    sys.path.insert(0, ROOT)
+    import app
+    client = app.app.test_client()
+
+    def send(scenario):
+        r = client.post(scenario['path'], data=scenario['body'], headers={'Content-Type': scenario['content_type']})
+        return r.status_code
+
+    args = argparse.Namespace(**config['args'])
+    results = [run_scenario(send, s, args.requests, 1, args.warmup) for s in build_scenarios(args)]
+    # Not ru_maxrss: on Linux a child inherits the parent's peak, and the parent
+    # imported torch to write the fixture ResNet. VmHWM is reset by exec.
+    peak_rss_mb = peak_rss_of('self')
+    if peak_rss_mb is None:
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    for r in results:
+        r['peak_rss_mb'] = round(peak_rss_mb, 1)
+    print(json.dumps(results))
+
+
+def run_flask(args, env):
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({'args': vars(args)}, f)
+        config_path = f.name
+    try:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--flask-worker', config_path],
+                             cwd=ROOT, env=env, capture_output=True, text=True)
+    finally:
+        os.remove(config_path)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def peak_rss_of(pid):
+    """Peak resident set (VmHWM) of one process in MB, or None where /proc is unavailable."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def process_tree_peak_rss_mb(pid):
+    pids = [pid]
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+            except (OSError, ValueError, IndexError):
+                pass
+    return round(sum(peak_rss_of(p) or 0.0 for p in pids), 1)
+
+
+def run_gunicorn(args, env):
+    env = dict(env, GUNICORN_BIND=f'127.0.0.1:{args.port}', WEB_CONCURRENCY=str(args.gunicorn_workers))
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    local = threading.local()
+
+    def send(scenario):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=60)
+        conn.request('POST', scenario['path'], body=scenario['body'], headers={'Content-Type': scenario['content_type']})
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+
+    try:
+        deadline = time.time() + 120
+        while True:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{args.port}/ready', timeout=2) as r:
+                    if r.status == 200:
+                        break
+            except Exception:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise RuntimeError('gunicorn did not become ready')
+                time.sleep(0.25)
+        results = [run_scenario(send, s, args.requests, args.concurrency, args.warmup) for s in build_scenarios(args)]
+        peak = process_tree_peak_rss_mb(proc.pid)
+        for r in results:
+            r['peak_rss_mb'] = peak
+        return results
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+# ==================== BASELINE COMPARISON ====================
+
+def compare(results, baseline, tolerance):
+    def key(r):
+        return (r['target'], r['model'], r['scenario'])
+    old = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        b = old.get(key(r))
+        if b is None:
+            continue
+        if r['p95_ms'] > b['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{'/'.join(key(r))}: p95 {b['p95_ms']} -> {r['p95_ms']} ms")
+        if r['requests_per_sec'] < b['requests_per_sec'] * (1 - tolerance):
+            regressions.append(f"{'/'.join(key(r))}: rps {b['requests_per_sec']} -> {r['requests_per_sec']}")
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--targets', default='flask', help='flask,gunicorn')
+    p.add_argument('--models', default='heuristic,resnet18', help='heuristic,resnet18')
+    p.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    p.add_argument('--warmup', type=int, default=10)
+    p.add_argument('--concurrency', type=int, default=4, help='Client threads (gunicorn target)')
+    p.add_argument('--batch-rows', default='16,256,4096')
+    p.add_argument('--image-sizes', default='320x240,1280x960,4000x3000')
+    p.add_argument('--image-formats', default='JPEG,PNG')
+    p.add_argument('--gunicorn-workers', type=int, default=2)
+    p.add_argument('--port', type=int, default=8766)
+    p.add_argument('--output', default=None, help='Write results as JSON')
+    p.add_argument('--baseline', default=None, help='Compare against a previous --output file')
+    p.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative regression')
+    p.add_argument('--flask-worker', default=None, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.flask_worker:
+        return flask_worker(args.flask_worker)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        iris_path = os.path.join(tmp, 'iris_model.pkl')
+        write_iris_model(iris_path)
+        model_dirs = {'heuristic': os.path.join(tmp, 'no-image-model'), 'resnet18': os.path.join(tmp, 'resnet18')}
+        for d in model_dirs.values():
+            os.makedirs(d)
+        if 'resnet18' in args.models:
+            write_random_resnet(model_dirs['resnet18'])
+
+        for model in args.models.split(','):
+            env = dict(os.environ, NUMERIC_MODEL_PATH=iris_path, IMAGE_MODEL_DIR=model_dirs[model],
+                       IMAGE_MODEL_WARMUP='eager', PREDICTION_CACHE_SIZE='0')
+            for target in args.targets.split(','):
+                runner = run_flask if target == 'flask' else run_gunicorn
+                print(f'== {target} / {model}')
+                for r in runner(args, env):
+                    r.update({'target': target, 'model': model})
+                    results.append(r)
+                    print(f"  {r['scenario']:<32} p50 {r['p50_ms']:>9.2f}  p95 {r['p95_ms']:>9.2f}  "
+                          f"p99 {r['p99_ms']:>9.2f} ms  {r['requests_per_sec']:>9.1f} req/s  {r['peak_rss_mb']:>7.1f} MB")
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Results saved to {args.output}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('Regressions against baseline:')
+            for line in regressions:
+                print('  ' + line)
+            sys.exit(1)
+        print('No regressions against baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Measure app.py startup time and memory against a budget.
+
+Each run imports ``app`` in a fresh interpreter and reports the import time,
+whether torch got imported, and the peak RSS of that process. Exits non-zero
+if the median import time exceeds ``--budget-ms``.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 1000
+    IMAGE_MODEL_WARMUP=eager python benchmarks/bench_startup.py --budget-ms 5000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000.0,
+    "torch_imported": "torch" in sys.modules,
+    "image_model_status": app.image_model_status,
+    "peak_rss_mb": rss_kb / 1024.0,
+}))
+'''
+
+
+def run_once(env):
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--budget-ms', type=float, default=1000.0, help='Median import-time budget')
+    p.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = p.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('PYTHONDONTWRITEBYTECODE', '1')
+    run_once(env)  # warm the OS page cache so runs are comparable
+    runs = [run_once(env) for _ in range(args.runs)]
+
+    summary = {
+        'warmup_mode': env.get('IMAGE_MODEL_WARMUP', 'lazy'),
+        'runs': args.runs,
+        'import_ms_median': round(statistics.median(r['import_ms'] for r in runs), 1),
+        'import_ms_max': round(max(r['import_ms'] for r in runs), 1),
+        'peak_rss_mb_max': round(max(r['peak_rss_mb'] for r in runs), 1),
+        'torch_imported': any(r['torch_imported'] for r in runs),
+        'image_model_status': runs[-1]['image_model_status'],
+        'budget_ms': args.budget_ms,
+    }
+    summary['within_budget'] = summary['import_ms_median'] <= args.budget_ms
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        for key, value in summary.items():
+            print(f'{key:<20} {value}')
+    sys.exit(0 if summary['within_budget'] else 1)
+
+
+if __name__ == '__main__':
+    main()
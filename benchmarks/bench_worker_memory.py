@@ -0,0 +1,145 @@
+"""Resident memory per gunicorn worker, with and without preload (Linux only).
+
+Starts ``gunicorn -c gunicorn.conf.py app:app`` with 1, 2, 4, ... workers,
+waits for /ready, sends a few /predict-image requests so every worker has run
+inference, then reads /proc/<pid>/smaps_rollup for the master and each worker.
+The interesting column is the PSS added per extra worker: with shared weights
+it should stay close to the interpreter's own private footprint.
+
+The server loads fixture models written to a temp dir: a randomly
+initialized ResNet-18 (so there are real weights to share) and the iris
+LogisticRegression, from the same writers as bench_serving.py.
+
+    python benchmarks/bench_worker_memory.py --workers 1,2,4
+    GUNICORN_PRELOAD=0 python benchmarks/bench_worker_memory.py --workers 1,2,4
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+
+from bench_serving import write_iris_model, write_random_resnet
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def smaps_rollup(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1]) / 1024.0  # kB -> MB
+    return values
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def wait_ready(base_url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/ready', timeout=2) as r:
+                if r.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError('server did not become ready')
+
+
+def sample_jpeg():
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new('RGB', (640, 480), (90, 140, 60)).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+def post_image(base_url, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="x.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    req = urllib.request.Request(base_url + '/predict-image', data=body,
+                                 headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    with urllib.request.urlopen(req, timeout=30) as r:
+        r.read()
+
+
+def measure(n_workers, port, requests_per_worker, timeout, model_env):
+    env = dict(os.environ, WEB_CONCURRENCY=str(n_workers), GUNICORN_BIND=f'127.0.0.1:{port}',
+               PREDICTION_CACHE_SIZE='0', **model_env)
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_ready(base_url, timeout)
+        data = sample_jpeg()
+        for _ in range(n_workers * requests_per_worker):
+            post_image(base_url, data)
+        time.sleep(0.5)
+        master = smaps_rollup(proc.pid)
+        workers = [smaps_rollup(pid) for pid in child_pids(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    total_pss = master.get('Pss', 0.0) + sum(w.get('Pss', 0.0) for w in workers)
+    return {
+        'workers': len(workers),
+        'master_rss_mb': round(master.get('Rss', 0.0), 1),
+        'worker_rss_mb': [round(w.get('Rss', 0.0), 1) for w in workers],
+        'worker_private_mb': [round(w.get('Private_Clean', 0.0) + w.get('Private_Dirty', 0.0), 1) for w in workers],
+        'total_pss_mb': round(total_pss, 1),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--workers', default='1,2,4')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--requests-per-worker', type=int, default=4)
+    p.add_argument('--timeout', type=float, default=120.0)
+    p.add_argument('--output', default=None, help='Optional JSON output path')
+    args = p.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        iris_path = os.path.join(tmp, 'iris_model.pkl')
+        write_iris_model(iris_path)
+        write_random_resnet(tmp)
+        model_env = {'NUMERIC_MODEL_PATH': iris_path, 'IMAGE_MODEL_DIR': tmp}
+        for n in (int(x) for x in args.workers.split(',')):
+            row = measure(n, args.port, args.requests_per_worker, args.timeout, model_env)
+            if rows:
+                prev = rows[-1]
+                added = row['workers'] - prev['workers']
+                row['pss_per_added_worker_mb'] = round((row['total_pss_mb'] - prev['total_pss_mb']) / max(added, 1), 1)
+            rows.append(row)
+            print(json.dumps(row))
+
+    summary = {'preload': os.environ.get('GUNICORN_PRELOAD', '1') == '1', 'results': rows}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Sweep inference-executor / torch threading settings and report images/sec.
+
+Every configuration runs in a fresh interpreter, since torch only allows the
+inter-op pool size to be set once per process. Each run imports app.py against
+a randomly initialized ResNet-18, then has ``--concurrency`` client threads
+call ``app.predict_image_bytes`` (the same path the /predict-image route
+uses, prediction cache disabled) for ``--duration`` seconds.
+
+    python benchmarks/loadtest_inference.py --infer-workers 1,2,4 --torch-threads auto,1,2 --concurrency 4
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLIENT = r'''
+import io, json, os, sys, threading, time
+sys.path.insert(0, os.getcwd())
+import numpy as np
+from PIL import Image
+import app
+
+concurrency = int(os.environ['LOADTEST_CONCURRENCY'])
+duration = float(os.environ['LOADTEST_DURATION'])
+rng = np.random.default_rng(0)
+images = []
+for i in range(16):
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(buf, format='JPEG')
+    images.append(buf.getvalue())
+
+app.ensure_image_model()
+for data in images[:2]:
+    app.predict_image_bytes(data)  # warm-up
+
+latencies = []
+lock = threading.Lock()
+stop_at = time.perf_counter() + duration
+
+def client(k):
+    local = []
+    i = k
+    while time.perf_counter() < stop_at:
+        t0 = time.perf_counter()
+        payload, status = app.predict_image_bytes(images[i % len(images)])
+        local.append(time.perf_counter() - t0)
+        assert status == 200, payload
+        i += 1
+    with lock:
+        latencies.extend(local)
+
+start = time.perf_counter()
+threads = [threading.Thread(target=client, args=(k,)) for k in range(concurrency)]
+for t in threads: t.start()
+for t in threads: t.join()
+elapsed = time.perf_counter() - start
+
+lat = sorted(latencies)
+def pct(p):
+    return lat[min(len(lat) - 1, int(round(p / 100.0 * (len(lat) - 1))))] * 1000.0
+print(json.dumps({
+    'images': len(lat),
+    'images_per_sec': len(lat) / elapsed,
+    'p50_ms': pct(50), 'p95_ms': pct(95), 'p99_ms': pct(99),
+    'torch_threads': app.torch.get_num_threads(),
+    'mean_batch_size': app.image_batcher.metrics()['mean_batch_size'],
+}))
+'''
+
+
+def write_random_model(model_dir, num_classes=5):
+    import torch
+    from torchvision import models
+    model = models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
+    torch.save(model.state_dict(), os.path.join(model_dir, 'image_model.pth'))
+    with open(os.path.join(model_dir, 'classes.json'), 'w') as f:
+        json.dump([f'class_{i}' for i in range(num_classes)], f)
+
+
+def run_config(model_dir, infer_workers, torch_threads, batch_size, concurrency, duration, affinity):
+    env = dict(os.environ,
+               IMAGE_MODEL_DIR=model_dir,
+               IMAGE_INFER_WORKERS=str(infer_workers),
+               TORCH_NUM_THREADS=str(torch_threads),
+               IMAGE_BATCH_MAX_SIZE=str(batch_size),
+               PREDICTION_CACHE_SIZE='0',
+               LOADTEST_CONCURRENCY=str(concurrency),
+               LOADTEST_DURATION=str(duration))
+    cmd = [sys.executable, '-c', CLIENT]
+    if affinity:
+        cmd = ['taskset', '-c', affinity] + cmd
+    out = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else 'client failed')
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--infer-workers', default='1,2,4', help='IMAGE_INFER_WORKERS values')
+    p.add_argument('--torch-threads', default='auto', help="TORCH_NUM_THREADS values ('auto' or ints)")
+    p.add_argument('--batch-sizes', default='1,8', help='IMAGE_BATCH_MAX_SIZE values')
+    p.add_argument('--concurrency', default='4', help='Client threads (like gunicorn --threads)')
+    p.add_argument('--duration', type=float, default=10.0, help='Seconds per configuration')
+    p.add_argument('--affinity', default=None, help="Optional taskset CPU list, e.g. '0-3'")
+    p.add_argument('--output', default=None, help='Optional JSON output path')
+    args = p.parse_args()
+
+    grid = itertools.product(args.infer_workers.split(','), args.torch_threads.split(','),
+                             args.batch_sizes.split(','), args.concurrency.split(','))
+    results = []
+    with tempfile.TemporaryDirectory() as model_dir:
+        write_random_model(model_dir)
+        print(f"{'workers':>7} {'threads':>7} {'batch':>5} {'conc':>4} {'img/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for workers, threads, batch, conc in grid:
+            try:
+                r = run_config(model_dir, int(workers), threads, int(batch), int(conc), args.duration, args.affinity)
+            except RuntimeError as e:
+                print(f'{workers:>7} {threads:>7} {batch:>5} {conc:>4}  failed: {e}')
+                continue
+            r.update({'infer_workers': int(workers), 'torch_threads_policy': threads,
+                      'batch_size': int(batch), 'concurrency': int(conc)})
+            results.append(r)
+            print(f"{workers:>7} {str(r['torch_threads']):>7} {batch:>5} {conc:>4} {r['images_per_sec']:>8.1f} "
+                  f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+    if results:
+        best = max(results, key=lambda r: r['images_per_sec'])
+        print(f"\nBest: IMAGE_INFER_WORKERS={best['infer_workers']} TORCH_NUM_THREADS={best['torch_threads']} "
+              f"IMAGE_BATCH_MAX_SIZE={best['batch_size']} -> {best['images_per_sec']:.1f} img/s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Gunicorn settings for app.py (picked up automatically from the working directory).
+
+With GUNICORN_PRELOAD=1 (the default) the app and its models are loaded once
+in the master process and the workers are forked from it, so the weights are
+shared copy-on-write instead of being loaded once per worker. The ResNet
+checkpoint is also memory-mapped (see image_backends.load_state_dict), so its
+pages live in the OS page cache.
+
+    WEB_CONCURRENCY   number of worker processes (default: one per core)
+    GUNICORN_THREADS  threads per worker (default: 4)
+    GUNICORN_PRELOAD  1 to load models in the master before forking (default)
+    CPU_AFFINITY      1 to pin each worker to its own slice of the cores
+
+Torch thread counts per worker follow IMAGE_INFER_WORKERS / TORCH_NUM_THREADS
+in app.py and are computed after pinning. Without CPU_AFFINITY every worker
+sees all the cores, so TORCH_NUM_THREADS=auto divides them by the number of
+workers as well (CPU_SHARING_PROCESSES); otherwise N workers would each start
+N threads.
+"""
+import gc
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:80')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+cpu_affinity = os.environ.get('CPU_AFFINITY', '0') == '1'
+
+if preload_app:
+    # Load the image model during the preload rather than lazily in each worker
+    os.environ.setdefault('IMAGE_MODEL_WARMUP', 'eager')
+    # Keep torch's OpenMP pool at one thread in the master: an OpenMP pool
+    # that was started before fork() can deadlock in the children. Workers get
+    # their real thread count in post_fork.
+    os.environ['TORCH_SINGLE_THREAD_UNTIL_FORK'] = '1'
+
+
+def pre_fork(server, worker):
+    # Move every object created during preload into the permanent generation,
+    # so the cyclic GC in the workers never writes to those pages (which would
+    # otherwise un-share them one by one).
+    gc.freeze()
+    # Give each live worker a distinct CPU slot (reused when a worker restarts)
+    used = {getattr(w, 'cpu_slot', None) for w in server.WORKERS.values()}
+    worker.cpu_slot = next((i for i in range(server.num_workers) if i not in used), len(used) % max(1, server.num_workers))
+
+
+def post_fork(server, worker):
+    pinned = cpu_affinity and hasattr(os, 'sched_setaffinity')
+    if pinned:
+        cores = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cores) // max(1, server.num_workers))
+        start = (worker.cpu_slot * per_worker) % len(cores)
+        os.sched_setaffinity(0, cores[start:start + per_worker])
+    # Read by app.configure_torch_threads, now (preload) or when the worker imports app
+    os.environ['CPU_SHARING_PROCESSES'] = '1' if pinned else str(max(1, server.num_workers))
+    # With preload, app (and possibly torch) is already imported: apply the
+    # per-worker thread policy now that the worker's CPU set is known.
+    os.environ.pop('TORCH_SINGLE_THREAD_UNTIL_FORK', None)
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'configure_torch_threads'):
+        app_module.configure_torch_threads()
@@ -0,0 +1,140 @@
+"""CPU inference backends for the flower ResNet-18.
+
+``prepare_image_model`` turns the trained fp32 model into one of:
+
+    eager         plain ``nn.Module`` (the default, same as before)
+    torchscript   traced, ``torch.jit.freeze``-d and ``optimize_for_inference``-d graph
+    int8-dynamic  dynamic int8 quantization of the Linear layers
+    int8-static   post-training static int8 quantization (conv + fc), calibrated
+                  on a sample of images from the training folder
+
+Any backend can be combined with ``channels_last`` memory format.
+
+``load_state_dict`` memory-maps the checkpoint where torch supports it. With
+the eager backend (and contiguous layout) the weights are then backed by the
+OS page cache and shared by every worker process on the host; the other
+backends make their own copies of the weights.
+
+A mapped model reads its weights from the checkpoint file for as long as it
+is loaded, so a new checkpoint must replace the file (write a temporary file,
+then os.replace it over the old one, as train_image_model.py does) rather than
+overwrite it: writing into the mapped file changes the weights of the running
+model, and truncating it kills the process with SIGBUS. Pass ``mmap=False``
+(``IMAGE_MODEL_MMAP=0`` in app.py) when the file may be written in place.
+"""
+import random
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+from torchvision import models
+
+BACKENDS = ('eager', 'torchscript', 'int8-dynamic', 'int8-static')
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
+def build_resnet18(num_classes, state_dict=None, quantizable=False):
+    """ResNet-18 with a ``num_classes`` head, optionally loaded from ``state_dict``."""
+    if quantizable:
+        from torchvision.models import quantization as qmodels
+        model = qmodels.resnet18(weights=None, quantize=False)
+    else:
+        model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    if state_dict is not None:
+        # assign=True makes the parameters alias the loaded tensors instead of
+        # copying them, so an mmap-ed checkpoint stays shared in the page cache.
+        model.load_state_dict(state_dict, assign=True)
+    return model.eval()
+
+
+def load_state_dict(path, mmap=True):
+    """torch.load the checkpoint, memory-mapped when ``mmap`` and torch supports it."""
+    if not mmap:
+        return torch.load(path, map_location='cpu')
+    try:
+        return torch.load(path, map_location='cpu', mmap=True)
+    except (TypeError, RuntimeError):
+        # torch < 2.1, or a checkpoint saved in the legacy (non-zip) format
+        return torch.load(path, map_location='cpu')
+
+
+def val_transform():
+    from torchvision import transforms
+    return transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD)
+    ])
+
+
+def calibration_batches(image_dir, num_samples=64, batch_size=16, seed=0):
+    """Yield preprocessed batches from a random sample of an ImageFolder tree."""
+    from torch.utils.data import DataLoader, Subset
+    from torchvision import datasets
+    image_dir = Path(image_dir)
+    if not image_dir.exists():
+        raise FileNotFoundError(f'Calibration folder not found: {image_dir}')
+    dataset = datasets.ImageFolder(str(image_dir), transform=val_transform())
+    indices = list(range(len(dataset)))
+    random.Random(seed).shuffle(indices)
+    loader = DataLoader(Subset(dataset, indices[:num_samples]), batch_size=batch_size, shuffle=False)
+    for images, _ in loader:
+        yield images
+
+
+def to_input(batch, channels_last=False):
+    return batch.contiguous(memory_format=torch.channels_last) if channels_last else batch
+
+
+def prepare_image_model(state_dict, num_classes, backend='eager', channels_last=False,
+                        calibration_dir=None, calibration_samples=64):
+    """Build the inference model for ``backend`` from a trained fp32 state dict."""
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown image model backend {backend!r}; expected one of {BACKENDS}')
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+
+    if backend == 'int8-static':
+        torch.backends.quantized.engine = _quantized_engine()
+        model = build_resnet18(num_classes, state_dict, quantizable=True)
+        model.fuse_model()
+        model.qconfig = torch.ao.quantization.get_default_qconfig(torch.backends.quantized.engine)
+        model = model.to(memory_format=memory_format)
+        torch.ao.quantization.prepare(model, inplace=True)
+        with torch.inference_mode():
+            for images in calibration_batches(calibration_dir, calibration_samples):
+                model(to_input(images, channels_last))
+        torch.ao.quantization.convert(model, inplace=True)
+        return model.eval()
+
+    model = build_resnet18(num_classes, state_dict).to(memory_format=memory_format)
+
+    if backend == 'int8-dynamic':
+        # Only nn.Linear is dynamically quantizable, i.e. the fc head; the
+        # conv trunk stays fp32. Use int8-static to quantize the convolutions.
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8).eval()
+
+    if backend == 'torchscript':
+        example = to_input(torch.randn(1, 3, 224, 224), channels_last)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+            frozen = torch.jit.freeze(traced)
+            frozen = torch.jit.optimize_for_inference(frozen)
+            # The first calls run the profiling executor; warm up so the
+            # first real request is not the slow one.
+            for _ in range(2):
+                frozen(example)
+        return frozen
+
+    return model
+
+
+def _quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            return engine
+    return engines[0]
@@ -0,0 +1,205 @@
+"""Content-addressed prediction cache used by app.py.
+
+An in-process LRU with a TTL and a bounded number of entries, plus an
+optional on-disk tier that every gunicorn worker on the host can read.
+Entries are tied to a fingerprint (mtime + size) of the model files they were
+computed with, so replacing ``image_model.pth`` or ``iris_model.pkl`` drops
+the memory tier, makes older disk entries unreachable and calls ``on_change``
+so the caller can reload the model.
+
+A prediction may still be running on the old model when the files change.
+Callers therefore read ``generation`` before computing and pass it to
+``put``. A result from an older generation, or one that finishes while the
+model is reloading, is dropped instead of being cached under the new
+fingerprint.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def file_fingerprint(paths):
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f'{path}:{st.st_mtime_ns}:{st.st_size}')
+        except OSError:
+            parts.append(f'{path}:missing')
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class PredictionCache:
+    """LRU + TTL cache for JSON-serializable prediction results."""
+
+    def __init__(self, name, max_entries=4096, ttl=3600.0, disk_dir=None, watch_paths=(), check_interval=2.0, on_change=None):
+        self.name = name
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl)
+        self.disk_dir = os.path.join(disk_dir, name) if disk_dir else None
+        self.watch_paths = tuple(watch_paths)
+        self.check_interval = check_interval
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._fingerprint = file_fingerprint(self.watch_paths)
+        self._last_check = time.monotonic()
+        self._generation = 0  # bumped when a change is seen and again once on_change has returned
+        self._reloading = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @property
+    def generation(self):
+        """Token for ``put``: read it before computing a prediction."""
+        return self._generation
+
+    # ==================== INVALIDATION ====================
+
+    def _check_models(self):
+        # Called with the lock held; returns True when the model files changed
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        fingerprint = file_fingerprint(self.watch_paths)
+        if fingerprint == self._fingerprint:
+            return False
+        self._fingerprint = fingerprint
+        self._entries.clear()
+        self._generation += 1
+        self._reloading += 1  # until _notify_change returns
+        self.invalidations += 1
+        self._prune_disk()
+        return True
+
+    def _notify_change(self):
+        try:
+            if self.on_change is not None:
+                self.on_change()
+        except Exception:
+            # A half-written model file fails to load; keep serving the old
+            # model; the fingerprint changes again once the write completes.
+            pass
+        finally:
+            with self._lock:
+                # Predictions started during the reload may have used the old model
+                self._reloading -= 1
+                self._generation += 1
+
+    def _prune_disk(self):
+        # Entries for older model versions live in sibling directories
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return
+        for entry in os.listdir(self.disk_dir):
+            if entry != self._fingerprint:
+                shutil.rmtree(os.path.join(self.disk_dir, entry), ignore_errors=True)
+
+    # ==================== DISK TIER ====================
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, self._fingerprint, digest[:2], digest + '.json')
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, value):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp, path)  # atomic, so other workers never read a partial file
+        except OSError:
+            pass
+
+    # ==================== PUBLIC API ====================
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            changed = self._check_models()
+        if changed:
+            self._notify_change()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+        value = self._disk_get(key) if self.disk_dir else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value, now)
+        return value
+
+    def put(self, key, value, generation=None):
+        """Store ``value``; with ``generation`` (read before computing it), skip it if the model changed since."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._reloading or (generation is not None and generation != self._generation):
+                self.stale_puts += 1
+                return
+            self._store(key, value, time.monotonic())
+        if self.disk_dir:
+            self._disk_put(key, value)
+
+    def _store(self, key, value, now):
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'disk_dir': self.disk_dir,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'stale_puts': self.stale_puts,
+                'model_fingerprint': self._fingerprint,
+            }
@@ -0,0 +1,58 @@
+"""Single-pass image preprocessing for the flower model.
+
+Replaces ``Resize(256) -> CenterCrop(224) -> ToTensor() -> Normalize(...)``
+plus the separate 64x64 resize used for the average colour. The image is
+decoded once (at reduced scale for large JPEGs via ``Image.draft``), resized
+once, and both outputs are derived from that one uint8 buffer. Only numpy is
+needed, so the heuristic fallback works without torch installed.
+"""
+import numpy as np
+from PIL import Image
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class ImagePreprocessor:
+    """Build once, call per image: returns (CHW float32 array or None, avg RGB)."""
+
+    def __init__(self, resize=256, crop=224, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        self.resize = resize
+        self.crop = crop
+        mean = np.asarray(mean, dtype=np.float32)
+        std = np.asarray(std, dtype=np.float32)
+        # (x / 255 - mean) / std folded into one multiply-add per channel
+        self.scale = (1.0 / (255.0 * std)).reshape(3, 1, 1)
+        self.offset = (-mean / std).reshape(3, 1, 1)
+
+    def load(self, source):
+        """Decode ``source`` (path or file object) with its short side resized to ``self.resize``."""
+        img = Image.open(source)
+        if img.format == 'JPEG':
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale while both sides
+            # stay >= the resize target; avoids decoding full-size photos.
+            img.draft('RGB', (self.resize, self.resize))
+        img = img.convert('RGB')
+        w, h = img.size
+        if w <= h:
+            size = (self.resize, int(self.resize * h / w))
+        else:
+            size = (int(self.resize * w / h), self.resize)
+        if size != img.size:
+            img = img.resize(size, Image.BILINEAR)
+        return img
+
+    def __call__(self, source, with_tensor=True):
+        arr = np.asarray(self.load(source))  # H,W,3 uint8
+        avg = arr.reshape(-1, 3).mean(axis=0) / 255.0
+        avg_rgb = tuple(float(x) for x in avg)
+        if not with_tensor:
+            return None, avg_rgb
+        h, w = arr.shape[:2]
+        top = int(round((h - self.crop) / 2.0))
+        left = int(round((w - self.crop) / 2.0))
+        crop = arr[top:top + self.crop, left:left + self.crop]
+        chw = crop.transpose(2, 0, 1).astype(np.float32)
+        chw *= self.scale
+        chw += self.offset
+        return chw, avg_rgb